@@ -1,4 +1,4 @@
-from typing import Literal, List, Any, Dict
+from typing import Literal, List, Any, Dict, Optional
 from langchain_core.tools import tool
 from langgraph.types import Command
 from langgraph.graph.message import add_messages
@@ -8,14 +8,37 @@ from langgraph.graph import START, StateGraph, END
 from langgraph.prebuilt import create_react_agent
 from langchain_core.messages import HumanMessage, AIMessage
 from prompt_lib.prompt import system_prompt
-from utils.llm import LLMModel
-from toolkit.toolkits import *
+from utils.llm import LLMModel, for_node, instrument_llm
+from utils.llm_cache import LLMCache
+from utils.budget import TURN_DEADLINE, TURN_MAX_HOPS, BudgetExceeded, deadline_scope, enforce_deadline, time_left, visit_key
+from utils.router import FastRouter, WORKER_NODES
+from utils.history import HistoryCompactor
+from utils.metrics import MISROUTES, NODE_SECONDS, ROUTE_DECISIONS, ROUTE_ESCALATIONS, ROUTE_FAILURES, TURN_BUDGET_STOPS, timed
+from toolkit.toolkits import (check_availability_by_doctor, check_availability_by_specialization, find_next_available,
+                              hold_slot, list_my_appointments, set_appointment, cancel_appointment, reschedule_appointment)
+import asyncio
+import logging
+import os
 import re
 import json
+import time
+
+logger = logging.getLogger(__name__)
 
 class Router(TypedDict):
+    """Worker to hand the conversation to next, or FINISH when the user's query is resolved."""
     next: Literal["information_node", "booking_node", "FINISH"]
     reasoning: str
+    confidence: Annotated[float, ..., "How sure you are of the choice, from 0 to 1"]
+
+ROUTE_OPTIONS = ("information_node", "booking_node", "FINISH")
+# A route is a short tool call; the cap stops long think blocks before it
+ROUTER_MAX_TOKENS = 128
+# Routes the supervisor's model is less sure of than this are asked of the escalation model
+ROUTE_MIN_CONFIDENCE = float(os.getenv("ROUTE_MIN_CONFIDENCE", "0.5"))
+# Reply when a turn runs out of budget before any worker has answered
+BUDGET_REPLY = ("I'm sorry, I couldn't finish handling that request in time. If you asked to book, cancel or "
+                "reschedule, please check your appointments before trying again, or send the doctor, date and time in one message.")
 
 class AgentState(TypedDict):
     messages: Annotated[list[Any], add_messages]
@@ -23,6 +46,10 @@ class AgentState(TypedDict):
     next: str
     query: str
     current_reasoning: str
+    # Budget of the current user turn; the supervisor resets it when a new user message arrives
+    hops: int
+    deadline: float
+    visits: List[str]
 
 def format_tool_call_to_human_message(tool_call_content: str) -> str:
     """Formats a tool call JSON string into a user-friendly message."""
@@ -84,113 +111,300 @@ def format_tool_call_to_human_message(tool_call_content: str) -> str:
         # If there's an error parsing the tool call, return the original content
         return tool_call_content
 
+INFORMATION_PROMPT = "You are specialized agent to provide information related to availability of doctors or any FAQs related to hospital based on the query. You have access to the tool.\n Make sure to ask user politely if you need any further information to execute the tool.\n For the earliest or next opening over a period, use find_next_available in one call instead of checking dates one by one.\n If the user asks about their own bookings, use list_my_appointments with their identification number.\n When the user settles on one free slot without asking to book it yet, call hold_slot so it is kept for them until they book.\n For your information, Always consider current year is 2024."
+
+# Booking prompt also handles date formats with "at"
+BOOKING_PROMPT = "You are specialized agent to set, cancel or reschedule appointment based on the query. You have access to the tool.\n Make sure to ask user politely if you need any further information to execute the tool.\n To cancel or reschedule when the user does not give the exact date, time or doctor, call list_my_appointments with their identification number first instead of asking; if exactly one appointment matches, go ahead with it.\n For your information, Always consider current year is 2024.\n Note: If the user provides a date format like '22-05-2024 at 14:30', please convert it to '22-05-2024 14:30' format before processing."
+
 class DoctorAppointmentAgent:
-    def __init__(self):
-        llm_model = LLMModel()
-        self.llm_model = llm_model.get_model()
+    def __init__(self, llm_model=None, llm_cache=None, node_models: Optional[Dict[str, Any]] = None, escalation_model=None):
+        """
+        `node_models` maps graph nodes to their chat model; nodes without one use
+        `llm_model`. A routing reply the supervisor's model gets wrong or is unsure of is
+        asked again of `escalation_model`, if given. With neither model passed, both
+        come from the LLMModel registry as configured by the environment.
+        """
+        if llm_model is None:
+            provider = LLMModel()
+            llm_model = provider.get_model()
+            if node_models is None:
+                node_models = provider.node_models()
+                escalation_model = escalation_model or provider.escalation_model()
+        self.llm_model = self.prepare_model(llm_model)
+        self.node_models = {node: self.prepare_model(model) for node, model in (node_models or {}).items()}
+        if escalation_model is self.node_models.get("supervisor", self.llm_model):
+            escalation_model = None
+        self.escalation_model = self.prepare_model(escalation_model) if escalation_model is not None else None
+        # Replies of opted-in nodes are cached; None (LLM_CACHE=off) calls the model every time
+        self.llm_cache = LLMCache.from_env() if llm_cache is None else llm_cache
+        self.router = FastRouter()
+        # Routing must come back as a single Router tool call; only valid routes are cached
+        self.route_model = self.build_route_model()
+        self.escalation_route_model = self.build_route_model(self.escalation_model) if self.escalation_model is not None else None
+        self.history = HistoryCompactor.from_env()
+        
+        # Compile the react sub-agents once; compiled graphs are stateless and shared by all requests
+        self.information_agent = self.build_sub_agent(INFORMATION_PROMPT, [check_availability_by_doctor, check_availability_by_specialization, find_next_available, list_my_appointments, hold_slot], node="information_node")
+        self.booking_agent = self.build_sub_agent(BOOKING_PROMPT, [set_appointment, cancel_appointment, reschedule_appointment, list_my_appointments], node="booking_node")
     
-    def supervisor_node(self, state: AgentState) -> Command[Literal['information_node', 'booking_node', '__end__']]:
-        print("**************************below is my state right after entering****************************")
-        print(state)
-        
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": f"user's identification number is {state['id_number']}"},
-        ] + state["messages"]
-        
-        print("***********************this is my message*****************************************")
-        print(messages)
+    @staticmethod
+    def prepare_model(llm_model):
+        return enforce_deadline(instrument_llm(llm_model))
+    
+    def node_model(self, node: str, accept=None, llm_model=None):
+        """
+        The chat model for `node` (or `llm_model` on its behalf), with its calls recorded
+        under the node and behind the LLM cache if the node opted in.
+        """
+        model = for_node(llm_model or self.node_models.get(node, self.llm_model), node)
+        if self.llm_cache is None:
+            return model
+        return self.llm_cache.wrap(model, node, accept)
+    
+    def build_route_model(self, llm_model=None):
+        model = self.node_model("supervisor", accept=lambda reply: self.parse_route(reply) is not None, llm_model=llm_model)
+        return model.bind_tools([Router], tool_choice="Router", max_tokens=ROUTER_MAX_TOKENS)
+    
+    def build_sub_agent(self, prompt: str, tools: List[Any], node: str):
+        """Compile a react sub-agent with its own system prompt and tools."""
+        prompt_template = ChatPromptTemplate.from_messages(
+                [
+                    (
+                        "system",
+                        prompt
+                    ),
+                    (
+                        "placeholder", 
+                        "{messages}"
+                    ),
+                ]
+            )
+        tools = [enforce_deadline(tool) for tool in tools]
+        return create_react_agent(model=self.node_model(node), tools=tools, prompt=prompt_template)
+    
+    def supervisor_query(self, state: AgentState) -> str:
+        """The user's query on the first message of a conversation, otherwise ''."""
+        logger.debug("Supervisor received state: %s", state)
         
         query = ''
         if len(state['messages']) == 1:
             query = state['messages'][0].content
         
-        print("************below is my query********************")    
-        print(query)
-        
-        # Modify this part - directly prompt the model instead of using structured_output
-        tools_prompt = """
-        Based on the user's query, determine which specialized node should handle this request.
-        If the user is asking about doctor availability or hospital information, respond with "information_node".
-        If the user is trying to book, cancel, or reschedule an appointment, respond with "booking_node".
-        If the query has been completely answered or no further action is needed, respond with "FINISH".
-        
-        Your response should be in this format:
-        Next: [information_node/booking_node/FINISH]
-        Reasoning: [your reasoning for the selection]
-        """
+        logger.debug("Supervisor query: %s", query)
         
-        # Create chat messages for prompting
-        prompt_messages = messages + [{"role": "system", "content": tools_prompt}]
-        
-        # Make a regular call to the model without structured output
-        response_text = self.llm_model.invoke(prompt_messages)
-        
-        # Parse the response to extract next and reasoning
-        response_text = response_text.content if hasattr(response_text, 'content') else str(response_text)
+        return query
+    
+    def supervisor_prompt(self, state: AgentState) -> List[Any]:
+        """Build the supervisor's prompt messages; only needed when the LLM routes."""
+        # Older turns are summarized and repeated ID messages dropped to keep the prompt bounded
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": f"user's identification number is {state['id_number']}"},
+        ] + self.history.compact(state["messages"])
         
-        # Extract the next node and reasoning from the response
-        next_node = None
-        reasoning = ""
+        logger.debug("Supervisor prompt messages: %s", messages)
         
-        for line in response_text.split('\n'):
-            if line.lower().startswith('next:'):
-                next_node = line.split(':', 1)[1].strip()
-            elif line.lower().startswith('reasoning:'):
-                reasoning = line.split(':', 1)[1].strip()
+        return messages
+    
+    def turn_budget(self, state: AgentState) -> Dict[str, Any]:
+        """Hops, deadline and visited (node, message) keys of the current turn; a user message starts a new turn."""
+        messages = state["messages"]
+        if not messages or isinstance(messages[-1], HumanMessage) or not state.get("deadline"):
+            return {"hops": 0, "deadline": time.time() + TURN_DEADLINE, "visits": []}
+        return {"hops": state.get("hops", 0), "deadline": state["deadline"], "visits": list(state.get("visits") or [])}
+    
+    def spend_hop(self, state: AgentState, next_node: str, budget: Dict[str, Any]) -> Optional[str]:
+        """
+        Charge a worker run to the turn's budget. Returns the exhausted budget instead if it can't be afforded.
+        The fast path sends most worker replies straight back to the user, so the hop and loop
+        limits are a safety net for the turns the LLM routes; benchmarks.routing_checks exercises them.
+        """
+        if budget["deadline"] <= time.time():
+            return "deadline"
+        if budget["hops"] >= TURN_MAX_HOPS:
+            return "hops"
+        key = visit_key(next_node, state["messages"][-1] if state["messages"] else "")
+        if key in budget["visits"]:
+            return "loop"
+        budget["hops"] += 1
+        budget["visits"].append(key)
+        return None
+    
+    def stop_turn(self, state: AgentState, query: str, reason: str) -> Command:
+        """End the turn early. The latest worker reply stands as a partial answer, or the user gets BUDGET_REPLY."""
+        TURN_BUDGET_STOPS.inc(reason=reason)
+        logger.warning("Turn stopped early: %s budget exhausted", reason)
+        messages = list(state["messages"])
+        if query:
+            messages.append(HumanMessage(content=f"user's identification number is {state['id_number']}"))
+        last = state["messages"][-1] if state["messages"] else None
+        if not (isinstance(last, AIMessage) and last.name in WORKER_NODES):
+            messages.append(AIMessage(content=BUDGET_REPLY, name="supervisor"))
+        update = {'next': END, 'current_reasoning': f"Stopped early: {reason} budget exhausted", 'messages': messages}
+        if query:
+            update['query'] = query
+        return Command(goto=END, update=update)
+    
+    def supervisor_command(self, state: AgentState, query: str, next_node: str, reasoning: str, budget: Dict[str, Any]) -> Command:
+        # A worker handing straight over to the other worker means the earlier route was wrong
+        last = state["messages"][-1] if state["messages"] else None
+        if isinstance(last, AIMessage) and last.name in WORKER_NODES and next_node in WORKER_NODES and next_node != last.name:
+            MISROUTES.inc(source=last.name, target=next_node)
         
-        # Default to booking_node if parsing fails
-        if not next_node:
-            next_node = "booking_node"
-            reasoning = "Default routing due to parsing issue."
+        if next_node in WORKER_NODES:
+            exhausted = self.spend_hop(state, next_node, budget)
+            if exhausted:
+                return self.stop_turn(state, query, exhausted)
         
         goto = next_node
         
-        print("********************************this is my goto*************************")
-        print(goto)
-        
-        print("********************************")
-        print(reasoning)
+        logger.info("Supervisor routed to %s: %s", goto, reasoning)
             
         if goto == "FINISH":
             goto = END
             
-        print("**************************below is my state****************************")
-        print(state)
-        
         if query:
             return Command(goto=goto, update={'next': goto, 
                                             'query': query, 
                                             'current_reasoning': reasoning,
                                             # Append the ID message rather than replacing all messages
-                                            'messages': state["messages"] + [HumanMessage(content=f"user's identification number is {state['id_number']}")]
+                                            'messages': state["messages"] + [HumanMessage(content=f"user's identification number is {state['id_number']}")],
+                                            **budget
                             })
         return Command(goto=goto, update={'next': goto, 
-                                        'current_reasoning': reasoning}
+                                        'current_reasoning': reasoning,
+                                        **budget}
                     )
     
-    def information_node(self, state: AgentState) -> Command[Literal['supervisor']]:
-        print("*****************called information node************")
-        
-        system_prompt = "You are specialized agent to provide information related to availability of doctors or any FAQs related to hospital based on the query. You have access to the tool.\n Make sure to ask user politely if you need any further information to execute the tool.\n For your information, Always consider current year is 2024."
-        
-        system_prompt = ChatPromptTemplate.from_messages(
-                [
-                    (
-                        "system",
-                        system_prompt
-                    ),
-                    (
-                        "placeholder", 
-                        "{messages}"
-                    ),
-                ]
-            )
-        
-        information_agent = create_react_agent(model=self.llm_model, tools=[check_availability_by_doctor, check_availability_by_specialization], prompt=system_prompt)
+    @timed(NODE_SECONDS, node="supervisor")
+    def supervisor_node(self, state: AgentState) -> Command[Literal['information_node', 'booking_node', '__end__']]:
+        query = self.supervisor_query(state)
+        budget = self.turn_budget(state)
+        
+        # Clear-cut cases are routed by rules; the LLM only decides ambiguous ones, and only then is the prompt built
+        fast_route = self.router.route(state["messages"])
+        if fast_route:
+            next_node, reasoning = fast_route
+            ROUTE_DECISIONS.inc(source="fast", next=next_node)
+        else:
+            try:
+                with deadline_scope(budget["deadline"]):
+                    next_node, reasoning = self.llm_route(self.supervisor_prompt(state))
+            except BudgetExceeded as e:
+                return self.stop_turn(state, query, e.reason)
+        
+        return self.supervisor_command(state, query, next_node, reasoning, budget)
+    
+    @timed(NODE_SECONDS, node="supervisor")
+    async def asupervisor_node(self, state: AgentState) -> Command[Literal['information_node', 'booking_node', '__end__']]:
+        query = self.supervisor_query(state)
+        budget = self.turn_budget(state)
+        
+        fast_route = self.router.route(state["messages"])
+        if fast_route:
+            next_node, reasoning = fast_route
+            ROUTE_DECISIONS.inc(source="fast", next=next_node)
+        else:
+            try:
+                with deadline_scope(budget["deadline"]):
+                    next_node, reasoning = await self.within_deadline(self.allm_route(self.supervisor_prompt(state)))
+            except BudgetExceeded as e:
+                return self.stop_turn(state, query, e.reason)
+        
+        return self.supervisor_command(state, query, next_node, reasoning, budget)
+    
+    def routing_messages(self, messages: List[Any]) -> List[Any]:
+        tools_prompt = """
+        Based on the user's query, determine which specialized node should handle this request.
+        If the user is asking about doctor availability or hospital information, choose "information_node".
+        If the user is trying to book, cancel, or reschedule an appointment, choose "booking_node".
+        If the query has been completely answered or no further action is needed, choose "FINISH".
         
-        result = information_agent.invoke(state)
+        Answer only by calling the Router tool, with a one-sentence reasoning.
+        """
         
+        # Create chat messages for prompting
+        return messages + [{"role": "system", "content": tools_prompt}]
+    
+    def parse_route(self, response) -> Optional[tuple]:
+        """Return (next node, reasoning) from a Router tool call, or None if the reply has no valid one."""
+        for call in getattr(response, "tool_calls", None) or []:
+            args = call.get("args") or {}
+            if call.get("name") == "Router" and args.get("next") in ROUTE_OPTIONS:
+                return args["next"], args.get("reasoning", "")
+        return None
+    
+    def route_confidence(self, response) -> float:
+        """Confidence the model gave its Router call; replies without one count as sure."""
+        for call in getattr(response, "tool_calls", None) or []:
+            if call.get("name") == "Router":
+                try:
+                    return float((call.get("args") or {}).get("confidence", 1.0))
+                except (TypeError, ValueError):
+                    return 1.0
+        return 1.0
+    
+    def route_attempts(self) -> List[tuple]:
+        """(model, source) per routing attempt: the supervisor's model, then the escalation model or the same one again."""
+        if self.escalation_route_model is None:
+            return [(self.route_model, "llm"), (self.route_model, "retry")]
+        return [(self.route_model, "llm"), (self.escalation_route_model, "escalated")]
+    
+    def review_route(self, response, source: str) -> tuple:
+        """
+        (route, escalate) for one routing reply: the route if the reply has a valid one,
+        and whether to ask the escalation model instead of taking it.
+        """
+        route = self.parse_route(response)
+        can_escalate = source == "llm" and self.escalation_route_model is not None
+        if route is None:
+            ROUTE_FAILURES.inc()
+            if can_escalate:
+                ROUTE_ESCALATIONS.inc(reason="parse_failure")
+            return None, True
+        if can_escalate and self.route_confidence(response) < ROUTE_MIN_CONFIDENCE:
+            ROUTE_ESCALATIONS.inc(reason="low_confidence")
+            return route, True
+        return route, False
+    
+    def settle_route(self, route: Optional[tuple], source: str, messages: List[Any]) -> tuple:
+        if route is None:
+            return self.fallback_route(messages)
+        ROUTE_DECISIONS.inc(source=source, next=route[0])
+        return route
+    
+    def fallback_route(self, messages: List[Any]) -> tuple:
+        """Best rule-based guess when the LLM gives no valid route, instead of always booking_node."""
+        next_node, confidence, reasoning = self.router.classify(messages)
+        ROUTE_DECISIONS.inc(source="fallback", next=next_node or "information_node")
+        if next_node is None:
+            # The information agent asks the user for details rather than acting on a guess
+            return "information_node", "Fallback: no valid route from the LLM and no clear intent."
+        return next_node, f"Fallback ({confidence:.2f}): {reasoning}"
+    
+    def llm_route(self, messages: List[Any]) -> tuple:
+        """Ask the LLM which node should handle the conversation. Returns (next node, reasoning)."""
+        prompt = self.routing_messages(messages)
+        # An unsure route is kept in case the escalation model gives none
+        unsure = None
+        for model, source in self.route_attempts():
+            route, escalate = self.review_route(model.invoke(prompt), source)
+            if route and not escalate:
+                return self.settle_route(route, source, messages)
+            unsure = unsure or route
+        return self.settle_route(unsure, "llm", messages)
+    
+    async def allm_route(self, messages: List[Any]) -> tuple:
+        prompt = self.routing_messages(messages)
+        unsure = None
+        for model, source in self.route_attempts():
+            route, escalate = self.review_route(await model.ainvoke(prompt), source)
+            if route and not escalate:
+                return self.settle_route(route, source, messages)
+            unsure = unsure or route
+        return self.settle_route(unsure, "llm", messages)
+    
+    def information_command(self, state: AgentState, result) -> Command:
         # Get the content from the last message
         content = result["messages"][-1].content
         
@@ -206,10 +420,46 @@ class DoctorAppointmentAgent:
             },
             goto="supervisor",
         )
-
-    def booking_node(self, state: AgentState) -> Command[Literal['supervisor']]:
-        print("*****************called booking node************")
+    
+    async def within_deadline(self, awaitable):
+        """Await a call, cancelling it if the turn's deadline passes first."""
+        left = time_left()
+        try:
+            return await asyncio.wait_for(awaitable, timeout=None if left is None else max(left, 0))
+        except asyncio.TimeoutError:
+            raise BudgetExceeded("deadline") from None
+    
+    def worker_stopped(self, state: AgentState, node: str, reason: str) -> Command:
+        """End the turn from a worker that ran out of budget, without another supervisor pass."""
+        TURN_BUDGET_STOPS.inc(reason=reason)
+        logger.warning("%s stopped early: %s budget exhausted", node, reason)
+        return Command(update={"next": END, "current_reasoning": f"Stopped early: {reason} budget exhausted",
+                               "messages": state["messages"] + [AIMessage(content=BUDGET_REPLY, name=node)]},
+                       goto=END)
+    
+    @timed(NODE_SECONDS, node="information_node")
+    def information_node(self, state: AgentState) -> Command[Literal['supervisor', '__end__']]:
+        logger.debug("Called information node")
+        
+        try:
+            with deadline_scope(state.get("deadline")):
+                result = self.information_agent.invoke(state)
+        except BudgetExceeded as e:
+            return self.worker_stopped(state, "information_node", e.reason)
+        return self.information_command(state, result)
+    
+    @timed(NODE_SECONDS, node="information_node")
+    async def ainformation_node(self, state: AgentState) -> Command[Literal['supervisor', '__end__']]:
+        logger.debug("Called information node")
         
+        try:
+            with deadline_scope(state.get("deadline")):
+                result = await self.within_deadline(self.information_agent.ainvoke(state))
+        except BudgetExceeded as e:
+            return self.worker_stopped(state, "information_node", e.reason)
+        return self.information_command(state, result)
+
+    def booking_state(self, state: AgentState) -> Dict[str, Any]:
         # Preprocess any messages in the state to handle date format with "at"
         processed_messages = []
         
@@ -226,43 +476,22 @@ class DoctorAppointmentAgent:
         # Replace the original messages with processed ones
         processed_state = dict(state)
         processed_state["messages"] = processed_messages
+        return processed_state
+    
+    def booking_content(self, result) -> str:
+        # Get the content from the last message
+        content = result["messages"][-1].content if result["messages"] else "No response received."
         
-        # Updated system prompt to handle date format with "at"
-        system_prompt = "You are specialized agent to set, cancel or reschedule appointment based on the query. You have access to the tool.\n Make sure to ask user politely if you need any further information to execute the tool.\n For your information, Always consider current year is 2024.\n Note: If the user provides a date format like '22-05-2024 at 14:30', please convert it to '22-05-2024 14:30' format before processing."
+        # Check if the content looks like a tool call and format it if needed
+        if content and ("<tool_call>" in content or "<｜tool▁calls▁end｜>" in content or "<｜tool▓l▁calls▓end▓｜>" in content):
+            content = format_tool_call_to_human_message(content)
         
-        system_prompt = ChatPromptTemplate.from_messages(
-                [
-                    (
-                        "system",
-                        system_prompt
-                    ),
-                    (
-                        "placeholder", 
-                        "{messages}"
-                    ),
-                ]
-            )
-            
-        booking_agent = create_react_agent(model=self.llm_model, tools=[set_appointment, cancel_appointment, reschedule_appointment], prompt=system_prompt)
-
-        try:
-            result = booking_agent.invoke(processed_state)
-            
-            # Get the content from the last message
-            content = result["messages"][-1].content if result["messages"] else "No response received."
-            
-            # Check if the content looks like a tool call and format it if needed
-            if content and ("<tool_call>" in content or "<｜tool▁calls▁end｜>" in content or "<｜tool▓l▁calls▓end▓｜>" in content):
-                content = format_tool_call_to_human_message(content)
-            
-            # If content is empty or None, provide a default message
-            if not content:
-                content = "I apologize, but I'm having trouble processing your request. Could you provide more details about your booking needs?"
-               
-        except Exception as e:
-            content = f"I apologize for the inconvenience. An error occurred while processing your request: {str(e)}"
-            print(f"Error in booking_node: {str(e)}")
-
+        # If content is empty or None, provide a default message
+        if not content:
+            content = "I apologize, but I'm having trouble processing your request. Could you provide more details about your booking needs?"
+        return content
+    
+    def booking_command(self, state: AgentState, content: str) -> Command:
         return Command(
             update={
                 "messages": state["messages"] + [
@@ -271,13 +500,47 @@ class DoctorAppointmentAgent:
             },
             goto="supervisor",
         )
+
+    @timed(NODE_SECONDS, node="booking_node")
+    def booking_node(self, state: AgentState) -> Command[Literal['supervisor', '__end__']]:
+        logger.debug("Called booking node")
+        
+        try:
+            with deadline_scope(state.get("deadline")):
+                content = self.booking_content(self.booking_agent.invoke(self.booking_state(state)))
+        except BudgetExceeded as e:
+            return self.worker_stopped(state, "booking_node", e.reason)
+        except Exception as e:
+            content = f"I apologize for the inconvenience. An error occurred while processing your request: {str(e)}"
+            logger.exception("Error in booking_node")
+
+        return self.booking_command(state, content)
+    
+    @timed(NODE_SECONDS, node="booking_node")
+    async def abooking_node(self, state: AgentState) -> Command[Literal['supervisor', '__end__']]:
+        logger.debug("Called booking node")
+        
+        try:
+            with deadline_scope(state.get("deadline")):
+                content = self.booking_content(await self.within_deadline(self.booking_agent.ainvoke(self.booking_state(state))))
+        except BudgetExceeded as e:
+            return self.worker_stopped(state, "booking_node", e.reason)
+        except Exception as e:
+            content = f"I apologize for the inconvenience. An error occurred while processing your request: {str(e)}"
+            logger.exception("Error in booking_node")
+
+        return self.booking_command(state, content)
         
 
-    def workflow(self):
+    def workflow(self, checkpointer=None, use_async=False):
+        """
+        Compile the supervisor graph. With use_async the nodes await the LLM and sub-agents,
+        and the graph must be run with ainvoke/astream. Sync tools still run in worker threads.
+        """
         self.graph = StateGraph(AgentState)
-        self.graph.add_node("supervisor", self.supervisor_node)
-        self.graph.add_node("information_node", self.information_node)
-        self.graph.add_node("booking_node", self.booking_node)
+        self.graph.add_node("supervisor", self.asupervisor_node if use_async else self.supervisor_node)
+        self.graph.add_node("information_node", self.ainformation_node if use_async else self.information_node)
+        self.graph.add_node("booking_node", self.abooking_node if use_async else self.booking_node)
         self.graph.add_edge(START, "supervisor")
-        self.app = self.graph.compile()
-        return self.app
\ No newline at end of file
+        self.app = self.graph.compile(checkpointer=checkpointer)
+        return self.app
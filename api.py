@@ -0,0 +1,205 @@
+"""
+JSON booking API for front-desk tools and integrations that already know the doctor and
+slot, so they skip the chat agent and its LLM calls. Requests are validated with the
+same models as the agent's tools and go straight to the availability store; each batch
+endpoint applies its whole list in one storage transaction, all or nothing.
+
+    GET    /availability?date=DD-MM-YYYY&doctor=...|specialization=...
+    POST   /availability/batch   {"queries": [{"date": ..., "doctor"|"specialization": ...}, ...]}
+    POST   /appointments         {"date": "DD-MM-YYYY HH:MM", "doctor": ..., "id_number": ...}
+    DELETE /appointments         same body as POST
+    PATCH  /appointments         same body plus "new_date"
+    POST|DELETE|PATCH /appointments/batch   {"appointments": [<body>, ...]}
+    GET    /holds?id_number=...
+    POST   /holds                {"date": ..., "doctor": ..., "id_number": ..., "ttl": seconds (optional)}
+    DELETE /holds                same body as POST, without "ttl"
+
+When BOOKING_API_TOKEN is set, requests must send it as "Authorization: Bearer <token>".
+"""
+import hmac
+import os
+from typing import Optional
+from flask import Blueprint, jsonify, request
+from pydantic import ValidationError
+from models import DOCTORS, SPECIALIZATIONS, DateModel, DateTimeModel, IdentificationNumberModel
+from toolkit.store import Operation, get_store
+from toolkit.timeslots import convert_datetime_format, format_time
+
+# Largest list accepted by a batch endpoint
+MAX_BATCH = 500
+
+ACTIONS = {'POST': 'book', 'DELETE': 'cancel', 'PATCH': 'reschedule'}
+
+api = Blueprint('api', __name__)
+
+
+def error_message(e: ValueError) -> str:
+    if isinstance(e, ValidationError):
+        return '; '.join(error['msg'].removeprefix('Value error, ') for error in e.errors())
+    return str(e)
+
+
+def error_response(message: str, status: int = 400, **extra):
+    return jsonify({'status': 'error', 'message': message, **extra}), status
+
+
+@api.before_request
+def check_token():
+    """Require the API token when one is configured."""
+    token = os.getenv('BOOKING_API_TOKEN')
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return error_response('Missing or invalid API token', 401)
+
+
+def parse_query(item) -> dict:
+    """Validate one availability query: a date and either a doctor or a specialization."""
+    if not isinstance(item, dict):
+        raise ValueError('Each query must be a JSON object')
+    date = DateModel(date=item.get('date') or '').date
+    doctor, specialization = item.get('doctor'), item.get('specialization')
+    if bool(doctor) == bool(specialization):
+        raise ValueError("Give either 'doctor' or 'specialization'")
+    if doctor and doctor not in DOCTORS:
+        raise ValueError(f'Unknown doctor: {doctor}')
+    if specialization and specialization not in SPECIALIZATIONS:
+        raise ValueError(f'Unknown specialization: {specialization}')
+    return {'date': date, 'doctor': doctor, 'specialization': specialization}
+
+
+def availability(query: dict) -> dict:
+    store = get_store()
+    if query['doctor']:
+        slots = store.available_by_doctor(query['date'], query['doctor'])
+        return {'date': query['date'], 'doctor': query['doctor'], 'slots': [format_time(minute) for minute in slots]}
+    doctors = store.available_by_specialization(query['date'], query['specialization'])
+    return {'date': query['date'], 'specialization': query['specialization'],
+            'doctors': {doctor: [format_time(minute) for minute in slots] for doctor, slots in doctors.items()}}
+
+
+def parse_operation(item, action: str) -> Operation:
+    """Validate one appointment request body into a store Operation."""
+    if not isinstance(item, dict):
+        raise ValueError('Each appointment must be a JSON object')
+    date = convert_datetime_format(DateTimeModel(date=item.get('date') or '').date)
+    new_date = None
+    if action == 'reschedule':
+        new_date = convert_datetime_format(DateTimeModel(date=item.get('new_date') or '').date)
+    patient = IdentificationNumberModel(id=item.get('id_number')).id
+    doctor = item.get('doctor')
+    if doctor not in DOCTORS:
+        raise ValueError(f'Unknown doctor: {doctor}')
+    return Operation(action, date, doctor, patient, new_date)
+
+
+def appointment(operation: Operation) -> dict:
+    body = {'date': operation.date_slot, 'doctor': operation.doctor_name, 'id_number': operation.patient}
+    if operation.new_date_slot:
+        body['new_date'] = operation.new_date_slot
+    return body
+
+
+def batch_items(key: str) -> Optional[list]:
+    data = request.get_json(silent=True)
+    items = data.get(key) if isinstance(data, dict) else None
+    return items if isinstance(items, list) else None
+
+
+def parse_all(items: list, parse) -> tuple:
+    """(parsed items, None), or (None, per-item errors) if any item is invalid."""
+    parsed, errors = [], []
+    for index, item in enumerate(items):
+        try:
+            parsed.append(parse(item))
+        except ValueError as e:
+            errors.append({'index': index, 'message': error_message(e)})
+    return (None, errors) if errors else (parsed, None)
+
+
+def success_status(action: str) -> int:
+    return 201 if action == 'book' else 200
+
+
+@api.route('/availability', methods=['GET'])
+def get_availability():
+    """Free slots of a doctor, or of every doctor of a specialization, on one date."""
+    try:
+        query = parse_query(request.args.to_dict())
+    except ValueError as e:
+        return error_response(error_message(e))
+    return jsonify({'status': 'success', **availability(query)})
+
+
+@api.route('/availability/batch', methods=['POST'])
+def get_availability_batch():
+    """Availability for a list of queries."""
+    queries = batch_items('queries')
+    if queries is None or len(queries) > MAX_BATCH:
+        return error_response(f"Expected a 'queries' list of at most {MAX_BATCH} items")
+    queries, errors = parse_all(queries, parse_query)
+    if errors:
+        return error_response('Invalid queries', errors=errors)
+    return jsonify({'status': 'success', 'results': [availability(query) for query in queries]})
+
+
+@api.route('/appointments', methods=['POST', 'DELETE', 'PATCH'])
+def appointments():
+    """Book (POST), cancel (DELETE) or reschedule (PATCH) one appointment."""
+    try:
+        operation = parse_operation(request.get_json(silent=True), ACTIONS[request.method])
+    except ValueError as e:
+        return error_response(error_message(e))
+    reason = get_store().apply_batch([operation])[0]
+    if reason:
+        return error_response(reason, 409)
+    return jsonify({'status': 'success', 'appointment': appointment(operation)}), success_status(operation.action)
+
+
+@api.route('/appointments/batch', methods=['POST', 'DELETE', 'PATCH'])
+def appointments_batch():
+    """Book, cancel or reschedule a list of appointments in one transaction."""
+    items = batch_items('appointments')
+    if items is None or len(items) > MAX_BATCH:
+        return error_response(f"Expected an 'appointments' list of at most {MAX_BATCH} items")
+    action = ACTIONS[request.method]
+    operations, errors = parse_all(items, lambda item: parse_operation(item, action))
+    if errors:
+        return error_response('Invalid appointments', errors=errors)
+    refusals = get_store().apply_batch(operations)
+    if any(refusals):
+        errors = [{'index': index, 'message': reason} for index, reason in enumerate(refusals) if reason]
+        return error_response('No changes were made', 409, errors=errors)
+    return jsonify({'status': 'success', 'appointments': [appointment(operation) for operation in operations]}), success_status(action)
+
+
+@api.route('/holds', methods=['GET'])
+def get_holds():
+    """A patient's live holds, with the seconds left on each."""
+    try:
+        patient = IdentificationNumberModel(id=request.args.get('id_number')).id
+    except ValueError as e:
+        return error_response(error_message(e))
+    holds = [{'date': date_slot, 'doctor': doctor, 'id_number': patient, 'ttl': round(seconds_left, 1)}
+             for date_slot, doctor, seconds_left in get_store().holds_for_patient(patient)]
+    return jsonify({'status': 'success', 'holds': holds})
+
+
+@api.route('/holds', methods=['POST', 'DELETE'])
+def holds():
+    """Hold a free slot for a patient until they book it, or release the hold."""
+    data = request.get_json(silent=True)
+    try:
+        operation = parse_operation(data, 'book')
+        ttl = data.get('ttl')
+        # JSON true and false are ints to Python, but not a number of seconds
+        if ttl is not None and (isinstance(ttl, bool) or not (isinstance(ttl, (int, float)) and 0 < ttl <= 3600)):
+            raise ValueError("'ttl' must be a number of seconds up to 3600")
+    except ValueError as e:
+        return error_response(error_message(e))
+    store = get_store()
+    if request.method == 'DELETE':
+        if not store.release_hold(operation.date_slot, operation.doctor_name, operation.patient):
+            return error_response('No hold on that slot for this patient', 404)
+        return jsonify({'status': 'success', 'hold': appointment(operation)})
+    if not store.hold(operation.date_slot, operation.doctor_name, operation.patient, ttl):
+        return error_response('Slot is not available', 409)
+    return jsonify({'status': 'success', 'hold': {**appointment(operation), 'ttl': ttl or store.hold_ttl}}), 201
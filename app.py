@@ -1,102 +1,88 @@
-from flask import Flask, render_template, request, jsonify, session
-from agent import DoctorAppointmentAgent
+from flask import Blueprint, Flask, Response, current_app, render_template, request, jsonify, session, stream_with_context
+from api import api
+from config import flag, secret_key
+from models import DOCTORS, SPECIALIZATIONS
+from toolkit.cache import availability_cache
+from toolkit.store import get_store
+from utils.conversations import make_conversation_store
+from utils.llm import llm_usage
+from utils.metrics import REGISTRY
+import functools
+import logging
 import os
+import json
+import threading
+import time
+import uuid
 from datetime import datetime
-from langchain_core.messages import HumanMessage, AIMessage  # Use correct import path
-
-app = Flask(__name__)
-app.secret_key = os.urandom(24)
-
-# Initialize the doctor appointment agent
-doctor_agent = DoctorAppointmentAgent()
-workflow = doctor_agent.workflow()
-
-# Helper functions for serialization/deserialization
-def serialize_message(message):
-    """Convert message objects to dictionaries for JSON serialization."""
-    if isinstance(message, HumanMessage):
-        return {
-            "type": "human",
-            "content": message.content,
-            "id": getattr(message, "id", None),
-            "additional_kwargs": getattr(message, "additional_kwargs", {})
-        }
-    elif isinstance(message, AIMessage):
-        return {
-            "type": "ai",
-            "content": message.content,
-            "name": getattr(message, "name", None),
-            "id": getattr(message, "id", None),
-            "additional_kwargs": getattr(message, "additional_kwargs", {})
-        }
-    elif isinstance(message, dict):
-        # It's already a dict, return as is
-        return message
-    else:
-        # Default case, try to convert to dict if it has content attribute
-        if hasattr(message, "content"):
-            return {
-                "type": "unknown",
-                "content": message.content
-            }
-        # If all else fails, convert to string
-        return {"type": "unknown", "content": str(message)}
-
-def deserialize_message(message_dict):
-    """Convert dictionaries back to message objects."""
-    if not isinstance(message_dict, dict):
-        return message_dict
-    
-    message_type = message_dict.get("type")
-    if message_type == "human":
-        return HumanMessage(
-            content=message_dict.get("content", ""),
-            additional_kwargs=message_dict.get("additional_kwargs", {})
-        )
-    elif message_type == "ai":
-        return AIMessage(
-            content=message_dict.get("content", ""),
-            name=message_dict.get("name"),
-            additional_kwargs=message_dict.get("additional_kwargs", {})
-        )
-    return message_dict
-
-def serialize_state(state):
-    """Convert state with message objects to JSON serializable dict."""
-    if not state:
-        return state
-    
-    serialized_state = dict(state)  # Create a copy
-    
-    # Serialize messages
-    if "messages" in serialized_state:
-        serialized_state["messages"] = [
-            serialize_message(msg) for msg in serialized_state["messages"]
-        ]
-    
-    return serialized_state
-
-def deserialize_state(state):
-    """Convert JSON serialized state back to state with message objects."""
-    if not state:
-        return state
-    
-    deserialized_state = dict(state)  # Create a copy
-    
-    # Deserialize messages
-    if "messages" in deserialized_state:
-        deserialized_state["messages"] = [
-            deserialize_message(msg) for msg in deserialized_state["messages"]
-        ]
-    
-    return deserialized_state
-
-@app.route('/')
+from typing import Optional
+from langchain_core.messages import HumanMessage, AIMessage, AIMessageChunk  # Use correct import path
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(),
+                    format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger(__name__)
+
+views = Blueprint('views', __name__)
+
+_services_lock = threading.RLock()
+
+def service(build):
+    """Build the decorated function's value once per process, on first use."""
+    built = []
+    
+    @functools.wraps(build)
+    def get():
+        if not built:
+            with _services_lock:
+                if not built:
+                    built.append(build())
+        return built[0]
+    return get
+
+@service
+def get_agent():
+    """The doctor appointment agent shared by all requests."""
+    # LangGraph, the tool schemas and the LLM client are only imported when the agent is built
+    from agent import DoctorAppointmentAgent
+    return DoctorAppointmentAgent()
+
+@service
+def get_conversations():
+    """Server-side conversation state, keyed by session id."""
+    return make_conversation_store()
+
+@service
+def get_workflow():
+    """The compiled supervisor graph, checkpointed by the conversation store."""
+    return get_agent().workflow(checkpointer=get_conversations().checkpointer)
+
+def warm_up():
+    """Load the slot store and compile the graph now, so a new worker's first requests don't pay for them."""
+    start = time.perf_counter()
+    get_store().load()
+    get_workflow()
+    logger.info("Warmed up in %.0f ms", (time.perf_counter() - start) * 1000)
+
+def create_app(warmup: Optional[bool] = None, dev: bool = False) -> Flask:
+    """
+    Build the Flask app. Unless `warmup` is False (default: the WARMUP setting, on),
+    warm_up() runs before the app is returned, i.e. before the worker starts serving.
+    `dev` is for the development server, which may sign sessions with a random key.
+    """
+    app = Flask(__name__)
+    app.secret_key = secret_key(dev)
+    app.register_blueprint(views)
+    app.register_blueprint(api)
+    if flag("WARMUP", True) if warmup is None else warmup:
+        warm_up()
+    return app
+
+@views.route('/')
 def index():
     """Render the main page of the application."""
     return render_template('index.html')
 
-@app.route('/login', methods=['POST'])
+@views.route('/login', methods=['POST'])
 def login():
     """Handle user login by accepting their ID number."""
     data = request.json
@@ -105,71 +91,46 @@ def login():
     if not id_number or not id_number.isdigit() or not (7 <= len(id_number) <= 8):
         return jsonify({'status': 'error', 'message': 'Please enter a valid 7-8 digit ID number'}), 400
     
-    # Store the ID in the session
+    # Store the ID in the session and start a fresh server-side conversation
     session['id_number'] = int(id_number)
+    session['sid'] = uuid.uuid4().hex
     
     return jsonify({'status': 'success', 'message': 'Login successful'})
 
-@app.route('/chat', methods=['POST'])
-def chat():
-    """Process user messages through the agent workflow."""
-    data = request.json
-    user_message = data.get('message', '')
+def turn_input(session_id, id_number, user_message):
+    """Build the graph input and checkpointer config for a new user message in a conversation."""
+    conversations = get_conversations()
+    conversations.touch(session_id)
+    config = conversations.config(session_id)
     
-    if not user_message:
-        return jsonify({'status': 'error', 'message': 'Message cannot be empty'}), 400
-    
-    # Check if user is logged in
-    if 'id_number' not in session:
-        return jsonify({'status': 'error', 'message': 'Please login first'}), 401
+    # Create a proper HumanMessage object
+    human_message = HumanMessage(content=user_message)
     
-    # Initialize the workflow with the user's ID
-    if 'state' not in session:
+    if not conversations.exists(session_id):
         # First message in the conversation
-        initial_state = {
-            'messages': [],
-            'id_number': session['id_number'],
-            'next': '',
-            'query': '',
-            'current_reasoning': ''
-        }
-        
-        # Create a proper HumanMessage object
-        human_message = HumanMessage(content=user_message)
-        
-        result = workflow.invoke({
+        graph_input = {
             'messages': [human_message],
-            'id_number': session['id_number'],
+            'id_number': id_number,
             'next': '',
             'query': user_message,
             'current_reasoning': ''
-        })
+        }
     else:
-        # Deserialize state, continue conversation
-        state = deserialize_state(session['state'])
-        if isinstance(state, dict):
-            if not state.get('messages'):
-                state['messages'] = []
-            
-            # Add the new message as a proper HumanMessage
-            human_message = HumanMessage(content=user_message)
-            state['messages'].append(human_message)
-            
-            # Invoke workflow
-            result = workflow.invoke(state)
-        else:
-            # Handle invalid state
-            human_message = HumanMessage(content=user_message)
-            result = workflow.invoke({
-                'messages': [human_message],
-                'id_number': session['id_number'],
-                'next': '',
-                'query': user_message,
-                'current_reasoning': ''
-            })
-    
-    # Extract the agent's response
-    agent_messages = result.get('messages', [])
+        # The checkpointer holds the history, so only the new message is sent
+        graph_input = {
+            'messages': [human_message],
+            'id_number': id_number
+        }
+    return graph_input, config
+
+def prepare_turn(user_message):
+    """Build the graph input and checkpointer config for a new user message in this session."""
+    if 'sid' not in session:
+        session['sid'] = uuid.uuid4().hex
+    return turn_input(session['sid'], session['id_number'], user_message)
+
+def latest_response(agent_messages):
+    """Return the most recent AI message content, or None."""
     responses = []
     
     # Find all AI messages and add them to the response
@@ -182,46 +143,147 @@ def chat():
             # Likely an AI message
             responses.append(message.content)
     
-    # Serialize and update the session state
-    session['state'] = serialize_state(result)
+    return responses[-1] if responses else None
+
+def chat_request_error(data, id_number):
+    """Return (message, status) if a chat request is invalid, otherwise None. `data` is None for a body that isn't JSON."""
+    if not isinstance(data, dict) or not data.get('message', ''):
+        return 'Message cannot be empty', 400
+    
+    # Check if user is logged in
+    if id_number is None:
+        return 'Please login first', 401
+    
+    return None
+
+def validate_chat_request():
+    """Return (user message, None) or (None, error response) for a chat request."""
+    data = request.get_json(silent=True)
+    error = chat_request_error(data, session.get('id_number'))
+    if error:
+        message, status = error
+        return None, (jsonify({'status': 'error', 'message': message}), status)
+    
+    return data['message'], None
+
+@views.route('/chat', methods=['POST'])
+def chat():
+    """Process user messages through the agent workflow."""
+    user_message, error = validate_chat_request()
+    if error:
+        return error
+    
+    graph_input, config = prepare_turn(user_message)
+    result = get_workflow().invoke(graph_input, config)
     
     # Return the most recent AI message
-    if responses:
-        return jsonify({'status': 'success', 'message': responses[-1]})
+    response = latest_response(result.get('messages', []))
+    if response is not None:
+        return jsonify({'status': 'success', 'message': response})
     else:
         return jsonify({'status': 'error', 'message': 'No response from the agent'}), 500
 
-@app.route('/doctors', methods=['GET'])
-def get_doctors():
-    """Get list of doctors for the frontend."""
-    doctors = [
-        'kevin anderson', 'robert martinez', 'susan davis', 'daniel miller',
-        'sarah wilson', 'michael green', 'lisa brown', 'jane smith',
-        'emily johnson', 'john doe'
-    ]
+def sse_event(event, data):
+    """Format one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def stream_events(mode, payload):
+    """Convert one item of workflow.stream(stream_mode=["updates", "messages"]) into SSE events."""
+    if mode == "updates":
+        for node, update in payload.items():
+            route = update.get('next') if isinstance(update, dict) else None
+            yield sse_event('node', {'node': node, 'next': route})
+    else:
+        chunk, metadata = payload
+        # Supervisor output is routing text, not part of the answer
+        if metadata.get('langgraph_node') == 'supervisor' or metadata.get('checkpoint_ns', '').startswith('supervisor'):
+            return
+        if isinstance(chunk, AIMessageChunk) and isinstance(chunk.content, str) and chunk.content:
+            yield sse_event('token', {'text': chunk.content})
+
+@views.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """Process a user message and stream node transitions and LLM tokens as Server-Sent Events."""
+    user_message, error = validate_chat_request()
+    if error:
+        return error
+    
+    graph_input, config = prepare_turn(user_message)
     
-    specializations = [
-        "general_dentist", "cosmetic_dentist", "prosthodontist", 
-        "pediatric_dentist", "emergency_dentist", "oral_surgeon", "orthodontist"
-    ]
+    workflow = get_workflow()
+    
+    def generate():
+        try:
+            for mode, payload in workflow.stream(graph_input, config, stream_mode=["updates", "messages"]):
+                for event in stream_events(mode, payload):
+                    yield event
+            
+            response = latest_response(workflow.get_state(config).values.get('messages', []))
+            if response is not None:
+                yield sse_event('message', {'status': 'success', 'message': response})
+            else:
+                yield sse_event('error', {'status': 'error', 'message': 'No response from the agent'})
+        except Exception as e:
+            current_app.logger.error(f"Error while streaming chat: {str(e)}")
+            yield sse_event('error', {'status': 'error', 'message': f"Server error: {str(e)}"})
+        yield sse_event('done', {})
     
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@views.route('/doctors', methods=['GET'])
+def get_doctors():
+    """Get list of doctors for the frontend."""
     return jsonify({
-        'doctors': doctors,
-        'specializations': specializations
+        'doctors': DOCTORS,
+        'specializations': SPECIALIZATIONS
     })
 
-@app.route('/favicon.ico')
+@views.route('/stats/router', methods=['GET'])
+def router_stats():
+    """Hit rate of the supervisor's rule-based fast path."""
+    return jsonify(get_agent().router.stats())
+
+@views.route('/stats/history', methods=['GET'])
+def history_stats():
+    """Estimated prompt tokens saved by supervisor history compaction."""
+    return jsonify(get_agent().history.stats())
+
+@views.route('/stats/cache', methods=['GET'])
+def cache_stats():
+    """Hit, miss and eviction counts of the availability result cache."""
+    return jsonify(availability_cache.stats())
+
+@views.route('/stats/llm-cache', methods=['GET'])
+def llm_cache_stats():
+    """Cached nodes, their TTLs and the size and hit counts of the LLM reply cache."""
+    llm_cache = get_agent().llm_cache
+    return jsonify(llm_cache.stats() if llm_cache else {'enabled': False})
+
+@views.route('/stats/llm', methods=['GET'])
+def llm_stats():
+    """Calls, mean latency and tokens of LLM calls per graph node and model, for tuning the model tiers."""
+    return jsonify(llm_usage())
+
+@views.route('/metrics', methods=['GET'])
+def metrics():
+    """Node, tool, LLM and store latency histograms in the Prometheus text format."""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@views.route('/favicon.ico')
 def favicon():
     """Handle favicon requests to prevent 500 errors."""
     return "", 204  # Return empty response with "No Content" status
 
-@app.route('/logout', methods=['POST'])
+@views.route('/logout', methods=['POST'])
 def logout():
-    """Clear the user session."""
+    """Clear the user session and its conversation."""
+    if 'sid' in session:
+        get_conversations().delete(session['sid'])
     session.clear()
     return jsonify({'status': 'success', 'message': 'Logged out successfully'})
 
-@app.template_filter('format_date')
+@views.app_template_filter('format_date')
 def format_date(date_str):
     """Format date string for display."""
     try:
@@ -231,10 +293,13 @@ def format_date(date_str):
         return date_str
 
 # Add an error handler for better debugging
-@app.errorhandler(Exception)
+@views.app_errorhandler(Exception)
 def handle_exception(e):
-    app.logger.error(f"Unhandled exception: {str(e)}")
+    current_app.logger.error(f"Unhandled exception: {str(e)}")
     return jsonify({"status": "error", "message": f"Server error: {str(e)}"}), 500
 
+# Running this file starts the development server, which signs sessions with a random key unless SECRET_KEY is set
+app = create_app(dev=__name__ == '__main__')
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,127 @@
+"""
+ASGI entry point. /chat and /chat/stream run the async graph on the event loop, so a
+single worker keeps many conversations in flight while they wait on the LLM. All other
+routes are served by the Flask app.
+
+    uvicorn asgi:app
+"""
+import asyncio
+import contextlib
+import uuid
+from a2wsgi import WSGIMiddleware
+from itsdangerous import BadSignature
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+from app import app as flask_app, get_agent, get_conversations, service, turn_input, latest_response, chat_request_error, sse_event, stream_events
+from config import flag
+
+session_serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+
+
+@service
+def get_async_workflow():
+    """The supervisor graph compiled with async nodes, sharing the Flask app's conversations."""
+    return get_agent().workflow(checkpointer=get_conversations().checkpointer, use_async=True)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    # The Flask app has warmed the store and sync graph on import; compile the async graph too
+    if flag("WARMUP", True):
+        await asyncio.to_thread(get_async_workflow)
+    yield
+
+
+def read_session(request: Request) -> dict:
+    """Decode the Flask session cookie so both apps share logins."""
+    cookie = request.cookies.get(flask_app.config['SESSION_COOKIE_NAME'])
+    if not cookie:
+        return {}
+    try:
+        return dict(session_serializer.loads(cookie, max_age=int(flask_app.permanent_session_lifetime.total_seconds())))
+    except BadSignature:
+        return {}
+
+
+async def start_turn(request: Request):
+    """Validate a chat request. Returns (graph input, config, session, None) or an error response last."""
+    try:
+        data = await request.json()
+    except ValueError:
+        # Empty or not JSON; refused like an empty message, as /chat on the Flask app does
+        data = None
+    session = read_session(request)
+    error = chat_request_error(data, session.get('id_number'))
+    if error:
+        message, status = error
+        return None, None, session, JSONResponse({'status': 'error', 'message': message}, status_code=status)
+
+    new_session = 'sid' not in session
+    if new_session:
+        session['sid'] = uuid.uuid4().hex
+    # Conversation bookkeeping may touch SQLite, so keep it off the event loop
+    graph_input, config = await asyncio.to_thread(turn_input, session['sid'], session['id_number'], data['message'])
+    return graph_input, config, session if new_session else None, None
+
+
+def save_session(response, session):
+    if session is not None:
+        response.set_cookie(flask_app.config['SESSION_COOKIE_NAME'], session_serializer.dumps(session), httponly=True)
+    return response
+
+
+async def chat(request: Request):
+    graph_input, config, session, error = await start_turn(request)
+    if error:
+        return error
+
+    result = await get_async_workflow().ainvoke(graph_input, config)
+
+    response = latest_response(result.get('messages', []))
+    if response is not None:
+        return save_session(JSONResponse({'status': 'success', 'message': response}), session)
+    return save_session(JSONResponse({'status': 'error', 'message': 'No response from the agent'}, status_code=500), session)
+
+
+async def chat_stream(request: Request):
+    graph_input, config, session, error = await start_turn(request)
+    if error:
+        return error
+
+    async_workflow = get_async_workflow()
+
+    async def generate():
+        try:
+            async for mode, payload in async_workflow.astream(graph_input, config, stream_mode=["updates", "messages"]):
+                for event in stream_events(mode, payload):
+                    yield event
+
+            state = await async_workflow.aget_state(config)
+            response = latest_response(state.values.get('messages', []))
+            if response is not None:
+                yield sse_event('message', {'status': 'success', 'message': response})
+            else:
+                yield sse_event('error', {'status': 'error', 'message': 'No response from the agent'})
+        except Exception as e:
+            flask_app.logger.error(f"Error while streaming chat: {str(e)}")
+            yield sse_event('error', {'status': 'error', 'message': f"Server error: {str(e)}"})
+        yield sse_event('done', {})
+
+    response = StreamingResponse(generate(), media_type='text/event-stream',
+                                 headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    return save_session(response, session)
+
+
+async def handle_exception(request: Request, e: Exception):
+    """Answer unhandled errors as the Flask app's error handler does."""
+    flask_app.logger.error(f"Unhandled exception: {str(e)}")
+    return JSONResponse({'status': 'error', 'message': f"Server error: {str(e)}"}, status_code=500)
+
+
+app = Starlette(lifespan=lifespan, exception_handlers={Exception: handle_exception}, routes=[
+    Route('/chat', chat, methods=['POST']),
+    Route('/chat/stream', chat_stream, methods=['POST']),
+    Mount('/', WSGIMiddleware(flask_app)),
+])
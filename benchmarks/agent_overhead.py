@@ -0,0 +1,62 @@
+"""
+Per-turn overhead of the worker nodes, measured against a fake LLM so only graph
+construction and execution are timed.
+
+    python -m benchmarks.agent_overhead [--turns 200]
+
+"rebuilt per turn" compiles the react sub-agent inside the node as the agent used to;
+"cached" reuses the sub-agent compiled once in DoctorAppointmentAgent.__init__.
+"""
+import argparse
+import os
+import time
+
+from langchain_core.messages import HumanMessage
+
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+
+from agent import DoctorAppointmentAgent, INFORMATION_PROMPT
+from toolkit.toolkits import check_availability_by_doctor, check_availability_by_specialization
+from utils.fake_llm import FixedReplyLLM
+from utils.llm_cache import LLMCache
+
+
+def time_turns(run_turn, turns: int) -> float:
+    run_turn()  # warm up
+    start = time.perf_counter()
+    for _ in range(turns):
+        run_turn()
+    return (time.perf_counter() - start) / turns * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=200)
+    args = parser.parse_args()
+
+    # No node opts in to the LLM cache, so every turn runs the graph end to end
+    agent = DoctorAppointmentAgent(llm_model=FixedReplyLLM(), llm_cache=LLMCache({}))
+    state = {
+        "messages": [HumanMessage(content="Is Dr. John Doe available on 05-08-2024?")],
+        "id_number": 1234567,
+        "next": "",
+        "query": "",
+        "current_reasoning": "",
+    }
+    tools = [check_availability_by_doctor, check_availability_by_specialization]
+
+    def rebuilt_turn():
+        agent.build_sub_agent(INFORMATION_PROMPT, tools, node="information_node").invoke(state)
+
+    def cached_turn():
+        agent.information_node(state)
+
+    rebuilt = time_turns(rebuilt_turn, args.turns)
+    cached = time_turns(cached_turn, args.turns)
+    print(f"rebuilt per turn: {rebuilt:.3f} ms/turn")
+    print(f"cached:           {cached:.3f} ms/turn")
+    print(f"saved:            {rebuilt - cached:.3f} ms/turn ({rebuilt / cached:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
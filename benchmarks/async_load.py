@@ -0,0 +1,90 @@
+"""
+Concurrent conversations served by a thread pool (sync graph, as under Flask) versus
+one event loop (async graph, as under asgi.py), against a fake LLM with fixed latency.
+
+    python -m benchmarks.async_load [--sessions 64] [--threads 8] [--latency 0.2] [--min-speedup 4]
+
+With the sync graph at most --threads turns wait on the LLM at once; the async graph
+keeps every session in flight, so its wall time stays near one turn's latency.
+Both legs send the same inputs, so the LLM reply cache is off: otherwise the second leg
+would replay the first leg's replies. Exits non-zero if the legs made different numbers
+of LLM calls, or if async is less than --min-speedup times faster than sync.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.memory import MemorySaver
+
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+
+from agent import DoctorAppointmentAgent
+from utils.fake_llm import ScriptedLLM
+from utils.llm_cache import LLMCache
+
+
+def turn_input(session: int):
+    graph_input = {
+        # Ambiguous on purpose, so the supervisor asks the LLM rather than the fast router
+        "messages": [HumanMessage(content="Could you help me with my dentist visit?")],
+        "id_number": 1000000 + session,
+        "next": "",
+        "query": "",
+        "current_reasoning": "",
+    }
+    return graph_input, {"configurable": {"thread_id": f"load-{session}"}}
+
+
+def run_sync(agent, sessions: int, threads: int) -> float:
+    workflow = agent.workflow(checkpointer=MemorySaver())
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(lambda session: workflow.invoke(*turn_input(session)), range(sessions)))
+    return time.perf_counter() - start
+
+
+async def run_async(agent, sessions: int) -> float:
+    workflow = agent.workflow(checkpointer=MemorySaver(), use_async=True)
+    start = time.perf_counter()
+    await asyncio.gather(*(workflow.ainvoke(*turn_input(session)) for session in range(sessions)))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=64)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per fake LLM call")
+    parser.add_argument("--min-speedup", type=float)
+    args = parser.parse_args()
+
+    llm = ScriptedLLM(latency=args.latency)
+    # No node opts in to the LLM cache, so every call of either leg reaches the fake model
+    agent = DoctorAppointmentAgent(llm_model=llm, llm_cache=LLMCache({}))
+
+    sync_seconds = run_sync(agent, args.sessions, args.threads)
+    sync_calls = llm.call_count
+    async_seconds = asyncio.run(run_async(agent, args.sessions))
+    async_calls = llm.call_count - sync_calls
+    speedup = sync_seconds / async_seconds
+    print(f"{args.sessions} sessions, {args.latency * 1000:.0f} ms per LLM call")
+    print(f"sync, {args.threads} threads: {sync_seconds:.2f} s ({args.sessions / sync_seconds:.1f} turns/s, {sync_calls} LLM calls)")
+    print(f"async, one loop:   {async_seconds:.2f} s ({args.sessions / async_seconds:.1f} turns/s, {async_calls} LLM calls)")
+    print(f"speedup: {speedup:.1f}x")
+
+    problems = []
+    if async_calls != sync_calls:
+        problems.append(f"the legs made {sync_calls} and {async_calls} LLM calls; they should send the same turns")
+    if args.min_speedup is not None and speedup < args.min_speedup:
+        problems.append(f"speedup {speedup:.1f}x is below {args.min_speedup}x")
+    for problem in problems:
+        print(problem)
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+End-to-end latency suite. Scripted conversations (check availability, book, reschedule,
+cancel) run through the graph and through Flask's /chat against the offline ScriptedLLM,
+with N sessions in parallel, on a scratch copy of the availability CSV.
+
+    python -m benchmarks.latency_suite [--target graph|http|both] [--sessions 8] [--latency 0.05]
+                                       [--max-p95-ms 800] [--max-calls-per-turn 3] [--json report.json]
+
+Reports p50/p95/p99 turn latency, LLM calls per turn and throughput. Exits non-zero when a
+turn misses its expected outcome or a --max-* limit is exceeded, so CI can gate on it.
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.memory import MemorySaver
+
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+
+from agent import DoctorAppointmentAgent
+from utils.fake_llm import ScriptedLLM
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), "..", "data", "doctor_availability.csv")
+
+
+def free_slots(csv_path: str, count: int):
+    """(date, doctor, first time, second time) for `count` distinct doctor-days with two free slots."""
+    df = pd.read_csv(csv_path)
+    df = df[df["is_available"]]
+    df[["date", "time"]] = df["date_slot"].str.split(" ", n=1, expand=True)
+    slots = []
+    for (date, doctor), group in df.groupby(["date", "doctor_name"], sort=True):
+        if len(group) >= 2:
+            slots.append((date, doctor, group["time"].iloc[0], group["time"].iloc[1]))
+    if len(slots) < count:
+        raise SystemExit(f"Only {len(slots)} doctor-days have two free slots; lower --sessions")
+    return slots[:count]
+
+
+def conversation(date: str, doctor: str, first: str, second: str):
+    """Scripted turns as (user message, text expected in the reply)."""
+    return [
+        (f"Is Dr. {doctor} available on {date}?", "Available slots"),
+        (f"Please book an appointment with Dr. {doctor} on {date} {first}", "successfully booked"),
+        (f"Please reschedule my appointment with Dr. {doctor} from {date} {first} to {date} {second}", "Successfully rescheduled"),
+        (f"Please cancel my appointment with Dr. {doctor} on {date} {second}", "successfully cancelled"),
+    ]
+
+
+def graph_session(llm):
+    agent = DoctorAppointmentAgent(llm_model=llm)
+    workflow = agent.workflow(checkpointer=MemorySaver())
+
+    def run(session: int, id_number: int, turns):
+        config = {"configurable": {"thread_id": f"suite-{session}"}}
+        results = []
+        for index, (message, expected) in enumerate(turns):
+            graph_input = {"messages": [HumanMessage(content=message)], "id_number": id_number}
+            if index == 0:
+                graph_input.update({"next": "", "query": message, "current_reasoning": ""})
+            start = time.perf_counter()
+            state = workflow.invoke(graph_input, config)
+            elapsed = time.perf_counter() - start
+            replies = [m.content for m in state["messages"] if isinstance(m, AIMessage)]
+            results.append((elapsed, bool(replies) and expected in replies[-1]))
+        return results
+
+    return run
+
+
+def http_session():
+    # app.py builds its own agent at import time, so the provider is picked via the environment
+    os.environ["LLM_PROVIDER"] = "fake"
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    # Keep the import free of warm-up; the suite builds its own app from the factory
+    os.environ.setdefault("WARMUP", "0")
+    from app import create_app, get_agent
+    app = create_app(warmup=False)
+
+    def run(session: int, id_number: int, turns):
+        client = app.test_client()
+        client.post("/login", json={"id_number": str(id_number)})
+        results = []
+        for message, expected in turns:
+            start = time.perf_counter()
+            response = client.post("/chat", json={"message": message})
+            elapsed = time.perf_counter() - start
+            body = response.get_json() or {}
+            results.append((elapsed, response.status_code == 200 and expected in body.get("message", "")))
+        return results
+
+    return run, get_agent().llm_model
+
+
+def run_target(name: str, run, llm, slots, sessions: int):
+    calls_before = llm.call_count
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        futures = [pool.submit(run, session, 2000000 + session, conversation(*slots[session])) for session in range(sessions)]
+        results = [turn for future in futures for turn in future.result()]
+    wall = time.perf_counter() - start
+
+    latencies = np.array([elapsed for elapsed, _ in results]) * 1000
+    return {
+        "target": name,
+        "sessions": sessions,
+        "turns": len(results),
+        "failed_turns": sum(1 for _, ok in results if not ok),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "llm_calls_per_turn": (llm.call_count - calls_before) / len(results),
+        "turns_per_second": len(results) / wall,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=["graph", "http", "both"], default="both")
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per fake LLM call")
+    parser.add_argument("--max-p95-ms", type=float)
+    parser.add_argument("--max-calls-per-turn", type=float)
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.add_argument("--verbose", action="store_true", help="log the agent's debug output")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING, force=True)
+
+    # Bookings go to a scratch copy so the suite is repeatable and leaves data/ untouched
+    workdir = tempfile.mkdtemp(prefix="latency-suite-")
+    csv_path = os.path.join(workdir, "doctor_availability.csv")
+    shutil.copy(DATA_FILE, csv_path)
+    os.environ.update({"BOOKING_BACKEND": "csv", "BOOKING_CSV_PATH": csv_path, "FAKE_LLM_LATENCY": str(args.latency)})
+
+    targets = ["graph", "http"] if args.target == "both" else [args.target]
+    slots = free_slots(csv_path, args.sessions * len(targets))
+    reports = []
+    for offset, target in enumerate(targets):
+        if target == "graph":
+            llm = ScriptedLLM(latency=args.latency)
+            run = graph_session(llm)
+        else:
+            run, llm = http_session()
+        target_slots = slots[offset * args.sessions:(offset + 1) * args.sessions]
+        reports.append(run_target(target, run, llm, target_slots, args.sessions))
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{'target':<8}{'turns':>7}{'failed':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'calls/turn':>12}{'turns/s':>9}")
+    for r in reports:
+        print(f"{r['target']:<8}{r['turns']:>7}{r['failed_turns']:>8}{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}"
+              f"{r['llm_calls_per_turn']:>12.2f}{r['turns_per_second']:>9.1f}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+
+    problems = []
+    for r in reports:
+        if r["failed_turns"]:
+            problems.append(f"{r['target']}: {r['failed_turns']} turns missed their expected outcome")
+        if args.max_p95_ms is not None and r["p95_ms"] > args.max_p95_ms:
+            problems.append(f"{r['target']}: p95 {r['p95_ms']:.1f} ms exceeds {args.max_p95_ms} ms")
+        if args.max_calls_per_turn is not None and r["llm_calls_per_turn"] > args.max_calls_per_turn:
+            problems.append(f"{r['target']}: {r['llm_calls_per_turn']:.2f} LLM calls per turn exceeds {args.max_calls_per_turn}")
+    for problem in problems:
+        print(problem)
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
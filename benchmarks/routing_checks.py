@@ -0,0 +1,172 @@
+"""
+Supervisor routing checks. Scripted conversations run through the graph against the
+offline ScriptedLLM, on a scratch copy of the availability CSV, and each check asserts
+on the metrics the turn should move.
+
+    python -m benchmarks.routing_checks [--verbose]
+
+misroute: the routing LLM sends a booking request to the information agent, which has
+no booking tools and asks the user for details; the supervisor hands the question to
+the booking agent, and supervisor_misroutes_total counts the handover.
+
+hops, loop: with the rule-based fast path off, the routing LLM keeps sending the turn
+back to a worker. The turn must stop after TURN_MAX_HOPS worker runs, or as soon as a
+worker would be handed the same message twice, and turn_budget_stops_total counts why.
+
+deadline: each LLM call takes 0.7 of TURN_DEADLINE (1 s unless set), so the information
+agent's second call starts in time but would end well after the deadline. The call must
+be cut off at the deadline, ending the turn with the budget apology.
+
+Exits non-zero if any check fails.
+"""
+import argparse
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.memory import MemorySaver
+
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+# Short turns, so the deadline check doesn't take a minute
+os.environ.setdefault("TURN_DEADLINE", "1")
+
+from agent import BUDGET_REPLY, DoctorAppointmentAgent
+from toolkit.store import get_store
+from utils.budget import TURN_DEADLINE, TURN_MAX_HOPS
+from utils.fake_llm import ScriptedLLM
+from utils.llm_cache import LLMCache
+from utils.metrics import MISROUTES, TURN_BUDGET_STOPS
+from utils.router import FastRouter
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), "..", "data", "doctor_availability.csv")
+ID_NUMBER = 1234567
+
+
+def router_call(next_node: str) -> AIMessage:
+    """A scripted Router reply of the supervisor's LLM."""
+    return AIMessage(content="", tool_calls=[{"name": "Router", "args": {"next": next_node, "reasoning": "Scripted.", "confidence": 0.9},
+                                              "id": f"call_{next_node}", "type": "tool_call"}])
+
+
+def run_turn(agent: DoctorAppointmentAgent, message: str) -> dict:
+    """Run one user turn in a fresh conversation and return the final state."""
+    graph_input = {"messages": [HumanMessage(content=message)], "id_number": ID_NUMBER,
+                   "next": "", "query": message, "current_reasoning": ""}
+    return agent.workflow(checkpointer=MemorySaver()).invoke(graph_input, {"configurable": {"thread_id": "routing-checks"}})
+
+
+def counted(counter, **labels) -> float:
+    return counter.values().get(counter._key(labels), 0.0)
+
+
+def check_misroute() -> list:
+    agent = DoctorAppointmentAgent(llm_model=ScriptedLLM(responses=[router_call("information_node")]), llm_cache=LLMCache({}))
+    before = counted(MISROUTES, source="information_node", target="booking_node")
+    state = run_turn(agent, "I'd like to book an appointment with Dr. John Doe")
+    problems = []
+    if counted(MISROUTES, source="information_node", target="booking_node") != before + 1:
+        problems.append("misroute: the handover from information_node to booking_node was not counted")
+    workers = [m.name for m in state["messages"] if isinstance(m, AIMessage) and m.name]
+    if workers != ["information_node", "booking_node"]:
+        problems.append(f"misroute: expected information_node then booking_node to reply, got {workers}")
+    return problems
+
+
+def llm_routed_agent(responses: list) -> DoctorAppointmentAgent:
+    """An agent whose supervisor always asks the LLM, replaying `responses` for its and the workers' calls in order."""
+    agent = DoctorAppointmentAgent(llm_model=ScriptedLLM(responses=responses), llm_cache=LLMCache({}))
+    # No rule is that confident, so every route falls back to the LLM
+    agent.router = FastRouter(confidence_threshold=1.01)
+    return agent
+
+
+def check_stop(name: str, responses: list, worker_runs: int) -> list:
+    """The turn must stop for budget `name` after `worker_runs` worker replies, ending on the last of them."""
+    agent = llm_routed_agent(responses)
+    before = counted(TURN_BUDGET_STOPS, reason=name)
+    state = run_turn(agent, "Is Dr. John Doe available on 05-08-2024?")
+    problems = []
+    if counted(TURN_BUDGET_STOPS, reason=name) != before + 1:
+        problems.append(f"{name}: the turn was not stopped by the {name} budget")
+    replies = [m for m in state["messages"] if isinstance(m, AIMessage) and m.name]
+    if len(replies) != worker_runs:
+        problems.append(f"{name}: expected {worker_runs} worker replies, got {len(replies)}")
+    if replies and replies[-1] is not state["messages"][-1]:
+        problems.append(f"{name}: the turn did not end on the latest worker reply")
+    return problems
+
+
+def check_hops() -> list:
+    # Each worker answers something new, so only the hop limit can end the turn
+    responses = []
+    for hop in range(TURN_MAX_HOPS):
+        responses += [router_call(("information_node", "booking_node")[hop % 2]), f"Partial answer {hop + 1}."]
+    responses.append(router_call("information_node"))
+    return check_stop("hops", responses, TURN_MAX_HOPS)
+
+
+def check_loop() -> list:
+    # The booking agent repeats the information agent's reply and is then sent it again
+    responses = [router_call("information_node"), "Dr. John Doe has free slots.",
+                 router_call("booking_node"), "Dr. John Doe has free slots.",
+                 router_call("booking_node")]
+    return check_stop("loop", responses, 2)
+
+
+def check_deadline() -> list:
+    # Load the slots now, so the tool call between the two LLM calls is quick
+    get_store().load()
+    agent = DoctorAppointmentAgent(llm_model=ScriptedLLM(latency=0.7 * TURN_DEADLINE), llm_cache=LLMCache({}))
+    before = counted(TURN_BUDGET_STOPS, reason="deadline")
+    start = time.perf_counter()
+    state = run_turn(agent, "Is Dr. John Doe available on 05-08-2024?")
+    elapsed = time.perf_counter() - start
+    problems = []
+    if counted(TURN_BUDGET_STOPS, reason="deadline") != before + 1:
+        problems.append("deadline: the turn was not stopped by the deadline")
+    if elapsed > TURN_DEADLINE * 1.2:
+        problems.append(f"deadline: the turn took {elapsed:.2f} s with a {TURN_DEADLINE:g} s deadline")
+    if state["messages"][-1].content != BUDGET_REPLY:
+        problems.append("deadline: the turn did not end with the budget apology")
+    return problems
+
+
+CHECKS = {
+    "misroute": check_misroute,
+    "hops": check_hops,
+    "loop": check_loop,
+    "deadline": check_deadline,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--verbose", action="store_true", help="log the agent's debug output")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING, force=True)
+
+    # Tools read a scratch copy so the checks leave data/ untouched
+    workdir = tempfile.mkdtemp(prefix="routing-checks-")
+    csv_path = os.path.join(workdir, "doctor_availability.csv")
+    shutil.copy(DATA_FILE, csv_path)
+    os.environ.update({"BOOKING_BACKEND": "csv", "BOOKING_CSV_PATH": csv_path})
+
+    problems = []
+    try:
+        for name, check in CHECKS.items():
+            failures = check()
+            print(f"{name:<12}{'FAIL' if failures else 'ok'}")
+            problems += failures
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    for problem in problems:
+        print(problem)
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
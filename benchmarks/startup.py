@@ -0,0 +1,72 @@
+"""
+Worker startup profile. Each run is a fresh interpreter that imports the app, so module
+caches are cold as on a new worker or an autoscaled instance.
+
+    python -m benchmarks.startup [--runs 5] [--top 15] [--provider groq|fake]
+
+Reports the median time to import app.py without warmup (WARMUP=0) and with it, the
+time of the first /chat request in each case, and the slowest imports from
+`python -X importtime`, as a baseline to compare changes against.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+PROBE = """
+import time
+start = time.perf_counter()
+import app
+booted = time.perf_counter()
+client = app.app.test_client()
+client.post('/login', json={'id_number': '1234567'})
+client.post('/chat', json={'message': 'Is Dr. John Doe available on 05-08-2024?'})
+print(booted - start, time.perf_counter() - booted)
+"""
+
+
+def run(code: str, env: dict, *flags: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, *flags, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+
+
+def slowest_imports(env: dict, top: int):
+    """(cumulative ms, self ms, module) of the slowest imports, outermost only."""
+    stderr = run("import app", env, "-X", "importtime").stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us) / 1000, int(self_us) / 1000, name.rstrip()))
+    rows.sort(reverse=True)
+    return rows[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--provider", choices=["groq", "fake"], default="fake",
+                        help="LLM provider; the first /chat needs 'fake' to run offline")
+    args = parser.parse_args()
+
+    env = {**os.environ, "LLM_PROVIDER": args.provider, "LOG_LEVEL": "WARNING"}
+    env.setdefault("GROQ_API_KEY", "benchmark")
+    env.setdefault("SECRET_KEY", "benchmark")
+    print(f"{'mode':<12}{'boot ms':>10}{'first chat ms':>15}")
+    for warmup in ("0", "1"):
+        samples = [run(PROBE, {**env, "WARMUP": warmup}).stdout.split() for _ in range(args.runs)]
+        boot = statistics.median(float(boot) for boot, _ in samples) * 1000
+        first = statistics.median(float(first) for _, first in samples) * 1000
+        print(f"{'WARMUP=' + warmup:<12}{boot:>10.0f}{first:>15.0f}")
+
+    print(f"\nSlowest imports of app.py (WARMUP=0):\n{'cumulative ms':>14}{'self ms':>10}  module")
+    for cumulative, self_ms, name in slowest_imports({**env, "WARMUP": "0"}, args.top):
+        print(f"{cumulative:>14.1f}{self_ms:>10.1f}  {name}")
+
+
+if __name__ == "__main__":
+    main()
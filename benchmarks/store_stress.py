@@ -0,0 +1,189 @@
+"""
+Concurrency stress test of the availability store: many threads booking in one process,
+on a scratch copy of the availability data.
+
+    python -m benchmarks.store_stress [--backend csv|journal|sqlite|snapshot] [--threads 1,2,4,8,16]
+                                      [--rounds 25] [--hot-slots 20] [--write-latency 0.01] [--min-speedup 2]
+
+For each thread count, a fresh store first has every thread race to book the same "hot"
+slots, each of which must end up with exactly one winner. Then every thread loops
+book -> reschedule to another date -> cancel over random free slots of the same doctors.
+A thread's cancel of its own booking must never fail, and when all threads are done the
+store must match a fresh load of the backend slot for slot.
+
+Reports operations per second per thread count. Exits non-zero on any double booking or
+mismatch, or if the highest thread count is less than --min-speedup times faster than
+one thread. Throughput scales with threads as far as backend writes wait on I/O, which
+concurrent writers share through group commit; --write-latency adds a fixed wait to every
+backend write, as a stand-in for a slow disk or a remote database.
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from toolkit.backends import CsvBackend, JournalBackend, SnapshotBackend, SqliteBackend, import_csv
+from toolkit.snapshot import import_csv as import_snapshot
+from toolkit.store import AvailabilityStore
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), "..", "data", "doctor_availability.csv")
+
+
+def slow_writes(backend, latency: float):
+    """Make every backend write wait `latency` seconds first."""
+    apply_versioned = backend.apply_versioned
+
+    def slow_apply(changes):
+        time.sleep(latency)
+        return apply_versioned(changes)
+
+    backend.apply_versioned = slow_apply
+    return backend
+
+
+def make_backend(kind: str, workdir: str):
+    csv_path = os.path.join(workdir, "doctor_availability.csv")
+    shutil.copy(DATA_FILE, csv_path)
+    if kind == "csv":
+        return CsvBackend(csv_path)
+    if kind == "journal":
+        return JournalBackend(csv_path, os.path.join(workdir, "doctor_availability.journal"))
+    if kind == "sqlite":
+        db_path = os.path.join(workdir, "doctor_availability.db")
+        import_csv(csv_path, db_path)
+        return SqliteBackend(db_path)
+    snapshot_path = os.path.join(workdir, "doctor_availability.snap")
+    import_snapshot(csv_path, snapshot_path)
+    return SnapshotBackend(snapshot_path)
+
+
+def free_slots_by_doctor(store: AvailabilityStore):
+    """{doctor: [(date, date_slot), ...]} of every free slot."""
+    table = store._refresh()
+    slots = defaultdict(list)
+    days, bits = np.nonzero(table.free[:, None] >> table.shifts & np.uint64(1))
+    for day, bit in zip(days.tolist(), bits.tolist()):
+        slots[table.doctors[table.day_doctor[day]]].append((int(table.day_date[day]), table.date_slot(day, bit)))
+    return slots
+
+
+def race_hot_slots(store: AvailabilityStore, slots, threads: int, hot_slots: int):
+    """Every thread books every hot slot; returns problems if a slot has no or several winners."""
+    rng = random.Random(1)
+    hot = rng.sample([(doctor, date_slot) for doctor, items in slots.items() for _, date_slot in items], hot_slots)
+    winners = defaultdict(list)
+    lock = threading.Lock()
+    barrier = threading.Barrier(threads)
+
+    def run(worker: int):
+        patient = 3000000 + worker
+        order = hot[:]
+        random.Random(worker).shuffle(order)
+        barrier.wait()
+        for doctor, date_slot in order:
+            if store.book(date_slot, doctor, patient):
+                with lock:
+                    winners[(doctor, date_slot)].append(patient)
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(run, range(threads)))
+    problems = [f"hot slot {key} booked by {len(winners[key])} patients" for key in hot if len(winners[key]) != 1]
+    problems += [f"hot slot {key} shows patient {store._table.patient[store._table.locate(key[1], key[0])]}, winner was {winners[key][0]}"
+                 for key in hot if len(winners[key]) == 1 and not store.has_appointment(key[1], key[0], winners[key][0])]
+    for doctor, date_slot in hot:
+        for patient in winners[(doctor, date_slot)]:
+            store.cancel(date_slot, doctor, patient)
+    return problems
+
+
+def churn(store: AvailabilityStore, slots, threads: int, rounds: int):
+    """Each thread books, reschedules to another date and cancels `rounds` times. Returns (operations, seconds, problems)."""
+    doctors = [doctor for doctor, items in slots.items() if len({date for date, _ in items}) > 1]
+    operations = [0] * threads
+    problems = []
+    barrier = threading.Barrier(threads)
+
+    def run(worker: int):
+        rng = random.Random(100 + worker)
+        patient = 4000000 + worker
+        barrier.wait()
+        for _ in range(rounds):
+            doctor = rng.choice(doctors)
+            (date, first), (other_date, second) = rng.sample(slots[doctor], 2)
+            operations[worker] += 1
+            if not store.book(first, doctor, patient):
+                continue
+            booked = first
+            operations[worker] += 1
+            if date != other_date and store.reschedule(first, second, doctor, patient):
+                booked = second
+            operations[worker] += 1
+            if not store.cancel(booked, doctor, patient):
+                problems.append(f"patient {patient} lost their booking of {booked} with {doctor}")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(run, range(threads)))
+    return sum(operations), time.perf_counter() - start, problems
+
+
+def compare_with_backend(store: AvailabilityStore):
+    """Problems if the store's table differs from a fresh load of its backend."""
+    table = store._refresh()
+    fresh = AvailabilityStore(store.backend)._refresh()
+    problems = []
+    if not np.array_equal(table.free, fresh.free):
+        problems.append(f"{int(np.count_nonzero(table.free != fresh.free))} doctor-days differ from the backend in free slots")
+    if not np.array_equal(table.patient, fresh.patient):
+        problems.append(f"{int(np.count_nonzero(table.patient != fresh.patient))} slots differ from the backend in patient")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=["csv", "journal", "sqlite", "snapshot"], default="csv")
+    parser.add_argument("--threads", default="1,2,4,8,16", help="comma-separated thread counts")
+    parser.add_argument("--rounds", type=int, default=25, help="book/reschedule/cancel rounds per thread")
+    parser.add_argument("--hot-slots", type=int, default=20)
+    parser.add_argument("--write-latency", type=float, default=0.0, help="seconds added to every backend write")
+    parser.add_argument("--min-speedup", type=float)
+    args = parser.parse_args()
+    thread_counts = [int(count) for count in args.threads.split(",")]
+
+    problems = []
+    throughput = {}
+    print(f"{'threads':>8}{'ops':>8}{'seconds':>10}{'ops/s':>10}")
+    for threads in thread_counts:
+        workdir = tempfile.mkdtemp(prefix="store-stress-")
+        try:
+            store = AvailabilityStore(slow_writes(make_backend(args.backend, workdir), args.write_latency))
+            slots = free_slots_by_doctor(store)
+            problems += race_hot_slots(store, slots, threads, args.hot_slots)
+            operations, seconds, churn_problems = churn(store, slots, threads, args.rounds)
+            problems += churn_problems + compare_with_backend(store)
+            if hasattr(store.backend, "stop_compactor"):
+                store.backend.stop_compactor()
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        throughput[threads] = operations / seconds
+        print(f"{threads:>8}{operations:>8}{seconds:>10.2f}{throughput[threads]:>10.0f}")
+
+    speedup = throughput[thread_counts[-1]] / throughput[thread_counts[0]]
+    print(f"speedup {thread_counts[0]} -> {thread_counts[-1]} threads: {speedup:.1f}x")
+    if args.min_speedup is not None and speedup < args.min_speedup:
+        problems.append(f"speedup {speedup:.1f}x is below {args.min_speedup}x")
+    for problem in problems:
+        print(problem)
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
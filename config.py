@@ -0,0 +1,40 @@
+"""
+Runtime settings, read from the environment. Relative paths are resolved against the
+project root rather than the working directory, so the app, the tools and the scripts
+find the same files wherever they are started from.
+"""
+import os
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.getenv("BOOKING_DATA_DIR", "data")
+
+
+def resolve_path(path: str) -> str:
+    """Absolute form of a path given relative to the project root."""
+    return os.path.normpath(os.path.join(ROOT_DIR, os.path.expanduser(path)))
+
+
+def data_path(filename: str, env_var: str = None) -> str:
+    """Path of a data file: the `env_var` setting if present, otherwise `filename` in BOOKING_DATA_DIR."""
+    return resolve_path((env_var and os.getenv(env_var)) or os.path.join(DATA_DIR, filename))
+
+
+def flag(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    return default if value is None else value.strip().lower() not in ("0", "false", "no", "off", "")
+
+
+def secret_key(dev: bool = False) -> bytes:
+    """
+    Key that signs session cookies, from SECRET_KEY. Every worker must use the same key,
+    or a session started on one is rejected by the next. Only for the development server
+    (`dev`, or FLASK_DEBUG) does a missing key fall back to a random one, good for a
+    single process.
+    """
+    key = os.getenv("SECRET_KEY")
+    if key:
+        return key.encode()
+    if dev or flag("FLASK_DEBUG", False):
+        return os.urandom(24)
+    raise RuntimeError("Set SECRET_KEY so all workers sign session cookies with the same key "
+                       "(or FLASK_DEBUG=1 for a random development key)")
@@ -1,6 +1,18 @@
 import re
+from typing import Optional
 from pydantic import BaseModel, Field, field_validator
 
+DOCTORS = [
+    'kevin anderson', 'robert martinez', 'susan davis', 'daniel miller',
+    'sarah wilson', 'michael green', 'lisa brown', 'jane smith',
+    'emily johnson', 'john doe'
+]
+
+SPECIALIZATIONS = [
+    "general_dentist", "cosmetic_dentist", "prosthodontist",
+    "pediatric_dentist", "emergency_dentist", "oral_surgeon", "orthodontist"
+]
+
 
 class DateTimeModel(BaseModel):
     date: str = Field(description="Properly formatted date", pattern=r'^\d{2}-\d{2}-\d{4} \d{2}:\d{2}$')
@@ -30,4 +42,16 @@ class IdentificationNumberModel(BaseModel):
     def check_format_id(cls, v):
         if not re.match(r'^\d{7,8}$', str(v)):  # Convert to string before matching
             raise ValueError("The ID number should be a 7 or 8-digit number")
-        return v
\ No newline at end of file
+        return v
+
+class SearchWindowModel(BaseModel):
+    start: str = Field(description="Earliest date or date-time to consider, 'DD-MM-YYYY' or 'DD-MM-YYYY HH:MM'")
+    end: Optional[str] = Field(default=None, description="Latest date or date-time to consider (inclusive); leave empty for no limit")
+    @field_validator("start", "end")
+    def check_format_bound(cls, v):
+        if v is None:
+            return v
+        v = v.replace(" at ", " ").strip()
+        if not re.match(r'^\d{2}-\d{2}-\d{4}( \d{2}:\d{2})?$', v):  # DD-MM-YYYY with an optional HH:MM
+            raise ValueError("Dates should be in format 'DD-MM-YYYY' or 'DD-MM-YYYY HH:MM'")
+        return v
@@ -229,10 +229,58 @@ function sendMessage() {
     // Clear input
     messageInput.value = '';
     
-    // Send to server
+    // Send to server, streaming the reply as it is generated
     showLoading();
     
-    fetch('/chat', {
+    streamMessage(message)
+    .catch(error => {
+        hideLoading();
+        addBotMessage('Sorry, I encountered an error processing your request. Please try again.');
+        showNotification(error.message, 'error');
+    });
+}
+
+// Progress text shown while each node is working
+const nodeProgress = {
+    supervisor: 'Understanding your request...',
+    information_node: 'Checking doctor availability...',
+    booking_node: 'Updating your appointment...'
+};
+
+// Send a message to /chat/stream and render its Server-Sent Events as they arrive
+function streamMessage(message) {
+    let streamingMessage = null;
+    let streamingText = '';
+    
+    function handleEvent({ event, data }) {
+        if (event === 'node') {
+            const progress = nodeProgress[data.next] || nodeProgress[data.node];
+            if (progress) {
+                setLoadingText(progress);
+            }
+        } else if (event === 'token') {
+            hideLoading();
+            streamingMessage = streamingMessage || addBotMessage('');
+            streamingText += data.text;
+            streamingMessage.querySelector('p').innerHTML = formatMessage(streamingText);
+            scrollToBottom();
+        } else if (event === 'message') {
+            hideLoading();
+            // The final message replaces the streamed tokens, which may include unformatted tool output
+            if (streamingMessage) {
+                streamingMessage.querySelector('p').innerHTML = formatMessage(data.message);
+            } else {
+                addBotMessage(data.message);
+            }
+            scrollToBottom();
+        } else if (event === 'error') {
+            throw new Error(data.message || 'Failed to send message');
+        } else if (event === 'done') {
+            hideLoading();
+        }
+    }
+    
+    return fetch('/chat/stream', {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
@@ -240,24 +288,56 @@ function sendMessage() {
         body: JSON.stringify({ message }),
     })
     .then(response => {
-        hideLoading();
         if (!response.ok) {
             return response.json().then(data => {
                 throw new Error(data.message || 'Failed to send message');
             });
         }
-        return response.json();
-    })
-    .then(data => {
-        // Add bot response to the chat
-        addBotMessage(data.message);
-    })
-    .catch(error => {
-        addBotMessage('Sorry, I encountered an error processing your request. Please try again.');
-        showNotification(error.message, 'error');
+        // Browsers without streaming bodies get all events once the response completes
+        if (!response.body || !window.TextDecoder) {
+            return response.text().then(text => parseEvents(text).forEach(handleEvent));
+        }
+        
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        
+        const read = () => reader.read().then(({ done, value }) => {
+            if (done) {
+                parseEvents(buffer).forEach(handleEvent);
+                return;
+            }
+            buffer += decoder.decode(value, { stream: true });
+            // Events are separated by a blank line; keep any partial event in the buffer
+            const boundary = buffer.lastIndexOf('\n\n');
+            if (boundary !== -1) {
+                parseEvents(buffer.slice(0, boundary)).forEach(handleEvent);
+                buffer = buffer.slice(boundary + 2);
+            }
+            return read();
+        });
+        return read();
     });
 }
 
+// Parse a block of Server-Sent Events into {event, data} objects
+function parseEvents(text) {
+    return text.split('\n\n')
+        .filter(block => block.trim())
+        .map(block => {
+            let event = 'message';
+            let data = '';
+            block.split('\n').forEach(line => {
+                if (line.startsWith('event:')) {
+                    event = line.slice(6).trim();
+                } else if (line.startsWith('data:')) {
+                    data += line.slice(5).trim();
+                }
+            });
+            return { event, data: data ? JSON.parse(data) : {} };
+        });
+}
+
 // Add user message to the chat
 function addUserMessage(message) {
     const messageElement = document.createElement('div');
@@ -282,6 +362,7 @@ function addBotMessage(message) {
     `;
     chatMessages.appendChild(messageElement);
     scrollToBottom();
+    return messageElement;
 }
 
 // Format message (convert line breaks to HTML)
@@ -380,6 +461,12 @@ function showLoading() {
 // Hide loading indicator
 function hideLoading() {
     loadingIndicator.classList.add('hidden');
+    setLoadingText('Processing your request...');
+}
+
+// Update the loading indicator's progress text
+function setLoadingText(text) {
+    loadingIndicator.querySelector('p').textContent = text;
 }
 
 // Show notification
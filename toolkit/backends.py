@@ -0,0 +1,585 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+import numpy as np
+import pandas as pd
+from config import data_path
+from toolkit.snapshot import NO_PATIENT, SlotColumns, columns_from_frame, columns_to_frame, read_snapshot, write_snapshot
+from toolkit.timeslots import parse_date_slot
+
+logger = logging.getLogger(__name__)
+
+DATA_PATH = data_path("doctor_availability.csv")
+DB_PATH = data_path("doctor_availability.db")
+JOURNAL_PATH = data_path("doctor_availability.journal")
+SNAPSHOT_PATH = data_path("doctor_availability.snap")
+COLUMNS = ['date_slot', 'specialization', 'doctor_name', 'is_available', 'patient_to_attend']
+
+
+def split_date_slot(date_slot: str) -> Tuple[str, str]:
+    """
+    Split a 'DD-MM-YYYY HH:MM' slot into its date and time parts.
+    Accepts 'HH.MM' and unpadded hours as well so formatted slots still match the file.
+    """
+    date, _, time = date_slot.strip().partition(' ')
+    hours, sep, minutes = time.replace('.', ':').partition(':')
+    return date, f"{hours.zfill(2)}{sep}{minutes}"
+
+
+def normalize_date_slot(date_slot: str) -> str:
+    return ' '.join(split_date_slot(date_slot))
+
+
+class SlotChange(NamedTuple):
+    """
+    A conditional update of one slot. `expected_patient` is None when the slot must
+    currently be free, `new_patient` is None when the slot is being released.
+    """
+    date_slot: str
+    doctor_name: str
+    expected_patient: Optional[int]
+    new_patient: Optional[int]
+
+
+class SlotBackend:
+    """Persistence layer behind the availability store."""
+    # Whether slot holds are stored here, for every process using the data to see, rather than by each store
+    stores_holds = False
+
+    def load(self) -> pd.DataFrame:
+        """Return every slot using the CSV column schema."""
+        raise NotImplementedError
+
+    def load_columns(self) -> SlotColumns:
+        """Every slot as SlotColumns, which is what the availability store is built from."""
+        return columns_from_frame(self.load()[COLUMNS])
+
+    def version(self):
+        """Token that changes whenever the stored data changes."""
+        raise NotImplementedError
+
+    def changes(self, since) -> Optional[Tuple[object, List[Tuple[str, str, Optional[int]]]]]:
+        """
+        (version, [(date_slot, doctor_name, patient or None), ...]) of the slots changed
+        after version `since`, or None if the backend can't list them and the data has
+        to be loaded again.
+        """
+        return None
+
+    def apply(self, changes: Iterable[SlotChange]) -> bool:
+        """Apply all changes atomically. Returns False, changing nothing, if any condition fails."""
+        return self.apply_versioned(changes) is not None
+
+    def apply_versioned(self, changes: Iterable[SlotChange]) -> Optional[Tuple[object, object]]:
+        """
+        Like apply(), but returns (version before, version after) of this write, or None if it
+        was refused. Both are read within the write, so a caller that was at the first version
+        knows the second holds its own changes and nobody else's.
+        """
+        raise NotImplementedError
+
+    def hold(self, date_slot: str, doctor_name: str, patient: int, expires: float) -> bool:
+        """
+        Hold a free slot for a patient until `expires` (time.time()), replacing their other
+        holds. Returns False if the slot is booked or held for someone else. Only for
+        backends that store holds; a held slot can't be booked for anyone else.
+        """
+        raise NotImplementedError
+
+    def release_hold(self, date_slot: str, doctor_name: str, patient: int) -> bool:
+        """Release a patient's live hold on a slot. Returns False if they do not hold it."""
+        raise NotImplementedError
+
+    def holder(self, date_slot: str, doctor_name: str) -> Optional[int]:
+        """Patient with a live hold on a slot, or None."""
+        raise NotImplementedError
+
+    def patient_holds(self, patient: int) -> List[Tuple[str, str, float]]:
+        """(date_slot, doctor_name, expires) of a patient's live holds."""
+        raise NotImplementedError
+
+
+class CsvBackend(SlotBackend):
+    """The original flat file, rewritten in full on every change."""
+
+    def __init__(self, path: str = DATA_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._frame = None
+        self._rows = {}
+        self._version = None
+
+    def version(self):
+        return os.stat(self.path).st_mtime_ns
+
+    def _read(self):
+        self._version = self.version()
+        self._frame = pd.read_csv(self.path)
+        self._rows = {
+            (normalize_date_slot(date_slot), doctor_name): label
+            for label, date_slot, doctor_name in zip(self._frame.index, self._frame['date_slot'], self._frame['doctor_name'])
+        }
+
+    def _assign(self, label, patient: Optional[int]):
+        self._frame.at[label, 'is_available'] = patient is None
+        self._frame.at[label, 'patient_to_attend'] = patient
+
+    def _write_snapshot(self) -> int:
+        """Write the frame out; returns the file's new version."""
+        # Write to a sibling file and swap it in so readers never see a half-written file
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        self._frame.to_csv(tmp_path, index=False)
+        # Taken before the swap, so a later edit by someone else can't pass for ours
+        version = os.stat(tmp_path).st_mtime_ns
+        os.replace(tmp_path, self.path)
+        return version
+
+    def _persist(self, changes: List[SlotChange]):
+        """Store the changes already applied to the frame; returns the new version."""
+        return self._write_snapshot()
+
+    def load(self) -> pd.DataFrame:
+        with self._lock:
+            self._read()
+            return self._frame[COLUMNS].copy()
+
+    def apply_versioned(self, changes: Iterable[SlotChange]) -> Optional[Tuple[object, object]]:
+        changes = list(changes)
+        with self._lock:
+            if self._frame is None or self.version() != self._version:
+                self._read()
+            before = self._version
+            df = self._frame
+            labels = []
+            for change in changes:
+                label = self._rows.get((change.date_slot, change.doctor_name))
+                if label is None:
+                    return None
+                patient = df.at[label, 'patient_to_attend']
+                if change.expected_patient is None:
+                    if not df.at[label, 'is_available']:
+                        return None
+                elif df.at[label, 'is_available'] or pd.isna(patient) or int(patient) != change.expected_patient:
+                    return None
+                labels.append(label)
+            for label, change in zip(labels, changes):
+                self._assign(label, change.new_patient)
+            self._version = self._persist(changes)
+            return before, self._version
+
+
+class JournalBackend(CsvBackend):
+    """
+    CSV snapshot plus an append-only journal of slot changes.
+    Each apply() appends one JSON line holding the whole batch and fsyncs it, so a
+    booking costs one small write regardless of calendar size. Loading replays the
+    journal over the snapshot; compact() folds the journal into a fresh snapshot.
+    Journal entries are plain assignments, so replaying a journal over a snapshot
+    that already contains it (a crash mid-compaction) gives the same state.
+    Appends are serialized within one process; use SqliteBackend for several writers.
+    """
+
+    def __init__(self, path: str = DATA_PATH, journal_path: str = JOURNAL_PATH):
+        super().__init__(path)
+        self.journal_path = journal_path
+        self._journal = None
+        self._events = 0
+        self._compactor = None
+        self._stop_compactor = threading.Event()
+
+    def version(self):
+        try:
+            journal_size = os.stat(self.journal_path).st_size
+        except FileNotFoundError:
+            journal_size = 0
+        return super().version(), journal_size
+
+    def _read(self):
+        super()._read()
+        self._events = 0
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, 'rb') as f:
+            lines = f.read().split(b'\n')
+        good_bytes = 0
+        for i, line in enumerate(lines):
+            if not line:
+                good_bytes += 1
+                continue
+            try:
+                entries = json.loads(line)
+            except ValueError:
+                if i < len(lines) - 1:
+                    raise ValueError(f"Corrupt entry in booking journal {self.journal_path} at line {i + 1}")
+                # A torn final write from a crash: drop it so new entries start on a clean line
+                with open(self.journal_path, 'r+b') as f:
+                    f.truncate(good_bytes)
+                break
+            for date_slot, doctor_name, patient in entries:
+                label = self._rows.get((date_slot, doctor_name))
+                if label is not None:
+                    self._assign(label, patient)
+            self._events += 1
+            good_bytes += len(line) + 1
+        self._version = self.version()
+
+    def _persist(self, changes: List[SlotChange]):
+        if self._journal is None:
+            self._journal = open(self.journal_path, 'ab')
+        entry = [[change.date_slot, change.doctor_name, change.new_patient] for change in changes]
+        self._journal.write(json.dumps(entry).encode() + b'\n')
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+        self._events += 1
+        return self._version[0], os.fstat(self._journal.fileno()).st_size
+
+    def compact(self) -> int:
+        """Fold the journal into a fresh snapshot. Returns the number of entries folded."""
+        with self._lock:
+            if self._frame is None or self.version() != self._version:
+                self._read()
+            events = self._events
+            if not events:
+                return 0
+            self._write_snapshot()
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            open(self.journal_path, 'wb').close()
+            self._events = 0
+            self._version = self.version()
+            return events
+
+    def start_compactor(self, interval: float = 300.0, min_events: int = 1):
+        """Compact in a daemon thread every `interval` seconds once `min_events` entries have piled up."""
+        if self._compactor is not None:
+            return self._compactor
+
+        def run():
+            while not self._stop_compactor.wait(interval):
+                if self._events >= min_events:
+                    try:
+                        self.compact()
+                    except Exception:
+                        logger.exception("Error compacting booking journal")
+
+        self._compactor = threading.Thread(target=run, name="journal-compactor", daemon=True)
+        self._compactor.start()
+        return self._compactor
+
+    def stop_compactor(self):
+        self._stop_compactor.set()
+        if self._compactor is not None:
+            self._compactor.join()
+            self._compactor = None
+
+
+class SnapshotBackend(SlotBackend):
+    """
+    Binary columnar snapshot (see toolkit.snapshot). Loading maps the file instead of
+    parsing text; the backend and the store each keep their own copies of the columns
+    they change. Like the CSV, the file is rewritten and swapped in on every change, so
+    one writer process is assumed.
+    """
+
+    def __init__(self, path: str = SNAPSHOT_PATH):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No availability snapshot at {path}; create one with `python -m toolkit.snapshot import`")
+        self.path = path
+        self._lock = threading.Lock()
+        self._columns = None
+        self._rows = {}
+        self._doctor_codes = {}
+        self._version = None
+
+    def version(self):
+        # A new snapshot is a new file, so the inode changes even within one mtime tick
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_ino
+
+    def load_columns(self) -> SlotColumns:
+        return read_snapshot(self.path)
+
+    def load(self) -> pd.DataFrame:
+        return columns_to_frame(read_snapshot(self.path))
+
+    def _read(self):
+        self._version = self.version()
+        columns = read_snapshot(self.path)
+        # Writable copies; the map itself is read-only and shared
+        self._columns = columns._replace(available=columns.available.copy(), patient=np.array(columns.patient))
+        self._rows = {key: row for row, key in enumerate(zip(columns.date.tolist(), columns.minute.tolist(), columns.doctor.tolist()))}
+        self._doctor_codes = {name: code for code, name in enumerate(columns.doctors)}
+
+    def _row(self, change: SlotChange) -> Optional[int]:
+        try:
+            date, minute = parse_date_slot(change.date_slot)
+        except ValueError:
+            return None
+        return self._rows.get((date, minute, self._doctor_codes.get(change.doctor_name)))
+
+    def apply_versioned(self, changes: Iterable[SlotChange]) -> Optional[Tuple[object, object]]:
+        changes = list(changes)
+        with self._lock:
+            if self._columns is None or self.version() != self._version:
+                self._read()
+            before = self._version
+            available, patients = self._columns.available, self._columns.patient
+            rows = []
+            for change in changes:
+                row = self._row(change)
+                if row is None:
+                    return None
+                if change.expected_patient is None:
+                    if not available[row]:
+                        return None
+                elif available[row] or int(patients[row]) != change.expected_patient:
+                    return None
+                rows.append(row)
+            # Change copies and keep them only once they are on disk, so a failed write changes nothing
+            available, patients = available.copy(), patients.copy()
+            for row, change in zip(rows, changes):
+                available[row] = change.new_patient is None
+                patients[row] = NO_PATIENT if change.new_patient is None else change.new_patient
+            columns = self._columns._replace(available=available, patient=patients)
+            stat = write_snapshot(columns, self.path)
+            self._columns = columns
+            self._version = stat.st_mtime_ns, stat.st_ino
+            return before, self._version
+
+
+class SqliteBackend(SlotBackend):
+    """
+    SQLite storage using WAL mode. Every change is a conditional row-level UPDATE and
+    a batch of changes (e.g. a reschedule) commits in a single transaction, so several
+    worker processes can share the database without a global lock.
+
+    A trigger logs every slot update in slot_changes under an increasing sequence
+    number, which is the version. A process that sees the version move reads only
+    the rows logged since, rather than reloading every slot. The log keeps the last
+    CHANGE_LOG_SIZE entries.
+
+    Slot holds are kept in the holds table with a wall-clock expiry, and the UPDATE that
+    books a slot checks it, so a hold taken through one worker holds on all of them.
+    """
+    stores_holds = True
+    # Changes kept in the log; a reader further behind than this reloads everything
+    CHANGE_LOG_SIZE = 10000
+    # The log is trimmed every this many writes
+    TRIM_EVERY = 256
+
+    def __init__(self, path: str = DB_PATH, timeout: float = 30.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._writes = 0
+        self._create()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _create(self):
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS slots ("
+            " date_slot TEXT NOT NULL,"
+            " specialization TEXT NOT NULL,"
+            " doctor_name TEXT NOT NULL,"
+            " is_available INTEGER NOT NULL,"
+            " patient_to_attend INTEGER,"
+            " PRIMARY KEY (date_slot, doctor_name))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS slots_patient ON slots (patient_to_attend)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS slot_changes ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " date_slot TEXT NOT NULL,"
+            " doctor_name TEXT NOT NULL,"
+            " patient_to_attend INTEGER)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS holds ("
+            " date_slot TEXT NOT NULL,"
+            " doctor_name TEXT NOT NULL,"
+            " patient INTEGER NOT NULL,"
+            " expires REAL NOT NULL,"
+            " PRIMARY KEY (date_slot, doctor_name))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS holds_patient ON holds (patient)")
+        conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS slots_changed AFTER UPDATE ON slots BEGIN"
+            " INSERT INTO slot_changes (date_slot, doctor_name, patient_to_attend)"
+            " VALUES (NEW.date_slot, NEW.doctor_name, CASE WHEN NEW.is_available THEN NULL ELSE NEW.patient_to_attend END);"
+            " END"
+        )
+        conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS slots_inserted AFTER INSERT ON slots BEGIN"
+            " INSERT INTO slot_changes (date_slot, doctor_name, patient_to_attend)"
+            " VALUES (NEW.date_slot, NEW.doctor_name, CASE WHEN NEW.is_available THEN NULL ELSE NEW.patient_to_attend END);"
+            " END"
+        )
+
+    def version(self):
+        # Each thread asks on its own connection, so readers don't queue behind one another
+        row = self._connect().execute("SELECT seq FROM sqlite_sequence WHERE name = 'slot_changes'").fetchone()
+        return row[0] if row else 0
+
+    def changes(self, since) -> Optional[Tuple[int, List[Tuple[str, str, Optional[int]]]]]:
+        if not isinstance(since, int):
+            return None
+        rows = self._connect().execute(
+            "SELECT seq, date_slot, doctor_name, patient_to_attend FROM slot_changes WHERE seq > ? ORDER BY seq", (since,)
+        ).fetchall()
+        if not rows:
+            # Nothing logged after `since`: either nothing changed or the log was cleared
+            return (since, []) if self.version() == since else None
+        if rows[0][0] != since + 1:
+            # Trimmed past `since`
+            return None
+        return rows[-1][0], [(date_slot, doctor_name, patient) for _, date_slot, doctor_name, patient in rows]
+
+    def _trim(self, conn: sqlite3.Connection):
+        conn.execute("DELETE FROM slot_changes WHERE seq <= (SELECT MAX(seq) FROM slot_changes) - ?", (self.CHANGE_LOG_SIZE,))
+
+    def load(self) -> pd.DataFrame:
+        df = pd.read_sql_query(
+            "SELECT date_slot, specialization, doctor_name, is_available, patient_to_attend FROM slots",
+            self._connect(),
+        )
+        df['is_available'] = df['is_available'].astype(bool)
+        return df
+
+    def apply_versioned(self, changes: Iterable[SlotChange]) -> Optional[Tuple[object, object]]:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # The write lock is held from here, so nobody else's change can fall between the two reads
+            before = self.version()
+            now = time.time()
+            for change in changes:
+                if change.expected_patient is None:
+                    # Free, and not held for anyone else
+                    cursor = conn.execute(
+                        "UPDATE slots SET is_available=?, patient_to_attend=?"
+                        " WHERE date_slot=? AND doctor_name=? AND is_available=1 AND NOT EXISTS ("
+                        "  SELECT 1 FROM holds WHERE holds.date_slot = slots.date_slot AND holds.doctor_name = slots.doctor_name"
+                        "  AND holds.patient != ? AND holds.expires > ?)",
+                        (int(change.new_patient is None), change.new_patient, change.date_slot, change.doctor_name,
+                         change.new_patient, now),
+                    )
+                else:
+                    cursor = conn.execute(
+                        "UPDATE slots SET is_available=?, patient_to_attend=?"
+                        " WHERE date_slot=? AND doctor_name=? AND is_available=0 AND patient_to_attend=?",
+                        (int(change.new_patient is None), change.new_patient, change.date_slot, change.doctor_name,
+                         change.expected_patient),
+                    )
+                if cursor.rowcount != 1:
+                    conn.execute("ROLLBACK")
+                    return None
+                if change.new_patient is not None:
+                    # Booking a slot confirms the patient's hold on it
+                    conn.execute("DELETE FROM holds WHERE date_slot=? AND doctor_name=?", (change.date_slot, change.doctor_name))
+            self._writes += 1
+            if self._writes % self.TRIM_EVERY == 0:
+                self._trim(conn)
+            after = self.version()
+            conn.execute("COMMIT")
+            return before, after
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def hold(self, date_slot: str, doctor_name: str, patient: int, expires: float) -> bool:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM holds WHERE expires <= ?", (time.time(),))
+            free = conn.execute("SELECT 1 FROM slots WHERE date_slot=? AND doctor_name=? AND is_available=1",
+                                (date_slot, doctor_name)).fetchone()
+            taken = conn.execute("SELECT 1 FROM holds WHERE date_slot=? AND doctor_name=? AND patient != ?",
+                                 (date_slot, doctor_name, patient)).fetchone()
+            if not free or taken:
+                conn.execute("ROLLBACK")
+                return False
+            conn.execute("DELETE FROM holds WHERE patient=?", (patient,))
+            conn.execute("INSERT INTO holds VALUES (?, ?, ?, ?)", (date_slot, doctor_name, patient, expires))
+            conn.execute("COMMIT")
+            return True
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def release_hold(self, date_slot: str, doctor_name: str, patient: int) -> bool:
+        cursor = self._connect().execute("DELETE FROM holds WHERE date_slot=? AND doctor_name=? AND patient=? AND expires > ?",
+                                         (date_slot, doctor_name, patient, time.time()))
+        return cursor.rowcount == 1
+
+    def holder(self, date_slot: str, doctor_name: str) -> Optional[int]:
+        row = self._connect().execute("SELECT patient FROM holds WHERE date_slot=? AND doctor_name=? AND expires > ?",
+                                      (date_slot, doctor_name, time.time())).fetchone()
+        return row[0] if row else None
+
+    def patient_holds(self, patient: int) -> List[Tuple[str, str, float]]:
+        return self._connect().execute("SELECT date_slot, doctor_name, expires FROM holds WHERE patient=? AND expires > ? ORDER BY expires",
+                                       (patient, time.time())).fetchall()
+
+
+def import_csv(csv_path: str = DATA_PATH, db_path: str = DB_PATH) -> int:
+    """One-shot import of the CSV schema into a SQLite database. Returns the number of rows."""
+    df = pd.read_csv(csv_path)
+    rows = [
+        (normalize_date_slot(date_slot), specialization, doctor_name, int(bool(is_available)),
+         None if pd.isna(patient) else int(patient))
+        for date_slot, specialization, doctor_name, is_available, patient in df[COLUMNS].itertuples(index=False)
+    ]
+    backend = SqliteBackend(db_path)
+    conn = backend._connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.executemany("INSERT OR REPLACE INTO slots VALUES (?, ?, ?, ?, ?)", rows)
+        # Readers reload after an import rather than replaying it row by row
+        conn.execute("DELETE FROM slot_changes")
+        conn.execute("DELETE FROM holds")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return len(rows)
+
+
+def make_backend() -> SlotBackend:
+    """Pick the backend from the BOOKING_BACKEND environment variable ('csv', 'journal', 'snapshot' or 'sqlite')."""
+    kind = os.getenv("BOOKING_BACKEND", "csv").lower()
+    if kind == "csv":
+        return CsvBackend(data_path("doctor_availability.csv", "BOOKING_CSV_PATH"))
+    if kind == "journal":
+        backend = JournalBackend(data_path("doctor_availability.csv", "BOOKING_CSV_PATH"),
+                                 data_path("doctor_availability.journal", "BOOKING_JOURNAL_PATH"))
+        backend.start_compactor(float(os.getenv("BOOKING_COMPACT_INTERVAL", "300")))
+        return backend
+    if kind == "snapshot":
+        return SnapshotBackend(data_path("doctor_availability.snap", "BOOKING_SNAPSHOT_PATH"))
+    if kind == "sqlite":
+        return SqliteBackend(data_path("doctor_availability.db", "BOOKING_DB_PATH"))
+    raise ValueError(f"Unknown booking backend: {kind}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Import the availability CSV into SQLite.")
+    parser.add_argument("--csv", default=DATA_PATH)
+    parser.add_argument("--db", default=DB_PATH)
+    args = parser.parse_args()
+    print(f"Imported {import_csv(args.csv, args.db)} slots into {args.db}")
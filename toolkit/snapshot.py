@@ -0,0 +1,197 @@
+"""
+Binary columnar snapshot of the availability data. Every slot is one row of
+fixed-width integer columns (date ordinal, minute of day, doctor and specialization
+codes, patient id) plus a bit in the status bitmap, so loading is a memory map
+instead of parsing text. Each process still builds its own slot table from the map,
+so the pages are only shared while it is being read.
+
+File layout: the magic bytes, a little-endian uint32 header length, a JSON header with
+the row count, the doctor and specialization names the codes refer to and the dtype,
+offset and size of each column, then the columns, each aligned to 64 bytes.
+
+The CSV stays the interchange format:
+
+    python -m toolkit.snapshot import [--csv data/doctor_availability.csv] [--snapshot data/doctor_availability.snap]
+    python -m toolkit.snapshot export [--snapshot ...] [--csv ...]
+"""
+import json
+import os
+import struct
+import threading
+from typing import List, NamedTuple
+import numpy as np
+import pandas as pd
+from config import data_path
+from toolkit.timeslots import DATE_FORMAT, EPOCH_ORDINAL, parse_date_slot_column
+
+MAGIC = b"SLOTSNP1"
+FORMAT_VERSION = 1
+ALIGN = 64
+NO_PATIENT = -1
+CSV_PATH = data_path("doctor_availability.csv")
+SNAPSHOT_PATH = data_path("doctor_availability.snap")
+COLUMN_DTYPES = {
+    "date": "<i4",
+    "minute": "<i2",
+    "doctor": "<i2",
+    "specialization": "<i2",
+    "status": "u1",
+    "patient": "<i8",
+}
+
+
+def aligned(size: int) -> int:
+    return -(-size // ALIGN) * ALIGN
+
+
+class SlotColumns(NamedTuple):
+    """
+    The availability data as parallel arrays, one entry per slot. `doctor` and
+    `specialization` are codes into the name lists, which are sorted, and `patient`
+    is NO_PATIENT where nobody is booked.
+    """
+    date: np.ndarray
+    minute: np.ndarray
+    doctor: np.ndarray
+    specialization: np.ndarray
+    available: np.ndarray
+    patient: np.ndarray
+    doctors: List[str]
+    specializations: List[str]
+
+
+def columns_from_frame(df: pd.DataFrame) -> SlotColumns:
+    """SlotColumns of a frame in the CSV column schema."""
+    date, minute = parse_date_slot_column(df['date_slot'])
+    doctor = pd.Categorical(df['doctor_name'])
+    specialization = pd.Categorical(df['specialization'])
+    return SlotColumns(
+        date=date,
+        minute=minute,
+        doctor=doctor.codes.astype(np.int16),
+        specialization=specialization.codes.astype(np.int16),
+        available=df['is_available'].to_numpy().astype(bool),
+        patient=df['patient_to_attend'].fillna(NO_PATIENT).to_numpy().astype(np.int64),
+        doctors=list(doctor.categories),
+        specializations=list(specialization.categories),
+    )
+
+
+def columns_to_frame(columns: SlotColumns) -> pd.DataFrame:
+    """Frame in the CSV column schema; patient ids are floats with NaN for free slots, as pandas reads them."""
+    dates = pd.to_datetime(np.asarray(columns.date, dtype=np.int64) - EPOCH_ORDINAL, unit="D").strftime(DATE_FORMAT)
+    hours, minutes = np.divmod(np.asarray(columns.minute, dtype=np.int64), 60)
+    times = pd.Series(hours).map("{:02d}".format) + ":" + pd.Series(minutes).map("{:02d}".format)
+    patient = np.asarray(columns.patient)
+    return pd.DataFrame({
+        'date_slot': pd.Series(dates) + " " + times,
+        'specialization': np.asarray(columns.specializations, dtype=object)[columns.specialization],
+        'doctor_name': np.asarray(columns.doctors, dtype=object)[columns.doctor],
+        'is_available': np.asarray(columns.available, dtype=bool),
+        'patient_to_attend': np.where(patient == NO_PATIENT, np.nan, patient.astype(np.float64)),
+    })
+
+
+def write_snapshot(columns: SlotColumns, path: str = SNAPSHOT_PATH) -> os.stat_result:
+    """
+    Write a snapshot to a sibling file and swap it in, so readers and existing maps never
+    see a partial file. Returns the stat of the file written, taken before the swap.
+    """
+    arrays = {
+        "date": columns.date,
+        "minute": columns.minute,
+        "doctor": columns.doctor,
+        "specialization": columns.specialization,
+        "status": np.packbits(np.asarray(columns.available, dtype=bool), bitorder="little"),
+        "patient": columns.patient,
+    }
+    arrays = {name: np.ascontiguousarray(array, dtype=COLUMN_DTYPES[name]) for name, array in arrays.items()}
+    layout, offset = {}, 0
+    for name, array in arrays.items():
+        layout[name] = [COLUMN_DTYPES[name], offset, array.nbytes]
+        offset += aligned(array.nbytes)
+    header = json.dumps({
+        "version": FORMAT_VERSION,
+        "rows": len(columns.date),
+        "doctors": list(columns.doctors),
+        "specializations": list(columns.specializations),
+        "columns": layout,
+    }).encode()
+    data_start = aligned(len(MAGIC) + 4 + len(header))
+
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC + struct.pack("<I", len(header)) + header)
+        for name, array in arrays.items():
+            f.seek(data_start + layout[name][1])
+            f.write(array.tobytes())
+        f.truncate(data_start + offset)
+        f.flush()
+        os.fsync(f.fileno())
+        stat = os.fstat(f.fileno())
+    os.replace(tmp_path, path)
+    return stat
+
+
+def read_snapshot(path: str = SNAPSHOT_PATH) -> SlotColumns:
+    """Map a snapshot read-only. The integer columns are views of the map; only the status bitmap is unpacked."""
+    with open(path, "rb") as f:
+        prefix = f.read(len(MAGIC) + 4)
+        if len(prefix) < len(MAGIC) + 4 or prefix[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not an availability snapshot")
+        header_length = struct.unpack("<I", prefix[len(MAGIC):])[0]
+        header = json.loads(f.read(header_length))
+    if header.get("version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported availability snapshot version in {path}: {header.get('version')}")
+    rows = header["rows"]
+    data_start = aligned(len(MAGIC) + 4 + header_length)
+    buffer = np.memmap(path, dtype=np.uint8, mode="r")
+
+    def column(name: str) -> np.ndarray:
+        dtype, offset, nbytes = header["columns"][name]
+        start = data_start + offset
+        return buffer[start:start + nbytes].view(dtype)
+
+    columns = SlotColumns(
+        date=column("date"),
+        minute=column("minute"),
+        doctor=column("doctor"),
+        specialization=column("specialization"),
+        available=np.unpackbits(column("status"), count=rows, bitorder="little").astype(bool),
+        patient=column("patient"),
+        doctors=header["doctors"],
+        specializations=header["specializations"],
+    )
+    if any(len(array) != rows for array in columns[:6]):
+        raise ValueError(f"Truncated availability snapshot: {path}")
+    return columns
+
+
+def import_csv(csv_path: str = CSV_PATH, snapshot_path: str = SNAPSHOT_PATH) -> int:
+    """Write a snapshot of the availability CSV. Returns the number of slots."""
+    columns = columns_from_frame(pd.read_csv(csv_path))
+    write_snapshot(columns, snapshot_path)
+    return len(columns.date)
+
+
+def export_csv(snapshot_path: str = SNAPSHOT_PATH, csv_path: str = CSV_PATH) -> int:
+    """Write a snapshot back out as the availability CSV. Returns the number of slots."""
+    df = columns_to_frame(read_snapshot(snapshot_path))
+    tmp_path = f"{csv_path}.{os.getpid()}.tmp"
+    df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, csv_path)
+    return len(df)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert between the availability CSV and its binary snapshot.")
+    parser.add_argument("command", choices=["import", "export"], help="import: CSV to snapshot, export: snapshot to CSV")
+    parser.add_argument("--csv", default=CSV_PATH)
+    parser.add_argument("--snapshot", default=SNAPSHOT_PATH)
+    args = parser.parse_args()
+    if args.command == "import":
+        print(f"Wrote {import_csv(args.csv, args.snapshot)} slots to {args.snapshot}")
+    else:
+        print(f"Wrote {export_csv(args.snapshot, args.csv)} slots to {args.csv}")
@@ -0,0 +1,747 @@
+import itertools
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+import numpy as np
+import pandas as pd
+from toolkit.backends import SlotBackend, SlotChange, CsvBackend, make_backend
+from toolkit.snapshot import NO_PATIENT, SlotColumns, columns_from_frame
+from toolkit.timeslots import MINUTES_PER_DAY, format_date, format_date_slot, format_time, parse_date, parse_date_slot
+from utils.metrics import BOOKING_REFUSALS, SLOT_HOLDS, STORE_SECONDS, timed
+
+logger = logging.getLogger(__name__)
+
+# Slots per doctor-day that fit one bitset
+MAX_DAY_SLOTS = 64
+# Doctor-days expanded per step when scanning for free slots
+SCAN_CHUNK = 32
+
+# Reasons a booking operation is refused
+NOT_SCHEDULED = "No such slot"
+NOT_AVAILABLE = "Slot is not available"
+NO_APPOINTMENT = "No appointment with those specifications"
+DUPLICATE = "Slot is changed twice in the same batch"
+CONFLICT = "Slot changed concurrently, please retry"
+HELD = "Slot is held for another patient"
+
+# Seconds a slot stays held for a patient before it is released again
+HOLD_TTL = float(os.getenv("BOOKING_HOLD_TTL", "300"))
+# Seconds between sweeps of the hold reaper
+HOLD_REAP_INTERVAL = 5.0
+# Locks that writes to the slots of a (doctor, date) are striped over
+STRIPES = 64
+
+
+class Operation(NamedTuple):
+    """A booking request: book, cancel, or reschedule (to new_date_slot) a patient's slot."""
+    action: str
+    date_slot: str
+    doctor_name: str
+    patient: int
+    new_date_slot: Optional[str] = None
+
+
+def popcount(bits: np.ndarray) -> np.ndarray:
+    """Number of set bits in each element of a uint64 array."""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(bits)
+    # numpy < 2.0
+    return np.unpackbits(bits.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+class Slot:
+    """One booked or free slot, built only for slots a query returns."""
+    __slots__ = ('date', 'time', 'specialization', 'doctor_name', 'is_available', 'patient_to_attend')
+
+    def __init__(self, date, time, specialization, doctor_name, is_available, patient_to_attend):
+        self.date = date
+        self.time = time
+        self.specialization = specialization
+        self.doctor_name = doctor_name
+        self.is_available = is_available
+        self.patient_to_attend = patient_to_attend
+
+    @property
+    def date_slot(self) -> str:
+        return f"{self.date} {self.time}"
+
+
+class SlotTable:
+    """
+    The availability data as one 64-bit free-slot bitset per doctor-day.
+    Slots sit on a regular grid (every 30 minutes from 08:00 in the bundled data), so
+    bit i of a doctor-day is the slot at day_start + i * step. Doctor-days are sorted by
+    (date, doctor) and hold the date ordinal, doctor and specialization codes, the
+    bitsets of scheduled and free slots, and the patient booked in each slot. Checking,
+    booking and cancelling a slot are bit operations and counting free slots a popcount.
+
+    The free bitsets are copied on write: a reader that takes `free` once sees one
+    consistent state however many slots are booked meanwhile.
+    """
+
+    def __init__(self, data: Union[pd.DataFrame, SlotColumns]):
+        columns = columns_from_frame(data) if isinstance(data, pd.DataFrame) else data
+        date, minute = columns.date, columns.minute
+        self.doctors: List[str] = list(columns.doctors)
+        self.specializations: List[str] = list(columns.specializations)
+        if self.doctors != sorted(self.doctors) or self.specializations != sorted(self.specializations):
+            raise ValueError("Doctor and specialization codes must follow name order")
+        self.doctor_codes = {name: code for code, name in enumerate(self.doctors)}
+        self.specialization_codes = {name: code for code, name in enumerate(self.specializations)}
+
+        # The grid starts at the earliest slot and steps by the largest interval all slots share
+        minute = minute.astype(np.int64)
+        self.day_start = int(minute.min()) if len(minute) else 0
+        self.step = int(np.gcd.reduce(minute - self.day_start)) if len(minute) else 0
+        self.step = self.step or MINUTES_PER_DAY
+        bit = (minute - self.day_start) // self.step
+        self.width = int(bit.max()) + 1 if len(bit) else 0
+        if self.width > MAX_DAY_SLOTS:
+            raise ValueError(f"{self.width} slots a day at {self.step}-minute steps do not fit in {MAX_DAY_SLOTS} bits")
+
+        order = np.lexsort((bit, columns.doctor, date))
+        date, bit = date[order], bit[order]
+        doctor_code = np.asarray(columns.doctor, dtype=np.int16)[order]
+        specialization_code = np.asarray(columns.specialization, dtype=np.int16)[order]
+        available = np.asarray(columns.available, dtype=bool)[order]
+        patient = np.asarray(columns.patient, dtype=np.int64)[order]
+
+        new_day = np.ones(len(date), dtype=bool)
+        new_day[1:] = (date[1:] != date[:-1]) | (doctor_code[1:] != doctor_code[:-1])
+        starts = np.flatnonzero(new_day)
+        day = np.cumsum(new_day) - 1
+        if np.any(~new_day[1:] & (bit[1:] == bit[:-1])):
+            raise ValueError("Availability data lists the same doctor slot twice")
+        if np.any(specialization_code != specialization_code[starts][day]):
+            raise ValueError("Availability data lists a doctor under two specializations on one day")
+
+        self.day_date = date[starts]
+        self.day_doctor = doctor_code[starts]
+        self.day_specialization = specialization_code[starts]
+        masks = np.left_shift(np.uint64(1), bit.astype(np.uint64))
+        if len(starts):
+            self.scheduled = np.bitwise_or.reduceat(masks, starts)
+            self.free = np.bitwise_or.reduceat(np.where(available, masks, np.uint64(0)), starts)
+        else:
+            self.scheduled = np.zeros(0, dtype=np.uint64)
+            self.free = np.zeros(0, dtype=np.uint64)
+        self.patient = np.full((len(starts), self.width), NO_PATIENT, dtype=np.int64)
+        self.patient[day, bit] = np.where(available, NO_PATIENT, patient)
+        # Secondary index of each patient's booked (doctor-day, bit) slots, kept in step by assign()
+        booked_days, booked_bits = np.nonzero(self.patient != NO_PATIENT)
+        # Group the booked slots by patient; the stable sort keeps each patient's slots in (day, bit) order
+        by_patient = np.argsort(self.patient[booked_days, booked_bits], kind="stable")
+        patients, firsts = np.unique(self.patient[booked_days, booked_bits][by_patient], return_index=True)
+        locations = list(zip(booked_days[by_patient].tolist(), booked_bits[by_patient].tolist()))
+        bounds = firsts.tolist() + [len(locations)]
+        self.bookings: Dict[int, Tuple[Tuple[int, int], ...]] = defaultdict(tuple, {
+            patient: tuple(locations[lo:hi]) for patient, lo, hi in zip(patients.tolist(), bounds, bounds[1:])})
+        # Writers of different doctor-days share the free bitsets and the bookings index
+        self._write_lock = threading.Lock()
+        self.shifts = np.arange(self.width, dtype=np.uint64)
+        # Few distinct free-slot patterns occur, so their minute lists and scope day lists are memoized
+        self._minutes: Dict[int, Tuple[int, ...]] = {}
+        self._scopes: Dict[Tuple[Optional[str], Optional[str]], Optional[np.ndarray]] = {}
+
+        self.days = {key: index for index, key in enumerate(zip(self.day_date.tolist(), self.day_doctor.tolist()))}
+        first = np.flatnonzero(np.concatenate(([True], self.day_date[1:] != self.day_date[:-1]))) if len(starts) else starts
+        last = np.concatenate((first[1:], [len(starts)]))
+        self.date_ranges = dict(zip(self.day_date[first].tolist(), zip(first.tolist(), last.tolist())))
+
+    def date_range(self, date: int) -> Tuple[int, int]:
+        return self.date_ranges.get(date, (0, 0))
+
+    def day(self, date: Optional[int], doctor_name: str) -> Optional[int]:
+        return self.days.get((date, self.doctor_codes.get(doctor_name)))
+
+    def locate(self, date_slot: str, doctor_name: str) -> Optional[Tuple[int, int]]:
+        """(doctor-day, bit) of a scheduled slot, or None."""
+        date, minute = parse_date_slot(date_slot)
+        day = self.day(date, doctor_name)
+        bit, off_grid = divmod(minute - self.day_start, self.step)
+        if day is None or off_grid or not 0 <= bit < self.width or not int(self.scheduled[day]) >> bit & 1:
+            return None
+        return day, bit
+
+    def is_free(self, day: int, bit: int) -> bool:
+        return bool(int(self.free[day]) >> bit & 1)
+
+    def assign(self, day: int, bit: int, patient: Optional[int]):
+        """Book a slot for a patient, or free it when patient is None."""
+        with self._write_lock:
+            # Index entries are replaced rather than mutated, so readers can use them without the lock
+            previous = int(self.patient[day, bit])
+            if previous != NO_PATIENT:
+                self.bookings[previous] = tuple(location for location in self.bookings[previous] if location != (day, bit))
+                if not self.bookings[previous]:
+                    del self.bookings[previous]
+            self._set_free(day, bit, patient is None)
+            if patient is None:
+                self.patient[day, bit] = NO_PATIENT
+            else:
+                self.patient[day, bit] = patient
+                self.bookings[patient] += ((day, bit),)
+
+    def set_free(self, day: int, bit: int, free: bool):
+        with self._write_lock:
+            self._set_free(day, bit, free)
+
+    def _set_free(self, day: int, bit: int, free: bool):
+        bits = self.free.copy()
+        if free:
+            bits[day] |= np.uint64(1 << bit)
+        else:
+            bits[day] &= ~np.uint64(1 << bit)
+        self.free = bits
+
+    def minute(self, bit: int) -> int:
+        return self.day_start + bit * self.step
+
+    def minutes(self, bits: int) -> List[int]:
+        minutes = self._minutes.get(bits)
+        if minutes is None:
+            minutes = self._minutes[bits] = tuple(self.minute(bit) for bit in range(self.width) if bits >> bit & 1)
+        return list(minutes)
+
+    def date_slot(self, day: int, bit: int) -> str:
+        return format_date_slot(self.day_date[day], self.minute(bit))
+
+    def slot(self, day: int, bit: int) -> Slot:
+        patient = int(self.patient[day, bit])
+        return Slot(format_date(self.day_date[day]), format_time(self.minute(bit)),
+                    self.specializations[self.day_specialization[day]], self.doctors[self.day_doctor[day]],
+                    self.is_free(day, bit), None if patient == NO_PATIENT else patient)
+
+    def scope_days(self, doctor_name: Optional[str], specialization: Optional[str]) -> Optional[np.ndarray]:
+        """Doctor-days of a doctor, a specialization, both, or everyone, in (date, doctor) order."""
+        key = (doctor_name or None, specialization or None)
+        if key not in self._scopes:
+            self._scopes[key] = self._scope_days(*key)
+        return self._scopes[key]
+
+    def _scope_days(self, doctor_name: Optional[str], specialization: Optional[str]) -> Optional[np.ndarray]:
+        mask = np.ones(len(self.day_date), dtype=bool)
+        if doctor_name:
+            if doctor_name not in self.doctor_codes:
+                return None
+            mask &= self.day_doctor == self.doctor_codes[doctor_name]
+        if specialization:
+            if specialization not in self.specialization_codes:
+                return None
+            mask &= self.day_specialization == self.specialization_codes[specialization]
+        return np.flatnonzero(mask)
+
+
+def date_ordinal(date: str) -> Optional[int]:
+    try:
+        return parse_date(date)
+    except ValueError:
+        return None
+
+
+def stripe(date_slot: Optional[str], doctor_name: str) -> int:
+    """Lock stripe of a doctor's slots on the date of `date_slot`."""
+    date = date_ordinal((date_slot or "").split(" ")[0])
+    return hash((date if date is not None else date_slot, doctor_name)) % STRIPES
+
+
+class PendingCommit:
+    """Changes waiting for the next backend write, and the outcome once it is done."""
+    __slots__ = ('changes', 'done', 'ok')
+
+    def __init__(self, changes: List[SlotChange]):
+        self.changes = changes
+        self.done = False
+        self.ok = False
+
+
+class AvailabilityStore:
+    """
+    Long-lived, bitset view of the doctor availability data.
+    The data is loaded once from the backend into a SlotTable; lookups go straight to
+    the doctor-days they need and read their free-slot bits. The backend's version is
+    checked on every access. When the data changes outside this store, the changed
+    slots are replayed onto the table if the backend can list them, and otherwise the
+    table is rebuilt. Mutations are applied to the backend first, which has the final say
+    on whether a slot is still free.
+
+    A free slot can be held for a patient for a while (hold()), e.g. between seeing it
+    and booking it. Held slots read as taken and only that patient can book them; the
+    hold is confirmed by the booking, released, or expires and is cleared by a reaper
+    thread. A backend that stores holds (SQLite) gets them too and refuses to book a
+    held slot for anyone else, whichever worker asks; this process keeps a copy for its
+    own reads, which other workers don't see. With the file backends, which assume a
+    single process, holds live in this process only.
+
+    Writers lock only the stripes of the (doctor, date) pairs they touch, in stripe
+    order, so a reschedule across two days can't deadlock with one the other way round.
+    The backend write is the one serial step; writers queue their changes and whoever
+    gets the commit lock writes everything queued in one backend transaction. Reads take
+    no lock: they use the table and free bitsets current when they start.
+    """
+
+    def __init__(self, backend: Optional[SlotBackend] = None, hold_ttl: float = HOLD_TTL):
+        self.backend = backend or CsvBackend()
+        self.hold_ttl = hold_ttl
+        # (canonical date_slot, doctor) -> (patient, monotonic expiry)
+        self._holds: Dict[Tuple[str, str], Tuple[int, float]] = {}
+        self._reaper = None
+        self._stop_reaper = threading.Event()
+        # Reloads; taken before any stripe
+        self._lock = threading.RLock()
+        self._stripes = [threading.Lock() for _ in range(STRIPES)]
+        # Writes queued for the backend, and whether one is being written; only writers holding stripes commit
+        self._commits = threading.Condition(threading.Lock())
+        self._pending: List[PendingCommit] = []
+        self._committing = False
+        self._version = None
+        self._table: Optional[SlotTable] = None
+        # Change stamps per (date, doctor) and (date, specialization); a reload starts a new generation
+        self._generation = 0
+        self._clock = itertools.count(1)
+        self._versions: Dict[Tuple[int, str], int] = {}
+
+    @contextmanager
+    def _locked(self, stripes: Iterable[int]):
+        """Hold lock stripes, taken in stripe order. Yields the set of stripes held."""
+        stripes = sorted(set(stripes))
+        for index in stripes:
+            self._stripes[index].acquire()
+        try:
+            yield set(stripes)
+        finally:
+            for index in reversed(stripes):
+                self._stripes[index].release()
+
+    def _refresh(self, force: bool = False) -> SlotTable:
+        generation = self._generation
+        if force or self.backend.version() != self._version:
+            # With every stripe held no write is mid-commit, between moving the version and adopting it
+            with self._lock, self._locked(range(STRIPES)):
+                reload = force and self._generation == generation
+                if reload or (self.backend.version() != self._version and not self._catch_up()):
+                    version = self.backend.version()
+                    self._load()
+                    self._version = version
+        return self._table
+
+    @timed(STORE_SECONDS, operation="backend_catch_up")
+    def _catch_up(self) -> bool:
+        """
+        Apply the slots the backend changed since our version to the table. Returns False,
+        changing nothing, if the backend can't list them. Call with every stripe held.
+        """
+        if self._table is None:
+            return False
+        changes = self.backend.changes(self._version)
+        if changes is None:
+            return False
+        version, updates = changes
+        table = self._table
+        located = [(table.locate(date_slot, doctor_name), doctor_name, patient) for date_slot, doctor_name, patient in updates]
+        if any(location is None for location, _, _ in located):
+            return False
+        for location, doctor_name, patient in located:
+            key = (table.date_slot(*location), doctor_name)
+            if patient is not None:
+                # Booked elsewhere; a hold on it here can't be kept
+                self._holds.pop(key, None)
+            table.assign(*location, patient)
+            if patient is None and key in self._holds:
+                table.set_free(*location, False)
+            self._touch(table, location[0])
+        self._version = version
+        return True
+
+    def load(self):
+        """Load the availability data now rather than on first access."""
+        self._refresh()
+
+    @timed(STORE_SECONDS, operation="backend_load")
+    def _load(self):
+        # Readers hold a reference to the old table, so it is replaced rather than mutated
+        self._table = SlotTable(self.backend.load_columns())
+        self._generation += 1
+        self._versions = {}
+        # Holds are not in the backend, so they are laid over the fresh table again
+        for key in list(self._holds):
+            location = self._table.locate(*key)
+            if location is None or not self._table.is_free(*location):
+                del self._holds[key]
+            else:
+                self._table.set_free(*location, False)
+
+    @timed(STORE_SECONDS, operation="backend_apply")
+    def _commit(self, changes: List[SlotChange]) -> bool:
+        """
+        Apply changes to the backend. Returns False if it rejects them. Changes queued by
+        other writers meanwhile go in the same write; if that fails, each writer's changes
+        are applied on their own so one conflict doesn't sink the rest.
+        """
+        request = PendingCommit(changes)
+        with self._commits:
+            self._pending.append(request)
+            while self._committing and not request.done:
+                self._commits.wait()
+            if request.done:
+                return request.ok
+            self._committing = True
+            group, self._pending = self._pending, []
+        try:
+            writes = []
+            if len(group) > 1:
+                writes.append(self.backend.apply_versioned([change for pending in group for change in pending.changes]))
+            if writes and writes[0]:
+                for pending in group:
+                    pending.ok = True
+            else:
+                for pending in group:
+                    writes.append(self.backend.apply_versioned(pending.changes))
+                    pending.ok = writes[-1] is not None
+            # Follow the version through our own writes; if anyone else's change came in between,
+            # leave it for _refresh to replay rather than take a version that includes it
+            version = self._version
+            for before, after in filter(None, writes):
+                if before != version:
+                    break
+                version = after
+            else:
+                self._version = version
+        finally:
+            with self._commits:
+                for pending in group:
+                    pending.done = True
+                self._committing = False
+                self._commits.notify_all()
+        return request.ok
+
+    def _touch(self, table: SlotTable, day: int):
+        # Fresh stamps rather than increments, which writers of different stripes could lose
+        date = int(table.day_date[day])
+        self._versions[(date, table.doctors[table.day_doctor[day]])] = next(self._clock)
+        self._versions[(date, table.specializations[table.day_specialization[day]])] = next(self._clock)
+
+    def scope_version(self, date: str, name: str) -> Tuple[int, int]:
+        """
+        Version of all slots on a date for a doctor or a specialization. It changes
+        whenever one of those slots is booked or released, or the data is reloaded.
+        """
+        self._refresh()
+        return self._generation, self._versions.get((date_ordinal(date), name), 0)
+
+    @timed(STORE_SECONDS, operation="available_by_doctor")
+    def available_by_doctor(self, date: str, doctor_name: str) -> List[int]:
+        """Free slot times (minutes of day) for one doctor on one date."""
+        table = self._refresh()
+        day = table.day(date_ordinal(date), doctor_name)
+        return [] if day is None else table.minutes(int(table.free[day]))
+
+    @timed(STORE_SECONDS, operation="available_by_specialization")
+    def available_by_specialization(self, date: str, specialization: str) -> Dict[str, List[int]]:
+        """Free slot times (minutes of day) per doctor of a specialization on one date, ordered by doctor name."""
+        table = self._refresh()
+        ordinal, code = date_ordinal(date), table.specialization_codes.get(specialization)
+        if ordinal is None or code is None:
+            return {}
+        lo, hi = table.date_range(ordinal)
+        free = table.free
+        days = lo + np.flatnonzero((table.day_specialization[lo:hi] == code) & (free[lo:hi] != 0))
+        # Doctor-days of a date are sorted by doctor code, and codes follow doctor name order
+        return {table.doctors[doctor]: table.minutes(bits)
+                for doctor, bits in zip(table.day_doctor[days].tolist(), free[days].tolist())}
+
+    @timed(STORE_SECONDS, operation="daily_free_counts")
+    def daily_free_counts(self, start_date: str, end_date: str, doctor_name: Optional[str] = None,
+                          specialization: Optional[str] = None) -> Dict[str, Dict[str, int]]:
+        """Number of free slots per date and doctor between two dates (inclusive), for month views."""
+        table = self._refresh()
+        start, end = date_ordinal(start_date), date_ordinal(end_date)
+        days = table.scope_days(doctor_name, specialization)
+        if start is None or end is None or days is None:
+            return {}
+        days = days[(table.day_date[days] >= start) & (table.day_date[days] <= end)]
+        counts = defaultdict(dict)
+        for date, doctor, count in zip(table.day_date[days].tolist(), table.day_doctor[days].tolist(),
+                                       popcount(table.free[days]).tolist()):
+            counts[format_date(date)][table.doctors[doctor]] = count
+        return dict(counts)
+
+    @timed(STORE_SECONDS, operation="find_next_available")
+    def find_next_available(self, start: int, end: Optional[int] = None, doctor_name: Optional[str] = None,
+                            specialization: Optional[str] = None, limit: int = 5) -> List[Slot]:
+        """
+        First `limit` free slots between two slot keys (inclusive), earliest first, for a
+        doctor, a specialization, both, or anyone. The doctor-days in scope are bisected
+        to the start date and their bits expanded a chunk of whole dates at a time, only
+        until enough free slots are found.
+        """
+        table = self._refresh()
+        days = table.scope_days(doctor_name, specialization)
+        if days is None:
+            return []
+        dates = table.day_date[days]
+        free = table.free
+        position = int(np.searchsorted(dates, start // MINUTES_PER_DAY))
+        hi = len(days) if end is None else int(np.searchsorted(dates, end // MINUTES_PER_DAY, side='right'))
+
+        found: List[Tuple[int, int]] = []
+        while position < hi and len(found) < limit:
+            # Chunks end on a date boundary, so no earlier slot is left for the next one
+            stop = int(np.searchsorted(dates, dates[min(position + SCAN_CHUNK, hi) - 1], side='right'))
+            chunk = days[position:stop]
+            rows, bits = np.nonzero(free[chunk][:, None] >> table.shifts & np.uint64(1))
+            keys = table.day_date[chunk][rows].astype(np.int64) * MINUTES_PER_DAY + table.day_start + bits * table.step
+            order = np.lexsort((table.day_doctor[chunk][rows], keys))
+            keep = keys[order] >= start
+            if end is not None:
+                keep &= keys[order] <= end
+            order = order[keep][:limit - len(found)]
+            found.extend(zip(chunk[rows[order]].tolist(), bits[order].tolist()))
+            position = stop
+        return [table.slot(day, bit) for day, bit in found]
+
+    @timed(STORE_SECONDS, operation="appointments_for_patient")
+    def appointments_for_patient(self, patient: int) -> List[Slot]:
+        """Slots currently booked by a patient, earliest first."""
+        table = self._refresh()
+        locations = sorted(table.bookings.get(patient, ()),
+                           key=lambda location: (table.day_date[location[0]], location[1], table.day_doctor[location[0]]))
+        return [table.slot(day, bit) for day, bit in locations]
+
+    @timed(STORE_SECONDS, operation="has_appointment")
+    def has_appointment(self, date_slot: str, doctor_name: str, patient: int) -> bool:
+        table = self._refresh()
+        location = table.locate(date_slot, doctor_name)
+        return location is not None and table.patient[location] == patient
+
+    @timed(STORE_SECONDS, operation="hold")
+    def hold(self, date_slot: str, doctor_name: str, patient: int, ttl: Optional[float] = None) -> bool:
+        """
+        Hold a free slot for a patient for `ttl` seconds (hold_ttl by default), replacing
+        any other hold of theirs; holding the same slot again extends it. Returns False if
+        the slot is booked or held for someone else.
+        """
+        self._refresh()
+        while True:
+            # The patient's other holds are released too, so their stripes are needed as well
+            others = self._holds_of(patient)
+            with self._locked([stripe(date_slot, doctor_name)] + [stripe(*other) for other in others]) as stripes:
+                others = self._holds_of(patient)
+                if any(stripe(*other) not in stripes for other in others):
+                    continue
+                self._expire_holds(stripes)
+                table = self._table
+                location = table.locate(date_slot, doctor_name)
+                if location is None:
+                    return False
+                key = (table.date_slot(*location), doctor_name)
+                holder = self._live_hold(key)
+                if (holder is None and not table.is_free(*location)) or (holder is not None and holder[0] != patient):
+                    return False
+                ttl = self.hold_ttl if ttl is None else ttl
+                if self.backend.stores_holds and not self.backend.hold(*key, patient, time.time() + ttl):
+                    return False
+                for other in others:
+                    if other != key:
+                        self._release_hold(other)
+                        SLOT_HOLDS.inc(outcome="released")
+                self._holds[key] = (patient, time.monotonic() + ttl)
+                if holder is None:
+                    table.set_free(*location, False)
+                    self._touch(table, location[0])
+                    SLOT_HOLDS.inc(outcome="placed")
+                break
+        self.start_reaper()
+        return True
+
+    @timed(STORE_SECONDS, operation="release_hold")
+    def release_hold(self, date_slot: str, doctor_name: str, patient: int) -> bool:
+        """Release a patient's hold on a slot. Returns False if they do not hold it."""
+        self._refresh()
+        with self._locked([stripe(date_slot, doctor_name)]):
+            location = self._table.locate(date_slot, doctor_name)
+            if location is None:
+                return False
+            key = (self._table.date_slot(*location), doctor_name)
+            # The hold may have been taken through another worker, so the backend is asked even without a local copy
+            released = self.backend.stores_holds and self.backend.release_hold(*key, patient)
+            if self._holds.get(key, (None,))[0] == patient:
+                self._release_hold(key)
+                released = True
+            if not released:
+                return False
+            SLOT_HOLDS.inc(outcome="released")
+        return True
+
+    def holds_for_patient(self, patient: int) -> List[Tuple[str, str, float]]:
+        """(date_slot, doctor, seconds left) of a patient's live holds, from the backend if it stores them."""
+        if self.backend.stores_holds:
+            now = time.time()
+            return [(date_slot, doctor_name, expires - now) for date_slot, doctor_name, expires in self.backend.patient_holds(patient)]
+        now = time.monotonic()
+        return [(date_slot, doctor_name, expires - now) for (date_slot, doctor_name), (held_for, expires)
+                in list(self._holds.items()) if held_for == patient and expires > now]
+
+    def _live_hold(self, key: Tuple[str, str]) -> Optional[Tuple[int, float]]:
+        """
+        This process's hold on a slot, as (patient, expiry). If the backend stores holds,
+        a copy whose hold was since released or replaced through another worker is dropped
+        instead. Call with the key's stripe held.
+        """
+        holder = self._holds.get(key)
+        if holder is not None and self.backend.stores_holds and self.backend.holder(*key) != holder[0]:
+            self._release_hold(key)
+            return None
+        return holder
+
+    def _holds_of(self, patient: int) -> List[Tuple[str, str]]:
+        return [key for key, (held_for, _) in list(self._holds.items()) if held_for == patient]
+
+    def _release_hold(self, key: Tuple[str, str]):
+        """Drop a hold and free its slot again. Call with the key's stripe held."""
+        if self._holds.pop(key, None) is None:
+            return
+        table = self._table
+        location = table.locate(*key)
+        if location is not None and table.patient[location] == NO_PATIENT:
+            table.set_free(*location, True)
+            self._touch(table, location[0])
+
+    def _expired_holds(self) -> List[Tuple[str, str]]:
+        now = time.monotonic()
+        return [key for key, (_, expires) in list(self._holds.items()) if expires <= now]
+
+    def _expire_holds(self, stripes: set) -> int:
+        """Release expired holds in the given stripes, which must be held. Returns how many expired."""
+        expired = [key for key in self._expired_holds() if stripe(*key) in stripes]
+        for key in expired:
+            self._release_hold(key)
+        if expired:
+            SLOT_HOLDS.inc(len(expired), outcome="expired")
+        return len(expired)
+
+    def start_reaper(self, interval: float = HOLD_REAP_INTERVAL):
+        """Clear expired holds in a daemon thread every `interval` seconds."""
+        if self._reaper is not None:
+            return self._reaper
+
+        def run():
+            while not self._stop_reaper.wait(interval):
+                if self._holds:
+                    try:
+                        with self._locked(stripe(*key) for key in self._expired_holds()) as stripes:
+                            self._expire_holds(stripes)
+                    except Exception:
+                        logger.exception("Error releasing expired slot holds")
+
+        with self._lock:
+            if self._reaper is None:
+                self._reaper = threading.Thread(target=run, name="hold-reaper", daemon=True)
+                self._reaper.start()
+        return self._reaper
+
+    def stop_reaper(self):
+        self._stop_reaper.set()
+        if self._reaper is not None:
+            self._reaper.join()
+            self._reaper = None
+
+    def _plan(self, table: SlotTable, operation: Operation, claimed: set):
+        """Slot updates for one operation as (steps, None), or (None, reason) if it cannot go ahead."""
+        if operation.action == 'book':
+            wanted = [(operation.date_slot, None, operation.patient)]
+        elif operation.action == 'cancel':
+            wanted = [(operation.date_slot, operation.patient, None)]
+        elif operation.action == 'reschedule':
+            wanted = [(operation.date_slot, operation.patient, None), (operation.new_date_slot, None, operation.patient)]
+        else:
+            raise ValueError(f"Unknown booking action: {operation.action}")
+        steps = []
+        for date_slot, expected, patient in wanted:
+            location = table.locate(date_slot, operation.doctor_name)
+            if location is None:
+                return None, NOT_SCHEDULED
+            holder = self._live_hold((table.date_slot(*location), operation.doctor_name))
+            if expected is None and holder is not None and holder[0] != operation.patient:
+                return None, HELD
+            if expected is None and holder is None and not table.is_free(*location):
+                return None, NOT_AVAILABLE
+            if expected is not None and table.patient[location] != expected:
+                return None, NO_APPOINTMENT
+            if location in claimed:
+                return None, DUPLICATE
+            steps.append((location, operation.doctor_name, expected, patient))
+        claimed.update(location for location, *_ in steps)
+        return steps, None
+
+    def _apply(self, operations: List[Operation]) -> List[Optional[str]]:
+        self._refresh()
+        stripes = [stripe(date_slot, operation.doctor_name) for operation in operations
+                   for date_slot in (operation.date_slot, operation.new_date_slot) if date_slot is not None]
+        with self._locked(stripes) as held:
+            self._expire_holds(held)
+            table = self._table
+            claimed = set()
+            plans = [self._plan(table, operation, claimed) for operation in operations]
+            errors = [error for _, error in plans]
+            if any(errors):
+                for error in filter(None, errors):
+                    BOOKING_REFUSALS.inc(reason=error)
+                return errors
+            steps = [step for plan, _ in plans for step in plan]
+            changes = [SlotChange(table.date_slot(*location), doctor_name, expected, patient)
+                       for location, doctor_name, expected, patient in steps]
+            committed = self._commit(changes)
+            if committed:
+                for change, (location, _, _, patient) in zip(changes, steps):
+                    if patient is not None and self._holds.pop((change.date_slot, change.doctor_name), None):
+                        SLOT_HOLDS.inc(outcome="confirmed")
+                    table.assign(*location, patient)
+                    self._touch(table, location[0])
+        if not committed:
+            # Resync from the backend, which needs every stripe, so only once ours are released
+            self._refresh(force=True)
+            BOOKING_REFUSALS.inc(len(operations), reason=CONFLICT)
+            return [CONFLICT] * len(operations)
+        return errors
+
+    @timed(STORE_SECONDS, operation="batch")
+    def apply_batch(self, operations: List[Operation]) -> List[Optional[str]]:
+        """
+        Apply booking operations in one backend transaction, all or nothing. Returns the
+        reason each operation was refused, or None; nothing changes unless all are None.
+        """
+        return self._apply(list(operations))
+
+    @timed(STORE_SECONDS, operation="book")
+    def book(self, date_slot: str, doctor_name: str, patient: int) -> bool:
+        """Book a free slot for a patient. Returns False if the slot is not available."""
+        return self._apply([Operation('book', date_slot, doctor_name, patient)]) == [None]
+
+    @timed(STORE_SECONDS, operation="cancel")
+    def cancel(self, date_slot: str, doctor_name: str, patient: int) -> bool:
+        """Cancel a patient's appointment. Returns False if there is no such appointment."""
+        return self._apply([Operation('cancel', date_slot, doctor_name, patient)]) == [None]
+
+    @timed(STORE_SECONDS, operation="reschedule")
+    def reschedule(self, old_date_slot: str, new_date_slot: str, doctor_name: str, patient: int) -> bool:
+        """Move a patient's appointment to a free slot with the same doctor."""
+        return self._apply([Operation('reschedule', old_date_slot, doctor_name, patient, new_date_slot)]) == [None]
+
+
+_store: Optional[AvailabilityStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> AvailabilityStore:
+    """Process-wide availability store shared by all tools."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = AvailabilityStore(make_backend())
+    return _store
@@ -0,0 +1,97 @@
+"""
+Parsing and formatting of slot dates and times. Dates are handled as proleptic
+Gregorian ordinals and times as minutes since midnight, so the store can compare them
+as integers; strings are only produced for the rows that are returned.
+"""
+from datetime import date as Date, datetime
+from functools import lru_cache
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+DATE_FORMAT = "%d-%m-%Y"
+# Ordinal of 1970-01-01, to convert numpy day counts since the epoch into ordinals
+EPOCH_ORDINAL = Date(1970, 1, 1).toordinal()
+MINUTES_PER_DAY = 24 * 60
+
+
+@lru_cache(maxsize=4096)
+def parse_date(date_str: str) -> int:
+    """Ordinal of a 'DD-MM-YYYY' (or 'YYYY-MM-DD') date. Cached, since strptime dominates lookups."""
+    date_str = date_str.strip()
+    for fmt in (DATE_FORMAT, "%Y-%m-%d"):
+        try:
+            return datetime.strptime(date_str, fmt).toordinal()
+        except ValueError:
+            pass
+    raise ValueError(f"Date format not recognized: {date_str}. Please use DD-MM-YYYY format")
+
+
+def parse_time(time_str: str) -> int:
+    """Minutes since midnight of an 'HH:MM' or 'HH.MM' time."""
+    hours, sep, minutes = time_str.strip().replace(".", ":").partition(":")
+    if not (sep and hours.isdigit() and minutes.isdigit() and int(hours) < 24 and int(minutes) < 60):
+        raise ValueError(f"Time format not recognized: {time_str}. Please use HH:MM format")
+    return int(hours) * 60 + int(minutes)
+
+
+def parse_date_slot(date_slot: str) -> Tuple[int, int]:
+    """(date ordinal, minute of day) of a 'DD-MM-YYYY HH:MM' slot; 'at' between the parts is allowed."""
+    date_str, _, time_str = date_slot.replace(" at ", " ").strip().partition(" ")
+    try:
+        return parse_date(date_str), parse_time(time_str)
+    except ValueError:
+        raise ValueError("Date format not recognized. Please use DD-MM-YYYY HH:MM format") from None
+
+
+def slot_key(ordinal: int, minute: int) -> int:
+    """Single sortable integer for a slot: minutes since the start of day one."""
+    return ordinal * MINUTES_PER_DAY + minute
+
+
+def parse_bound(value: str, end: bool = False) -> int:
+    """slot_key of a 'DD-MM-YYYY' or 'DD-MM-YYYY HH:MM' bound; a bare end date covers that whole day."""
+    value = value.replace(" at ", " ").strip()
+    if " " in value:
+        return slot_key(*parse_date_slot(value))
+    return slot_key(parse_date(value), MINUTES_PER_DAY - 1 if end else 0)
+
+
+def convert_datetime_format(dt_str: str) -> str:
+    """Normalize a user supplied slot to the data's 'DD-MM-YYYY HH:MM' format."""
+    return format_date_slot(*parse_date_slot(dt_str))
+
+
+@lru_cache(maxsize=4096)
+def _format_date(ordinal: int) -> str:
+    return Date.fromordinal(ordinal).strftime(DATE_FORMAT)
+
+
+def format_date(ordinal: int) -> str:
+    return _format_date(int(ordinal))
+
+
+def format_time(minute: int) -> str:
+    return f"{int(minute) // 60:02d}:{int(minute) % 60:02d}"
+
+
+def format_am_pm(minute: int) -> str:
+    hours, minutes = divmod(int(minute), 60)
+    period = "AM" if hours < 12 else "PM"
+    return f"{hours % 12 or 12}:{minutes:02d} {period}"
+
+
+def format_date_slot(ordinal: int, minute: int) -> str:
+    return f"{format_date(ordinal)} {format_time(minute)}"
+
+
+def parse_date_slot_column(date_slots: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """Vectorized parse_date_slot over a whole column: (int32 date ordinals, int16 minutes of day)."""
+    parts = date_slots.str.strip().str.extract(r"^(\d{2}-\d{2}-\d{4})\s+(\d{1,2})[:.](\d{2})$")
+    if parts.isna().any().any():
+        bad = date_slots[parts.isna().any(axis=1)].iloc[0]
+        raise ValueError(f"Unparseable date_slot in availability data: {bad}")
+    days = pd.to_datetime(parts[0], format=DATE_FORMAT).to_numpy().astype("datetime64[D]").astype(np.int64)
+    minutes = parts[1].astype(np.int64) * 60 + parts[2].astype(np.int64)
+    return (days + EPOCH_ORDINAL).astype(np.int32), minutes.to_numpy().astype(np.int16)
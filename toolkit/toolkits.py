@@ -1,237 +1,197 @@
-import pandas as pd
-from typing import Literal
+from typing import Literal, Optional
 from langchain_core.tools import tool
-from models import *
-from datetime import datetime
+from models import DOCTORS, SPECIALIZATIONS, DateModel, DateTimeModel, IdentificationNumberModel, SearchWindowModel
+from toolkit.timeslots import convert_datetime_format, format_am_pm, format_time, parse_bound, parse_time
+from toolkit.store import get_store
+from toolkit.cache import availability_cache
+from utils.metrics import TOOL_SECONDS, timed
+import logging
+
+logger = logging.getLogger(__name__)
+
+DoctorName = Literal[tuple(DOCTORS)]
+Specialization = Literal[tuple(SPECIALIZATIONS)]
 
 
 @tool
-def check_availability_by_doctor(desired_date:DateModel, doctor_name:Literal['kevin anderson','robert martinez','susan davis','daniel miller','sarah wilson','michael green','lisa brown','jane smith','emily johnson','john doe']):
+@timed(TOOL_SECONDS, tool="check_availability_by_doctor")
+def check_availability_by_doctor(desired_date:DateModel, doctor_name:DoctorName):
     """
     Checking the database if we have availability for the specific doctor.
     The parameters should be mentioned by the user in the query
     """
-    df = pd.read_csv(r"../data/doctor_availability.csv")
-    
-    #print(df)
-    
-    df['date_slot_time'] = df['date_slot'].apply(lambda input: input.split(' ')[-1])
-    
-    rows = list(df[(df['date_slot'].apply(lambda input: input.split(' ')[0]) == desired_date.date)&(df['doctor_name'] == doctor_name)&(df['is_available'] == True)]['date_slot_time'])
+    store = get_store()
+    date = desired_date.date.strip()
+    cache_key = ('doctor', date, doctor_name)
+    version = store.scope_version(date, doctor_name)
+    output = availability_cache.get(cache_key, version)
+    if output is not None:
+        return output
+
+    rows = store.available_by_doctor(date, doctor_name)
 
     if len(rows) == 0:
         output = "No availability in the entire day"
     else:
-        output = f'This availability for {desired_date.date}\n'
-        output += "Available slots: " + ', '.join(rows)
+        output = f'This availability for {date}\n'
+        output += "Available slots: " + ', '.join(format_time(minute) for minute in rows)
 
+    availability_cache.put(cache_key, version, output)
     return output
 
 
 @tool
-def check_availability_by_specialization(desired_date:DateModel, specialization:Literal["general_dentist", "cosmetic_dentist", "prosthodontist", "pediatric_dentist","emergency_dentist","oral_surgeon","orthodontist"]):
+@timed(TOOL_SECONDS, tool="check_availability_by_specialization")
+def check_availability_by_specialization(desired_date:DateModel, specialization:Specialization):
     """
     Checking the database if we have availability for the specific specialization.
     The parameters should be mentioned by the user in the query
     """
-    #Dummy data
-    df = pd.read_csv(r"../data/doctor_availability.csv")
-    df['date_slot_time'] = df['date_slot'].apply(lambda input: input.split(' ')[-1])
-    rows = df[(df['date_slot'].apply(lambda input: input.split(' ')[0]) == desired_date.date) & (df['specialization'] == specialization) & (df['is_available'] == True)].groupby(['specialization', 'doctor_name'])['date_slot_time'].apply(list).reset_index(name='available_slots')
+    store = get_store()
+    date = desired_date.date.strip()
+    cache_key = ('specialization', date, specialization)
+    version = store.scope_version(date, specialization)
+    output = availability_cache.get(cache_key, version)
+    if output is not None:
+        return output
+
+    rows = store.available_by_specialization(date, specialization)
 
     if len(rows) == 0:
         output = "No availability in the entire day"
     else:
-        def convert_to_am_pm(time_str):
-            # Split the time string into hours and minutes
-            time_str = str(time_str)
-            hours, minutes = map(int, time_str.split("."))
-            
-            # Determine AM or PM
-            period = "AM" if hours < 12 else "PM"
-            
-            # Convert hours to 12-hour format
-            hours = hours % 12 or 12
-            
-            # Format the output
-            return f"{hours}:{minutes:02d} {period}"
-        output = f'This availability for {desired_date.date}\n'
-        for row in rows.values:
-            output += row[1] + ". Available slots: \n" + ', \n'.join([convert_to_am_pm(value)for value in row[2]])+'\n'
+        output = f'This availability for {date}\n'
+        for doctor, slots in rows.items():
+            output += doctor + ". Available slots: \n" + ', \n'.join([format_am_pm(value) for value in slots])+'\n'
+
+    availability_cache.put(cache_key, version, output)
+    return output
+
 
+@tool
+@timed(TOOL_SECONDS, tool="find_next_available")
+def find_next_available(window:SearchWindowModel, doctor_name:Optional[DoctorName]=None, specialization:Optional[Specialization]=None, limit:int=5):
+    """
+    Finding the earliest open slots from a start date, optionally up to an end date,
+    with a specific doctor, any doctor of a specialization, or any doctor at all.
+    Use it for questions like "the earliest opening with an orthodontist this week".
+    """
+    try:
+        start = parse_bound(window.start)
+        end = parse_bound(window.end, end=True) if window.end else None
+    except ValueError as e:
+        return str(e)
+
+    slots = get_store().find_next_available(start, end, doctor_name, specialization, max(1, min(limit, 20)))
+    if not slots:
+        return "No available slots in that period"
+    output = "Next available slots:\n"
+    for slot in slots:
+        output += f"Dr. {slot.doctor_name.title()} ({slot.specialization}) on {slot.date} at {format_am_pm(parse_time(slot.time))}\n"
     return output
 
 
 @tool
-def set_appointment(desired_date:DateTimeModel, id_number:IdentificationNumberModel, doctor_name:Literal['kevin anderson','robert martinez','susan davis','daniel miller','sarah wilson','michael green','lisa brown','jane smith','emily johnson','john doe']):
+@timed(TOOL_SECONDS, tool="hold_slot")
+def hold_slot(desired_date:DateTimeModel, id_number:IdentificationNumberModel, doctor_name:DoctorName):
+    """
+    Holding a free slot for the user for a few minutes so nobody else can take it
+    before they book it. Use it when the user settles on a specific slot but has not
+    asked to book it yet. Booking the slot later confirms the hold.
+    """
+    try:
+        formatted_date = convert_datetime_format(desired_date.date)
+        store = get_store()
+        if not store.hold(formatted_date, doctor_name, id_number.id):
+            return "That slot is no longer available. Please pick another time slot."
+        return f"Slot with Dr. {doctor_name.title()} on {formatted_date} is held for {round(store.hold_ttl / 60)} minutes. Ask to book it to confirm."
+    except Exception as e:
+        logger.exception("Error in hold_slot")
+        return f"There was an issue holding the slot: {str(e)}"
+
+
+@tool
+@timed(TOOL_SECONDS, tool="list_my_appointments")
+def list_my_appointments(id_number:IdentificationNumberModel):
+    """
+    Listing the appointments booked under the user's identification number, with the
+    doctor, date and time of each. Use it when the user wants to cancel or reschedule
+    but does not give the exact date, time or doctor, or asks what they have booked.
+    """
+    slots = get_store().appointments_for_patient(id_number.id)
+    if not slots:
+        return "You don't have any appointments booked"
+    output = "Your appointments:\n"
+    for slot in slots:
+        output += f"Dr. {slot.doctor_name.title()} ({slot.specialization}) on {slot.date_slot}\n"
+    return output
+
+
+@tool
+@timed(TOOL_SECONDS, tool="set_appointment")
+def set_appointment(desired_date:DateTimeModel, id_number:IdentificationNumberModel, doctor_name:DoctorName):
     """
     Set appointment or slot with the doctor.
     The parameters MUST be mentioned by the user in the query.
     """
-    df = pd.read_csv(r"../data/doctor_availability.csv")
-   
-    # Debug print to check the input format
-    print(f"Received date string: {desired_date.date}")
-    
-    def convert_datetime_format(dt_str):
-        # Remove "at" if present in the string
-        if " at " in dt_str:
-            dt_str = dt_str.replace(" at ", " ")
-            
-        try:
-            # First try the DD-MM-YYYY HH:MM format
-            dt = datetime.strptime(dt_str, "%d-%m-%Y %H:%M")
-            # Format to match database format
-            return dt.strftime("%d-%m-%Y %H.%M")
-        except ValueError:
-            try:
-                # Try alternative format YYYY-MM-DD HH:MM
-                dt = datetime.strptime(dt_str, "%Y-%m-%d %H:%M")
-                # Format to match database format
-                return dt.strftime("%d-%m-%Y %H.%M")
-            except ValueError:
-                print(f"Failed to parse date: {dt_str}")
-                raise ValueError(f"Date format not recognized. Please use DD-MM-YYYY HH:MM format")
+    # Debug log to check the input format
+    logger.debug("Received date string: %s", desired_date.date)
     
     try:
         formatted_date = convert_datetime_format(desired_date.date)
-        print(f"Formatted date for DB lookup: {formatted_date}")
+        logger.debug("Formatted date for DB lookup: %s", formatted_date)
         
-        # Check if the appointment is available
-        case = df[(df['date_slot'] == formatted_date) & 
-                (df['doctor_name'] == doctor_name) & 
-                (df['is_available'] == True)]
-        
-        if len(case) == 0:
+        # Book the slot only if it is still available
+        if not get_store().book(formatted_date, doctor_name, id_number.id):
             return "No available appointments for that particular date and time. Please try another time slot."
         else:
-            # Update the dataframe
-            df.loc[(df['date_slot'] == formatted_date) & 
-                (df['doctor_name'] == doctor_name) & 
-                (df['is_available'] == True), 
-                ['is_available', 'patient_to_attend']] = [False, id_number.id]
-            
-            # Save changes
-            df.to_csv(r'../data/doctor_availability.csv', index=False)
-            
             return f"Appointment successfully booked with Dr. {doctor_name.title()} on {desired_date.date}."
     except Exception as e:
-        print(f"Error in set_appointment: {str(e)}")
+        logger.exception("Error in set_appointment")
         return f"There was an issue booking your appointment: {str(e)}"
 
 
 @tool
-def cancel_appointment(date:DateTimeModel, id_number:IdentificationNumberModel, doctor_name:Literal['kevin anderson','robert martinez','susan davis','daniel miller','sarah wilson','michael green','lisa brown','jane smith','emily johnson','john doe']):
+@timed(TOOL_SECONDS, tool="cancel_appointment")
+def cancel_appointment(date:DateTimeModel, id_number:IdentificationNumberModel, doctor_name:DoctorName):
     """
     Canceling an appointment.
     The parameters MUST be mentioned by the user in the query.
     """
-    df = pd.read_csv(r"../data/doctor_availability.csv")
-    
-    def convert_datetime_format(dt_str):
-        # Remove "at" if present in the string
-        if " at " in dt_str:
-            dt_str = dt_str.replace(" at ", " ")
-            
-        try:
-            # First try the DD-MM-YYYY HH:MM format
-            dt = datetime.strptime(dt_str, "%d-%m-%Y %H:%M")
-            # Format to match database format
-            return dt.strftime("%d-%m-%Y %H.%M")
-        except ValueError:
-            try:
-                # Try alternative format YYYY-MM-DD HH:MM
-                dt = datetime.strptime(dt_str, "%Y-%m-%d %H:%M")
-                # Format to match database format
-                return dt.strftime("%d-%m-%Y %H.%M")
-            except ValueError:
-                print(f"Failed to parse date: {dt_str}")
-                raise ValueError(f"Date format not recognized. Please use DD-MM-YYYY HH:MM format")
-    
     try:
         formatted_date = convert_datetime_format(date.date)
         
-        case_to_remove = df[(df['date_slot'] == formatted_date) & 
-                          (df['patient_to_attend'] == id_number.id) & 
-                          (df['doctor_name'] == doctor_name)]
-        
-        if len(case_to_remove) == 0:
+        if not get_store().cancel(formatted_date, doctor_name, id_number.id):
             return "You don't have any appointment with those specifications"
         else:
-            df.loc[(df['date_slot'] == formatted_date) & 
-                 (df['patient_to_attend'] == id_number.id) & 
-                 (df['doctor_name'] == doctor_name), 
-                 ['is_available', 'patient_to_attend']] = [True, None]
-            
-            df.to_csv(r'../data/doctor_availability.csv', index=False)
             return "Appointment successfully cancelled"
     except Exception as e:
-        print(f"Error in cancel_appointment: {str(e)}")
+        logger.exception("Error in cancel_appointment")
         return f"There was an issue canceling your appointment: {str(e)}"
 
 
 @tool
-def reschedule_appointment(old_date:DateTimeModel, new_date:DateTimeModel, id_number:IdentificationNumberModel, doctor_name:Literal['kevin anderson','robert martinez','susan davis','daniel miller','sarah wilson','michael green','lisa brown','jane smith','emily johnson','john doe']):
+@timed(TOOL_SECONDS, tool="reschedule_appointment")
+def reschedule_appointment(old_date:DateTimeModel, new_date:DateTimeModel, id_number:IdentificationNumberModel, doctor_name:DoctorName):
     """
     Rescheduling an appointment.
     The parameters MUST be mentioned by the user in the query.
     """
-    df = pd.read_csv(r"../data/doctor_availability.csv")
-    
-    def convert_datetime_format(dt_str):
-        # Remove "at" if present in the string
-        if " at " in dt_str:
-            dt_str = dt_str.replace(" at ", " ")
-            
-        try:
-            # First try the DD-MM-YYYY HH:MM format
-            dt = datetime.strptime(dt_str, "%d-%m-%Y %H:%M")
-            # Format to match database format
-            return dt.strftime("%d-%m-%Y %H.%M")
-        except ValueError:
-            try:
-                # Try alternative format YYYY-MM-DD HH:MM
-                dt = datetime.strptime(dt_str, "%Y-%m-%d %H:%M")
-                # Format to match database format
-                return dt.strftime("%d-%m-%Y %H.%M")
-            except ValueError:
-                print(f"Failed to parse date: {dt_str}")
-                raise ValueError(f"Date format not recognized. Please use DD-MM-YYYY HH:MM format")
-    
     try:
         formatted_old_date = convert_datetime_format(old_date.date)
         formatted_new_date = convert_datetime_format(new_date.date)
         
-        # Check if the old appointment exists
-        old_appointment = df[(df['date_slot'] == formatted_old_date) & 
-                           (df['patient_to_attend'] == id_number.id) & 
-                           (df['doctor_name'] == doctor_name)]
+        store = get_store()
         
-        if len(old_appointment) == 0:
+        # Check if the old appointment exists
+        if not store.has_appointment(formatted_old_date, doctor_name, id_number.id):
             return "You don't have an existing appointment with those specifications"
         
-        # Check if the new slot is available
-        available_for_desired_date = df[(df['date_slot'] == formatted_new_date) & 
-                                      (df['is_available'] == True) & 
-                                      (df['doctor_name'] == doctor_name)]
-        
-        if len(available_for_desired_date) == 0:
+        # Move the appointment only if the new slot is still available
+        if not store.reschedule(formatted_old_date, formatted_new_date, doctor_name, id_number.id):
             return "No available slots for the desired new date and time"
         else:
-            # Cancel old appointment
-            df.loc[(df['date_slot'] == formatted_old_date) & 
-                 (df['patient_to_attend'] == id_number.id) & 
-                 (df['doctor_name'] == doctor_name), 
-                 ['is_available', 'patient_to_attend']] = [True, None]
-            
-            # Book new appointment
-            df.loc[(df['date_slot'] == formatted_new_date) & 
-                 (df['doctor_name'] == doctor_name) & 
-                 (df['is_available'] == True), 
-                 ['is_available', 'patient_to_attend']] = [False, id_number.id]
-            
-            df.to_csv(r'../data/doctor_availability.csv', index=False)
             return f"Successfully rescheduled appointment with Dr. {doctor_name.title()} from {old_date.date} to {new_date.date}"
     except Exception as e:
-        print(f"Error in reschedule_appointment: {str(e)}")
+        logger.exception("Error in reschedule_appointment")
         return f"There was an issue rescheduling your appointment: {str(e)}"
\ No newline at end of file
@@ -0,0 +1,133 @@
+"""
+Per-turn budgets for the supervisor loop, so a confused model can't keep the graph
+cycling between supervisor and workers. A turn gets at most TURN_MAX_HOPS worker runs
+and TURN_DEADLINE seconds of wall time, and a worker is not sent the same message
+twice in one turn. The deadline is carried in a context variable; DeadlineHandler, set
+on the chat model and the tools, refuses to start any LLM or tool call after it, and
+call_before_deadline() gives a model's client calls the time left as their timeout, so
+a call that starts just in time still ends at the deadline.
+"""
+import asyncio
+import contextvars
+import hashlib
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Optional, Tuple, Type
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Worker runs allowed per user turn
+TURN_MAX_HOPS = int(os.getenv("TURN_MAX_HOPS", "4"))
+# Wall-clock seconds allowed per user turn
+TURN_DEADLINE = float(os.getenv("TURN_DEADLINE", "60"))
+# Wait before the first retry of a failed client call; it doubles with each retry
+RETRY_DELAY = 0.5
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("turn_deadline", default=None)
+
+
+class BudgetExceeded(Exception):
+    """Raised when a turn runs out of budget; `reason` is 'hops', 'deadline' or 'loop'."""
+
+    def __init__(self, reason: str):
+        super().__init__(f"Turn budget exceeded: {reason}")
+        self.reason = reason
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[float]):
+    """Make `deadline` (a time.time() value, or None for no limit) the deadline of the calls made inside."""
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def time_left() -> Optional[float]:
+    """Seconds until the current deadline, or None outside a deadline scope."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.time()
+
+
+def check_deadline():
+    left = time_left()
+    if left is not None and left <= 0:
+        raise BudgetExceeded("deadline")
+
+
+def deadline_kwargs(kwargs: dict) -> dict:
+    """`kwargs` of a client call, with the time left before the deadline as its `timeout` inside a deadline scope."""
+    left = time_left()
+    if left is None:
+        return kwargs
+    if left <= 0:
+        raise BudgetExceeded("deadline")
+    return {**kwargs, "timeout": left}
+
+
+def _retry_delay(error: Exception, retryable: Tuple[Type[Exception], ...], attempt: int, attempts: int) -> float:
+    """Seconds to wait before retrying a failed call, or re-raise if it can't be retried within the deadline."""
+    left = time_left()
+    if left is not None and left <= 0:
+        raise BudgetExceeded("deadline") from error
+    if not isinstance(error, retryable) or attempt == attempts - 1:
+        raise error
+    delay = RETRY_DELAY * 2 ** attempt
+    return delay if left is None else min(delay, left)
+
+
+def call_before_deadline(call: Callable, kwargs: dict, retryable: Tuple[Type[Exception], ...] = (), attempts: int = 1):
+    """
+    Call `call(**kwargs)`, which must accept a `timeout` in seconds, so that it ends by the
+    turn's deadline: each attempt gets the time left. Failures of a `retryable` type are
+    retried, up to `attempts` in all, while time remains. Once the deadline has passed, a
+    failure is raised as BudgetExceeded('deadline').
+    """
+    for attempt in range(attempts):
+        try:
+            return call(**deadline_kwargs(kwargs))
+        except BudgetExceeded:
+            raise
+        except Exception as e:
+            time.sleep(_retry_delay(e, retryable, attempt, attempts))
+
+
+async def acall_before_deadline(call: Callable, kwargs: dict, retryable: Tuple[Type[Exception], ...] = (), attempts: int = 1):
+    """Async form of call_before_deadline(); `call` returns an awaitable."""
+    for attempt in range(attempts):
+        try:
+            return await call(**deadline_kwargs(kwargs))
+        except BudgetExceeded:
+            raise
+        except Exception as e:
+            await asyncio.sleep(_retry_delay(e, retryable, attempt, attempts))
+
+
+def visit_key(node: str, message: Any) -> str:
+    """Fingerprint of handing `message` to `node`, for spotting a turn that goes round in circles."""
+    content = getattr(message, "content", message)
+    return hashlib.sha1(f"{node}\0{content}".encode()).hexdigest()
+
+
+class DeadlineHandler(BaseCallbackHandler):
+    """Fails LLM and tool calls that would start after the turn's deadline."""
+    raise_error = True
+    run_inline = True
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        check_deadline()
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        check_deadline()
+
+    def on_tool_start(self, serialized, input_str, **kwargs):
+        check_deadline()
+
+
+def enforce_deadline(runnable):
+    """Attach a DeadlineHandler to a chat model or tool once."""
+    callbacks = list(runnable.callbacks or [])
+    if not any(isinstance(callback, DeadlineHandler) for callback in callbacks):
+        runnable.callbacks = callbacks + [DeadlineHandler()]
+    return runnable
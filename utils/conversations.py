@@ -0,0 +1,137 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.sqlite import SqliteSaver
+from config import data_path
+
+CONVERSATION_DB_PATH = data_path("conversations.db")
+
+
+class ThreadedSqliteSaver(SqliteSaver):
+    """SqliteSaver whose async methods run the sync ones in a worker thread, so async graphs can use it."""
+
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        items = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+
+class ConversationStore:
+    """
+    Server-side conversation state keyed by session id.
+    State lives in a LangGraph checkpointer, so each request only carries the session
+    id and the graph only receives the new message. Sessions idle for longer than the
+    TTL are deleted from the checkpointer.
+    """
+
+    def __init__(self, checkpointer, ttl: float = 3600.0):
+        self.checkpointer = checkpointer
+        self.ttl = ttl
+
+    def config(self, session_id: str) -> Dict[str, Any]:
+        return {"configurable": {"thread_id": session_id}}
+
+    def exists(self, session_id: str) -> bool:
+        return self.checkpointer.get_tuple(self.config(session_id)) is not None
+
+    def touch(self, session_id: str):
+        """Record activity for a session and evict the ones that have expired."""
+        raise NotImplementedError
+
+    def delete(self, session_id: str):
+        self._delete_thread(session_id)
+
+    def _delete_thread(self, session_id: str):
+        self.checkpointer.delete_thread(session_id)
+
+
+class MemoryConversationStore(ConversationStore):
+    """In-process store bounded by session count and TTL. State is lost on restart."""
+
+    def __init__(self, max_sessions: int = 1000, ttl: float = 3600.0):
+        super().__init__(MemorySaver(), ttl)
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._last_seen: "OrderedDict[str, float]" = OrderedDict()
+
+    def touch(self, session_id: str):
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            self._last_seen[session_id] = now
+            self._last_seen.move_to_end(session_id)
+            # Oldest sessions sit at the front of the LRU order
+            for sid, last_seen in self._last_seen.items():
+                if len(self._last_seen) - len(expired) <= self.max_sessions and now - last_seen <= self.ttl:
+                    break
+                expired.append(sid)
+            for sid in expired:
+                del self._last_seen[sid]
+        for sid in expired:
+            self._delete_thread(sid)
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._last_seen.pop(session_id, None)
+        super().delete(session_id)
+
+
+class SqliteConversationStore(ConversationStore):
+    """SQLite-backed store that survives restarts and is shared by worker processes."""
+
+    def __init__(self, path: str = CONVERSATION_DB_PATH, ttl: float = 3600.0):
+        checkpoint_conn = sqlite3.connect(path, check_same_thread=False)
+        checkpoint_conn.execute("PRAGMA journal_mode=WAL")
+        super().__init__(ThreadedSqliteSaver(checkpoint_conn), ttl)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30.0)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, last_seen REAL NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_last_seen ON sessions (last_seen)")
+
+    def touch(self, session_id: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?)", (session_id, now))
+            expired = [row[0] for row in self._conn.execute(
+                "SELECT session_id FROM sessions WHERE last_seen < ?", (now - self.ttl,))]
+            self._conn.executemany("DELETE FROM sessions WHERE session_id = ?", [(sid,) for sid in expired])
+        for sid in expired:
+            self._delete_thread(sid)
+
+    def _delete_thread(self, session_id: str):
+        # SqliteSaver does not implement delete_thread, so clear its tables directly
+        saver = self.checkpointer
+        saver.setup()
+        with saver.lock, saver.conn:
+            saver.conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (session_id,))
+            saver.conn.execute("DELETE FROM writes WHERE thread_id = ?", (session_id,))
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        super().delete(session_id)
+
+
+def make_conversation_store() -> ConversationStore:
+    """Pick the store from the CONVERSATION_STORE environment variable ('memory' or 'sqlite')."""
+    kind = os.getenv("CONVERSATION_STORE", "memory").lower()
+    ttl = float(os.getenv("CONVERSATION_TTL", "3600"))
+    if kind == "memory":
+        return MemoryConversationStore(int(os.getenv("CONVERSATION_MAX_SESSIONS", "1000")), ttl)
+    if kind == "sqlite":
+        return SqliteConversationStore(data_path("conversations.db", "CONVERSATION_DB_PATH"), ttl)
+    raise ValueError(f"Unknown conversation store: {kind}")
@@ -0,0 +1,191 @@
+"""
+Offline chat models for benchmarks and CI. They answer deterministically after a fixed
+latency, so graph timings do not depend on the network or on Groq.
+"""
+import asyncio
+import re
+import threading
+import time
+from typing import Any, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import PrivateAttr
+from models import DOCTORS, SPECIALIZATIONS
+from utils.budget import acall_before_deadline, call_before_deadline
+from utils.history import estimate_tokens
+from utils.router import BOOKING_PATTERN, ID_MESSAGE_PREFIX, WORKER_NODES, latest_user_query
+
+DATETIME_PATTERN = re.compile(r"\b(\d{2}-\d{2}-\d{4})(?:\s+(?:at\s+)?(\d{1,2}[:.]\d{2}))?")
+ID_PATTERN = re.compile(re.escape(ID_MESSAGE_PREFIX) + r"\s+(\d+)")
+
+
+class CallCounter:
+    """Thread-safe count of model calls, shared by a fake model and its tool-bound copies."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def increment(self):
+        with self._lock:
+            self.count += 1
+
+
+class FakeChatModel(BaseChatModel):
+    """Base for the fakes: sleeps `latency` seconds per call and counts calls."""
+    latency: float = 0.0
+    _counter: CallCounter = PrivateAttr(default_factory=CallCounter)
+
+    @property
+    def call_count(self) -> int:
+        return self._counter.count
+
+    def respond(self, messages: List[Any]) -> AIMessage:
+        raise NotImplementedError
+
+    def _result(self, messages: List[Any]) -> ChatResult:
+        self._counter.increment()
+        message = self.respond(messages)
+        # Rough usage so token metrics are populated the same way as with a real provider
+        input_tokens = sum(estimate_tokens(m) for m in messages)
+        output_tokens = estimate_tokens(message)
+        message = message.model_copy(update={"usage_metadata": {
+            "input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}})
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _request(self, messages: List[Any], timeout: Optional[float] = None) -> ChatResult:
+        """Stands in for the provider's client: a reply slower than `timeout` fails at the timeout."""
+        if self.latency:
+            time.sleep(self.latency if timeout is None else min(self.latency, timeout))
+            if timeout is not None and self.latency > timeout:
+                raise TimeoutError(f"No reply within {timeout:.2f} s")
+        return self._result(messages)
+
+    async def _arequest(self, messages: List[Any], timeout: Optional[float] = None) -> ChatResult:
+        if self.latency:
+            await asyncio.sleep(self.latency if timeout is None else min(self.latency, timeout))
+            if timeout is not None and self.latency > timeout:
+                raise TimeoutError(f"No reply within {timeout:.2f} s")
+        return self._result(messages)
+
+    def _generate(self, messages: List[Any], stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+        # Calls end by the turn's deadline the same way as DeadlineChatGroq's
+        return call_before_deadline(lambda **kw: self._request(messages, **kw), {})
+
+    async def _agenerate(self, messages: List[Any], stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+        return await acall_before_deadline(lambda **kw: self._arequest(messages, **kw), {})
+
+
+class FixedReplyLLM(FakeChatModel):
+    """Answers every call with the same text and never calls tools."""
+    reply: str = "Dr. John Doe is available at 08:00."
+
+    @property
+    def _llm_type(self) -> str:
+        return "fixed-reply"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def respond(self, messages: List[Any]) -> AIMessage:
+        return AIMessage(content=self.reply)
+
+
+class ScriptedLLM(FakeChatModel):
+    """
+    Plays the supervisor and both react sub-agents by reading the conversation.
+    Routing requests (a bound Router tool) get a Router call, user requests a call to the matching
+    bound tool (arguments parsed from the message), and tool results with a reply that
+    quotes them. Queued `responses` (text or AIMessage) are replayed first, in order.
+    """
+    responses: List[Any] = []
+    tool_names: List[str] = []
+    _replay_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools, **kwargs):
+        names = [convert_to_openai_tool(tool)["function"]["name"] for tool in tools]
+        bound = self.model_copy(update={"tool_names": names})
+        bound._counter = self._counter
+        bound._replay_lock = self._replay_lock
+        return bound
+
+    def respond(self, messages: List[Any]) -> AIMessage:
+        with self._replay_lock:
+            replayed = self.responses.pop(0) if self.responses else None
+        if replayed is not None:
+            return replayed if isinstance(replayed, AIMessage) else AIMessage(content=replayed)
+
+        if "Router" in self.tool_names:
+            next_node, reasoning = self.route(messages)
+            return AIMessage(content="", tool_calls=[{"name": "Router", "args": {"next": next_node, "reasoning": reasoning, "confidence": 0.9},
+                                                      "id": f"call_{self.call_count}", "type": "tool_call"}])
+        if isinstance(messages[-1], ToolMessage):
+            if messages[-1].name == "list_my_appointments":
+                return self.call_tool(messages, listing=messages[-1].content)
+            return AIMessage(content=f"Here is what I found: {messages[-1].content}")
+        return self.call_tool(messages)
+
+    def route(self, messages: List[Any]) -> tuple:
+        conversation = [m for m in messages if not isinstance(m, SystemMessage)]
+        query = latest_user_query(conversation) or ""
+        worker = "booking_node" if BOOKING_PATTERN.search(query) else "information_node"
+        last = conversation[-1] if conversation else None
+        if isinstance(last, AIMessage) and last.name in WORKER_NODES:
+            # A question from the worker that doesn't handle this kind of request goes to the one that does
+            if last.name != worker and last.content.rstrip().endswith("?"):
+                return worker, f"{last.name} can't handle this request."
+            return "FINISH", f"{last.name} answered the user."
+        if worker == "booking_node":
+            return worker, "The user wants to change an appointment."
+        return worker, "The user is asking about availability."
+
+    def call_tool(self, messages: List[Any], listing: Optional[str] = None) -> AIMessage:
+        """Call the tool the latest user message asks for, filling a cancellation from `listing` if needed."""
+        query = (latest_user_query(messages) or "").lower()
+        id_number = next((int(match.group(1)) for m in messages if isinstance(m, HumanMessage)
+                          for match in [ID_PATTERN.search(m.content)] if match), None)
+        doctor = next((name for name in DOCTORS if name in query or name.split()[-1] in query), None)
+        specialization = next((s for s in SPECIALIZATIONS if s in query or s.replace("_", " ") in query), None)
+        dates = [(date, time_.replace(".", ":").zfill(5) if time_ else None) for date, time_ in DATETIME_PATTERN.findall(query)]
+        datetimes = [f"{date} {time_}" for date, time_ in dates if time_]
+
+        if listing is not None:
+            booked = []
+            for line in listing.lower().splitlines():
+                slot = DATETIME_PATTERN.search(line)
+                booked += [(f"{slot.group(1)} {slot.group(2)}", name) for name in DOCTORS if slot and slot.group(2) and name in line]
+            if "cancel" not in query or len(booked) != 1:
+                return AIMessage(content=f"Here is what I found: {listing}")
+            datetimes, doctor = [booked[0][0]], booked[0][1]
+
+        name, args = None, {}
+        if "cancel" in query and datetimes and doctor and id_number:
+            name, args = "cancel_appointment", {"date": {"date": datetimes[0]}, "id_number": {"id": id_number}, "doctor_name": doctor}
+        elif "reschedul" in query and len(datetimes) >= 2 and doctor and id_number:
+            name, args = "reschedule_appointment", {"old_date": {"date": datetimes[0]}, "new_date": {"date": datetimes[1]},
+                                                    "id_number": {"id": id_number}, "doctor_name": doctor}
+        elif re.search(r"\bhold\b", query) and datetimes and doctor and id_number:
+            name, args = "hold_slot", {"desired_date": {"date": datetimes[0]}, "id_number": {"id": id_number}, "doctor_name": doctor}
+        elif BOOKING_PATTERN.search(query) and datetimes and doctor and id_number:
+            name, args = "set_appointment", {"desired_date": {"date": datetimes[0]}, "id_number": {"id": id_number}, "doctor_name": doctor}
+        elif ("earliest" in query or "next available" in query) and dates and (doctor or specialization):
+            window = {"start": dates[0][0], "end": dates[1][0] if len(dates) > 1 else None}
+            scope = {"doctor_name": doctor} if doctor else {"specialization": specialization}
+            name, args = "find_next_available", {"window": window, **scope}
+        elif re.search(r"\bmy (appointments?|bookings?)\b", query) and id_number:
+            name, args = "list_my_appointments", {"id_number": {"id": id_number}}
+        elif dates and doctor:
+            name, args = "check_availability_by_doctor", {"desired_date": {"date": dates[0][0]}, "doctor_name": doctor}
+        elif dates and specialization:
+            name, args = "check_availability_by_specialization", {"desired_date": {"date": dates[0][0]}, "specialization": specialization}
+
+        if name not in self.tool_names:
+            return AIMessage(content="Could you tell me the doctor, date and time you have in mind?")
+        return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": f"call_{self.call_count}", "type": "tool_call"}])
@@ -0,0 +1,38 @@
+"""
+ChatGroq for graph nodes, whose calls end at the turn's deadline (see utils.budget).
+Only imported when the Groq provider is used.
+"""
+from typing import Any, List, Optional
+
+import groq
+from langchain_groq import ChatGroq
+
+from utils.budget import acall_before_deadline, call_before_deadline, deadline_kwargs
+
+# Failures worth another attempt; timeouts are connection errors too
+RETRYABLE = (groq.APIConnectionError, groq.RateLimitError, groq.InternalServerError)
+
+
+class DeadlineChatGroq(ChatGroq):
+    """
+    Inside a deadline scope every request gets the time left in the turn as its timeout,
+    instead of the client's fixed one. Retries are made here rather than by the client,
+    which would give each retry the full timeout again, and stop at the deadline.
+    """
+    max_retries: int = 0
+    attempts: int = 3
+
+    def _generate(self, messages: List[Any], stop: Optional[List[str]] = None, run_manager=None, **kwargs):
+        generate = super(DeadlineChatGroq, self)._generate
+        return call_before_deadline(lambda **kw: generate(messages, stop, run_manager, **kw), kwargs, RETRYABLE, self.attempts)
+
+    async def _agenerate(self, messages: List[Any], stop: Optional[List[str]] = None, run_manager=None, **kwargs):
+        agenerate = super(DeadlineChatGroq, self)._agenerate
+        return await acall_before_deadline(lambda **kw: agenerate(messages, stop, run_manager, **kw), kwargs, RETRYABLE, self.attempts)
+
+    def _stream(self, messages: List[Any], stop: Optional[List[str]] = None, run_manager=None, **kwargs):
+        # A stream can't be retried once tokens are out, but it still stops waiting at the deadline
+        return super()._stream(messages, stop, run_manager, **deadline_kwargs(kwargs))
+
+    def _astream(self, messages: List[Any], stop: Optional[List[str]] = None, run_manager=None, **kwargs):
+        return super()._astream(messages, stop, run_manager, **deadline_kwargs(kwargs))
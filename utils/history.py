@@ -0,0 +1,144 @@
+import os
+import re
+import threading
+from typing import Any, Dict, List
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from utils.router import ID_MESSAGE_PREFIX
+
+OUTCOME_PATTERNS = [
+    re.compile(r"successfully booked with Dr\. [^.]+ on [\d\- :]+", re.I),
+    re.compile(r"Dr\. [^.]+ has been successfully scheduled for [\d\- :]+", re.I),
+    re.compile(r"successfully rescheduled appointment with Dr\. [^.]+ from [\d\- :]+ to [\d\- :]+", re.I),
+    re.compile(r"appointment successfully cancell?ed", re.I),
+]
+# Most recent completed actions and earlier requests listed in the summary, and the characters kept of each
+SUMMARY_ITEMS = 5
+SUMMARY_ITEM_CHARS = 80
+TRUNCATED = " [...]"
+
+
+def estimate_tokens(message: Any) -> int:
+    """Rough token count (about four characters per token) plus per-message overhead."""
+    content = message.get("content", "") if isinstance(message, dict) else getattr(message, "content", str(message))
+    return len(str(content)) // 4 + 4
+
+
+def is_id_message(message: Any) -> bool:
+    return isinstance(message, HumanMessage) and message.content.startswith(ID_MESSAGE_PREFIX)
+
+
+def split_exchanges(messages: List[Any]) -> List[List[Any]]:
+    """Group messages into exchanges, each starting at a user-written message."""
+    exchanges = []
+    for message in messages:
+        if is_id_message(message):
+            continue
+        if isinstance(message, HumanMessage) or not exchanges:
+            exchanges.append([])
+        exchanges[-1].append(message)
+    return exchanges
+
+
+def listing(items: List[str]) -> str:
+    """The last SUMMARY_ITEMS items, with a count of the ones left out."""
+    if not items:
+        return "none"
+    shown = "; ".join(items[-SUMMARY_ITEMS:])
+    return shown if len(items) <= SUMMARY_ITEMS else f"{shown} (last {SUMMARY_ITEMS} of {len(items)})"
+
+
+def truncate(message: Any, max_tokens: int) -> Any:
+    """Copy of a message whose text is cut to about `max_tokens` estimated tokens."""
+    content = getattr(message, "content", None)
+    chars = max(0, (max_tokens - 4) * 4 - len(TRUNCATED))
+    if not isinstance(content, str) or len(content) <= chars:
+        return message
+    return message.model_copy(update={"content": content[:chars] + TRUNCATED})
+
+
+def summarize_exchanges(exchanges: List[List[Any]]) -> str:
+    """
+    Compact structured summary of older exchanges: completed actions, earlier requests
+    and any pending intent. Only the latest few of each are listed, so its size is bounded.
+    """
+    outcomes = []
+    requests = []
+    for exchange in exchanges:
+        for message in exchange:
+            if isinstance(message, HumanMessage):
+                requests.append(message.content.strip()[:SUMMARY_ITEM_CHARS])
+            elif isinstance(message, AIMessage):
+                for pattern in OUTCOME_PATTERNS:
+                    outcomes.extend(match.group(0)[:SUMMARY_ITEM_CHARS] for match in pattern.finditer(message.content))
+    lines = ["Summary of earlier conversation:"]
+    lines.append("- Completed actions: " + listing(outcomes))
+    lines.append("- Earlier requests: " + listing(requests))
+    replies = [message for message in exchanges[-1] if isinstance(message, AIMessage)]
+    if replies and replies[-1].content.rstrip().endswith("?") and requests:
+        lines.append(f"- Pending intent: {requests[-1]} (assistant asked for more details)")
+    return "\n".join(lines)
+
+
+class HistoryCompactor:
+    """
+    Bounds the history the supervisor sends to the LLM to about `max_tokens` estimated
+    tokens. Repeated identification messages are dropped, the last `keep_exchanges`
+    exchanges are kept verbatim (fewer if they don't fit next to the summary) and older
+    ones are replaced by a short summary. If even the latest exchange doesn't fit, its
+    longest messages are cut. Tracks estimated prompt tokens saved.
+    """
+
+    def __init__(self, max_tokens: int = 2000, keep_exchanges: int = 3):
+        self.max_tokens = max_tokens
+        self.keep_exchanges = keep_exchanges
+        self._lock = threading.Lock()
+        self._stats = {"turns": 0, "tokens_before": 0, "tokens_after": 0, "last_saved": 0}
+
+    @classmethod
+    def from_env(cls) -> "HistoryCompactor":
+        """Compactor sized by HISTORY_MAX_TOKENS (default 2000) and HISTORY_KEEP_EXCHANGES (default 3)."""
+        return cls(int(os.getenv("HISTORY_MAX_TOKENS", "2000")), int(os.getenv("HISTORY_KEEP_EXCHANGES", "3")))
+
+    def compact(self, messages: List[Any]) -> List[Any]:
+        exchanges = split_exchanges(messages)
+        keep = min(self.keep_exchanges, len(exchanges))
+        while True:
+            older, recent = exchanges[:len(exchanges) - keep], exchanges[len(exchanges) - keep:]
+            # The summary gets at most half the budget, the kept exchanges the rest
+            summary = [truncate(SystemMessage(content=summarize_exchanges(older)), self.max_tokens // 2)] if older else []
+            budget = self.max_tokens - sum(estimate_tokens(m) for m in summary)
+            if keep <= 1 or sum(estimate_tokens(m) for exchange in recent for m in exchange) <= budget:
+                break
+            keep -= 1
+
+        compacted = summary + self.fit([message for exchange in recent for message in exchange], budget)
+
+        before = sum(estimate_tokens(m) for m in messages)
+        after = sum(estimate_tokens(m) for m in compacted)
+        with self._lock:
+            self._stats["turns"] += 1
+            self._stats["tokens_before"] += before
+            self._stats["tokens_after"] += after
+            self._stats["last_saved"] = before - after
+        return compacted
+
+    @staticmethod
+    def fit(messages: List[Any], budget: int) -> List[Any]:
+        """Cut the longest messages until the estimated total is within `budget`, leaving each at least a few tokens."""
+        messages = list(messages)
+        excess = sum(estimate_tokens(m) for m in messages) - budget
+        for index in sorted(range(len(messages)), key=lambda i: estimate_tokens(messages[i]), reverse=True):
+            if excess <= 0:
+                break
+            tokens = estimate_tokens(messages[index])
+            shortened = truncate(messages[index], max(16, tokens - excess))
+            excess -= tokens - estimate_tokens(shortened)
+            messages[index] = shortened
+        return messages
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["tokens_saved"] = stats["tokens_before"] - stats["tokens_after"]
+        stats["avg_saved_per_turn"] = stats["tokens_saved"] / stats["turns"] if stats["turns"] else 0.0
+        return stats
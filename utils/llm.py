@@ -1,23 +1,170 @@
 import os
-from langchain_groq import ChatGroq
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+from uuid import UUID
 from dotenv import load_dotenv
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from utils.budget import TURN_DEADLINE
+from utils.metrics import LLM_SECONDS, LLM_TOKENS
 load_dotenv()
 api_key = os.getenv("GROQ_API_KEY")
 groq_api_key = os.getenv("GROQ_API_KEY")
 
+# Named models; LLM_MODELS ("fast=...,large=...") overrides them or adds more
+DEFAULT_MODELS = {"fast": "llama-3.1-8b-instant", "large": "deepseek-r1-distill-llama-70b"}
+# Model per graph node, by name or model id; LLM_NODE_MODELS overrides it
+DEFAULT_NODE_MODELS = "supervisor=fast,information_node=large,booking_node=large"
+# Model a routing call is retried on when the node's model gives no usable route; LLM_ESCALATION_MODEL="" turns it off
+DEFAULT_ESCALATION_MODEL = "large"
+
+
+def parse_assignments(spec: str) -> Dict[str, str]:
+    """{key: value} from "key=value,key=value"."""
+    assignments = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        key, _, value = item.partition("=")
+        if not value.strip():
+            raise ValueError(f"Expected key=value, got {item!r}")
+        assignments[key.strip()] = value.strip()
+    return assignments
+
+
 class LLMModel:
-    def __init__(self, model_name="deepseek-r1-distill-llama-70b"):
+    """
+    Chat model provider, chosen by the LLM_PROVIDER environment variable:
+    'groq' (default) or 'fake', a scripted offline model whose per-call latency
+    is FAKE_LLM_LATENCY seconds.
+
+    Models are asked for by registry name ('fast', 'large') or by model id, and each
+    is built once. The fake provider answers for every model with one scripted model.
+    """
+    def __init__(self, model_name="deepseek-r1-distill-llama-70b", provider=None, models: Optional[Dict[str, str]] = None):
         if not model_name:
             raise ValueError("Model is not defined.")
         self.model_name = model_name
-        self.groq_model=ChatGroq(model=self.model_name)
-        
-    def get_model(self):
-        return self.groq_model
+        self.provider = (provider or os.getenv("LLM_PROVIDER", "groq")).lower()
+        if self.provider not in ("groq", "fake"):
+            raise ValueError(f"Unknown LLM provider: {self.provider}")
+        self.models = {**DEFAULT_MODELS, **parse_assignments(os.getenv("LLM_MODELS", "")), **(models or {})}
+        self._built: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self.model = self.get_model()
+
+    def resolve(self, name: str) -> str:
+        """Model id of a registry name; anything else is taken to be a model id already."""
+        return self.models.get(name, name)
+
+    def build(self, model_id: str):
+        if self.provider == "groq":
+            from utils.groq_chat import DeadlineChatGroq
+            # No single call may outlive a whole turn's budget; inside a turn, only its time left
+            return DeadlineChatGroq(model=model_id, timeout=TURN_DEADLINE)
+        from utils.fake_llm import ScriptedLLM
+        return ScriptedLLM(latency=float(os.getenv("FAKE_LLM_LATENCY", "0")))
+
+    def get_model(self, name: Optional[str] = None):
+        """The chat model for a registry name or model id, by default the one this provider was created with."""
+        model_id = self.resolve(name or self.model_name)
+        key = model_id if self.provider == "groq" else self.provider
+        with self._lock:
+            if key not in self._built:
+                self._built[key] = self.build(model_id)
+            return self._built[key]
+
+    def node_models(self) -> Dict[str, Any]:
+        """Chat model per graph node, as set by LLM_NODE_MODELS."""
+        spec = parse_assignments(os.getenv("LLM_NODE_MODELS", DEFAULT_NODE_MODELS))
+        return {node: self.get_model(name) for node, name in spec.items()}
+
+    def escalation_model(self):
+        """The model named by LLM_ESCALATION_MODEL, or None if escalation is off."""
+        name = os.getenv("LLM_ESCALATION_MODEL", DEFAULT_ESCALATION_MODEL)
+        return self.get_model(name) if name else None
+
+class LLMMetricsHandler(BaseCallbackHandler):
+    """
+    Callback handler recording LLM call latency and prompt/completion token counts, by
+    model and by the graph node named in the model's `llm_node` metadata.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started: Dict[UUID, Tuple[float, str, str]] = {}
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages, *, run_id: UUID, **kwargs):
+        self._start(serialized, run_id, kwargs)
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts, *, run_id: UUID, **kwargs):
+        self._start(serialized, run_id, kwargs)
+
+    def _start(self, serialized: Optional[Dict[str, Any]], run_id: UUID, kwargs: Dict[str, Any]):
+        params = kwargs.get("invocation_params") or {}
+        model = params.get("model_name") or params.get("model") or params.get("_type") or (serialized or {}).get("name", "unknown")
+        node = (kwargs.get("metadata") or {}).get("llm_node", "other")
+        with self._lock:
+            self._started[run_id] = (time.perf_counter(), str(model), node)
+
+    def _finish(self, run_id: UUID) -> Optional[Tuple[str, str]]:
+        with self._lock:
+            started = self._started.pop(run_id, None)
+        if started is None:
+            return None
+        start, model, node = started
+        LLM_SECONDS.observe(time.perf_counter() - start, node=node, model=model)
+        return node, model
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs):
+        finished = self._finish(run_id)
+        if finished is None:
+            return
+        node, model = finished
+        prompt_tokens = completion_tokens = 0
+        for generation in (response.generations[0] if response.generations else []):
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                prompt_tokens += usage.get("input_tokens", 0)
+                completion_tokens += usage.get("output_tokens", 0)
+        if not (prompt_tokens or completion_tokens):
+            usage = (response.llm_output or {}).get("token_usage") or {}
+            prompt_tokens = usage.get("prompt_tokens", 0)
+            completion_tokens = usage.get("completion_tokens", 0)
+        LLM_TOKENS.inc(prompt_tokens, node=node, model=model, kind="prompt")
+        LLM_TOKENS.inc(completion_tokens, node=node, model=model, kind="completion")
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs):
+        self._finish(run_id)
+
+
+def instrument_llm(llm_model):
+    """Attach an LLMMetricsHandler to a chat model once. Tool-bound copies share its callbacks."""
+    callbacks = list(llm_model.callbacks or [])
+    if not any(isinstance(callback, LLMMetricsHandler) for callback in callbacks):
+        llm_model.callbacks = callbacks + [LLMMetricsHandler()]
+    return llm_model
+
+
+def for_node(llm_model, node: str):
+    """Copy of a chat model whose calls are recorded under `node`."""
+    return llm_model.model_copy(update={"metadata": {**(llm_model.metadata or {}), "llm_node": node}})
+
+
+def llm_usage() -> Dict[str, Dict[str, Dict[str, float]]]:
+    """Calls, mean latency and tokens of LLM calls so far, per node and model."""
+    usage: Dict[str, Dict[str, Dict[str, float]]] = {}
+    for (node, model), (count, total) in LLM_SECONDS.totals().items():
+        usage.setdefault(node, {})[model] = {"calls": count, "mean_seconds": round(total / count, 4) if count else 0.0,
+                                             "prompt_tokens": 0, "completion_tokens": 0}
+    for (node, model, kind), tokens in LLM_TOKENS.values().items():
+        stats = usage.setdefault(node, {}).setdefault(model, {"calls": 0, "mean_seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0})
+        stats[f"{kind}_tokens"] = int(tokens)
+    return usage
+
 
 if __name__ == "__main__":
-    llm_instance = LLMModel()  
+    llm_instance = LLMModel()
     llm_model = llm_instance.get_model()
     response=llm_model.invoke("hi")
 
-    print(response)
\ No newline at end of file
+    print(response)
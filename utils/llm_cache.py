@@ -0,0 +1,241 @@
+"""
+Response cache for LLM calls whose reply depends only on the prompt, such as routing
+decisions and phrasing availability results. Replies are keyed on a hash of the model
+and its bound parameters (tool schemas included) and the normalized messages. They are
+kept in an in-memory LRU and, optionally, in SQLite, so they survive restarts and are
+shared by the workers of a host.
+
+Nodes opt in with a TTL each through LLM_CACHE_NODES ("supervisor=600,information_node=300").
+Calls that can change bookings are never cached, whatever the setting.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+from langchain_core.callbacks import AsyncCallbackManager, CallbackManager
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import RunnableBinding
+from config import data_path
+from toolkit.cache import ResultCache
+from utils.metrics import LLM_CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_NODES = "supervisor=600,information_node=300"
+# Booking calls lead to writes; replaying one would repeat a decision the user never made again
+UNCACHEABLE_NODES = frozenset({"booking_node"})
+# Expired rows are purged from SQLite every this many writes
+PURGE_EVERY = 256
+
+
+def parse_nodes(spec: str) -> Dict[str, float]:
+    """{node: ttl seconds} from "node=ttl,node=ttl"."""
+    nodes = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        node, _, ttl = item.partition("=")
+        node = node.strip()
+        if node in UNCACHEABLE_NODES:
+            logger.warning("LLM calls of %s are not cacheable; ignoring it in LLM_CACHE_NODES", node)
+            continue
+        nodes[node] = float(ttl) if ttl.strip() else 300.0
+    return nodes
+
+
+def normalize_content(content: Any) -> Any:
+    return " ".join(content.split()) if isinstance(content, str) else content
+
+
+def normalize_message(message: BaseMessage) -> Dict[str, Any]:
+    """The parts of a message that affect the reply. Run-specific ids are left out."""
+    normalized = {"type": message.type, "content": normalize_content(message.content)}
+    if message.name:
+        normalized["name"] = message.name
+    if isinstance(message, AIMessage) and message.tool_calls:
+        normalized["tool_calls"] = [[call["name"], call["args"]] for call in message.tool_calls]
+    return normalized
+
+
+def reply_value(message: AIMessage) -> Dict[str, Any]:
+    return {"content": message.content, "tool_calls": [[call["name"], call["args"]] for call in message.tool_calls]}
+
+
+def reply_message(value: Dict[str, Any], tier: str) -> AIMessage:
+    """Rebuild a cached reply, with fresh tool call ids so it can't clash with earlier tool results."""
+    tool_calls = [{"name": name, "args": args, "id": f"call_{uuid.uuid4().hex[:24]}", "type": "tool_call"}
+                  for name, args in value["tool_calls"]]
+    return AIMessage(content=value["content"], tool_calls=tool_calls, response_metadata={"cache": tier})
+
+
+def default_accept(message: AIMessage) -> bool:
+    """Only well-formed replies are cached, so a retry after a bad one asks the model again."""
+    return bool(message.content or message.tool_calls) and not message.invalid_tool_calls
+
+
+class LLMCache:
+    """
+    Two-tier reply cache: an LRU in memory, backed by a SQLite file when `path` is given.
+    `nodes` maps each cacheable node to the TTL of its entries, in seconds.
+    """
+
+    def __init__(self, nodes: Dict[str, float], path: Optional[str] = None, maxsize: int = 512):
+        self.nodes = {node: ttl for node, ttl in nodes.items() if node not in UNCACHEABLE_NODES}
+        self.path = path
+        self.memory = ResultCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._connection = None
+        self._writes = 0
+        if path:
+            self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS llm_cache "
+                                     "(key TEXT PRIMARY KEY, node TEXT, value TEXT, expires_at REAL)")
+            self._purge()
+
+    @classmethod
+    def from_env(cls) -> Optional["LLMCache"]:
+        """
+        The cache configured by LLM_CACHE: 'memory' (default), 'sqlite' (memory backed by
+        LLM_CACHE_PATH, default data/llm_cache.db) or 'off', which returns None.
+        """
+        mode = os.getenv("LLM_CACHE", "memory").lower()
+        if mode == "off":
+            return None
+        if mode not in ("memory", "sqlite"):
+            raise ValueError(f"Unknown LLM_CACHE mode: {mode}")
+        path = data_path("llm_cache.db", "LLM_CACHE_PATH") if mode == "sqlite" else None
+        nodes = parse_nodes(os.getenv("LLM_CACHE_NODES", DEFAULT_NODES))
+        return cls(nodes, path, maxsize=int(os.getenv("LLM_CACHE_SIZE", "512")))
+
+    def wrap(self, model: BaseChatModel, node: str, accept: Optional[Callable[[AIMessage], bool]] = None) -> BaseChatModel:
+        """`model` with its replies cached under `node`, or `model` itself if the node hasn't opted in."""
+        if node not in self.nodes:
+            return model
+        return CachedChatModel(model=model, reply_cache=self, node=node, accept=accept or default_accept)
+
+    def key(self, model: BaseChatModel, messages: List[BaseMessage], stop: Optional[List[str]], kwargs: Dict[str, Any]) -> str:
+        # The LLM string covers the model name and settings plus bound kwargs such as tools and tool_choice
+        llm_string = model._get_llm_string(stop=stop, **kwargs)
+        payload = json.dumps([llm_string, [normalize_message(message) for message in messages]], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, node: str, key: str) -> Optional[AIMessage]:
+        value = self.memory.get(key, node)
+        tier = "memory"
+        if value is None and self._connection is not None:
+            value = self._disk_get(node, key)
+            tier = "disk"
+        LLM_CACHE_LOOKUPS.inc(node=node, result=tier if value is not None else "miss")
+        return reply_message(value, tier) if value is not None else None
+
+    def put(self, node: str, key: str, message: AIMessage):
+        value = reply_value(message)
+        ttl = self.nodes[node]
+        self.memory.put(key, node, value, ttl=ttl)
+        if self._connection is not None:
+            self._disk_put(node, key, value, ttl)
+
+    async def aget(self, node: str, key: str) -> Optional[AIMessage]:
+        if self._connection is None:
+            return self.get(node, key)
+        return await asyncio.to_thread(self.get, node, key)
+
+    async def aput(self, node: str, key: str, message: AIMessage):
+        if self._connection is None:
+            return self.put(node, key, message)
+        await asyncio.to_thread(self.put, node, key, message)
+
+    def _disk_get(self, node: str, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute("SELECT value, expires_at FROM llm_cache WHERE key = ? AND node = ?",
+                                           (key, node)).fetchone()
+        if row is None or row[1] <= now:
+            return None
+        value = json.loads(row[0])
+        # Promote to memory for the rest of the entry's lifetime
+        self.memory.put(key, node, value, ttl=row[1] - now)
+        return value
+
+    def _disk_put(self, node: str, key: str, value: Dict[str, Any], ttl: float):
+        with self._lock:
+            self._connection.execute("INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?)",
+                                     (key, node, json.dumps(value), time.time() + ttl))
+            self._writes += 1
+            if self._writes % PURGE_EVERY == 0:
+                self._purge()
+
+    def _purge(self):
+        self._connection.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),))
+
+    def clear(self):
+        self.memory.clear()
+        if self._connection is not None:
+            with self._lock:
+                self._connection.execute("DELETE FROM llm_cache")
+
+    def stats(self) -> Dict[str, Any]:
+        stats = {"nodes": self.nodes, "disk": self.path, "memory": self.memory.stats()}
+        if self._connection is not None:
+            with self._lock:
+                stats["disk_entries"] = self._connection.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        return stats
+
+
+class CachedChatModel(BaseChatModel):
+    """
+    Chat model answering from an LLMCache before calling the wrapped `model`. Tools bound
+    to it are bound to the wrapped model, and are part of the cache key.
+    """
+    model: BaseChatModel
+    # Not `cache`: that field of BaseChatModel selects LangChain's own global cache
+    reply_cache: Any
+    node: str
+    accept: Callable[[AIMessage], bool] = default_accept
+
+    @property
+    def _llm_type(self) -> str:
+        return f"cached-{self.model._llm_type}"
+
+    def bind_tools(self, tools, **kwargs):
+        bound = self.model.bind_tools(tools, **kwargs)
+        if isinstance(bound, RunnableBinding):
+            # Providers bind tools as call kwargs; keep them so they reach the wrapped model and the key
+            return self.bind(**bound.kwargs)
+        return self.model_copy(update={"model": bound})
+
+    def _call_config(self, run_manager, manager_class=CallbackManager) -> Dict[str, Any]:
+        """Run the wrapped model as a child of this run, so metrics, tracing and token streaming still see it."""
+        if run_manager is None:
+            return {}
+        # LLM run managers have no get_child(); this is what the chain and tool run managers do
+        manager = manager_class(handlers=[], parent_run_id=run_manager.run_id)
+        manager.set_handlers(run_manager.inheritable_handlers)
+        manager.add_tags(run_manager.inheritable_tags)
+        manager.add_metadata(run_manager.inheritable_metadata)
+        return {"callbacks": manager}
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+        key = self.reply_cache.key(self.model, messages, stop, kwargs)
+        message = self.reply_cache.get(self.node, key)
+        if message is None:
+            message = self.model.invoke(messages, config=self._call_config(run_manager), stop=stop, **kwargs)
+            if self.accept(message):
+                self.reply_cache.put(self.node, key, message)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+        key = self.reply_cache.key(self.model, messages, stop, kwargs)
+        message = await self.reply_cache.aget(self.node, key)
+        if message is None:
+            message = await self.model.ainvoke(messages, config=self._call_config(run_manager, AsyncCallbackManager), stop=stop, **kwargs)
+            if self.accept(message):
+                await self.reply_cache.aput(self.node, key, message)
+        return ChatResult(generations=[ChatGeneration(message=message)])
@@ -0,0 +1,159 @@
+"""
+Latency histograms and counters exported in the Prometheus text format on /metrics.
+Kept in-process and dependency free; every metric is safe to update from any thread.
+"""
+import bisect
+import functools
+import inspect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def escape_label(value) -> str:
+    """A label value as the text format requires it: backslash, double quote and newline escaped."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labelnames: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        header = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        return "\n".join(header + self.samples())
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def values(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            return dict(self._values)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{format_labels(self.labelnames, key)} {value}" for key, value in values]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: per-bucket (non-cumulative) counts with a trailing +Inf bucket, then sum
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._series.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    def totals(self) -> Dict[Tuple[str, ...], Tuple[int, float]]:
+        """(count, sum) of the observations per label set."""
+        with self._lock:
+            return {key: (sum(counts), total[0]) for key, (counts, total) in self._series.items()}
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            series = sorted((key, list(counts), total[0]) for key, (counts, total) in self._series.items())
+        lines = []
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = format_labels(self.labelnames, key, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+
+REGISTRY = Registry()
+NODE_SECONDS = REGISTRY.register(Histogram("graph_node_seconds", "Wall time of graph node executions.", ["node"]))
+TOOL_SECONDS = REGISTRY.register(Histogram("tool_seconds", "Wall time of tool calls.", ["tool"]))
+LLM_SECONDS = REGISTRY.register(Histogram("llm_call_seconds", "Wall time of LLM calls, by graph node and model.", ["node", "model"]))
+LLM_TOKENS = REGISTRY.register(Counter("llm_tokens_total", "Tokens sent to and generated by the LLM, by graph node and model.", ["node", "model", "kind"]))
+ROUTE_DECISIONS = REGISTRY.register(Counter("supervisor_route_total", "Supervisor routing decisions by source (fast, llm, retry, escalated, fallback).", ["source", "next"]))
+ROUTE_FAILURES = REGISTRY.register(Counter("supervisor_route_failures_total", "Routing LLM replies without a valid Router call."))
+ROUTE_ESCALATIONS = REGISTRY.register(Counter("supervisor_route_escalations_total", "Routing calls retried on the escalation model, by reason (parse_failure, low_confidence).", ["reason"]))
+MISROUTES = REGISTRY.register(Counter("supervisor_misroutes_total", "Turns handed from one worker straight to the other.", ["source", "target"]))
+STORE_SECONDS = REGISTRY.register(Histogram("store_operation_seconds", "Wall time of availability store reads and writes.", ["operation"]))
+BOOKING_REFUSALS = REGISTRY.register(Counter("booking_refusals_total", "Booking operations refused by the store, by reason.", ["reason"]))
+SLOT_HOLDS = REGISTRY.register(Counter("slot_holds_total", "Slot holds by outcome (placed, confirmed, released, expired).", ["outcome"]))
+TURN_BUDGET_STOPS = REGISTRY.register(Counter("turn_budget_stops_total", "User turns stopped early by a budget, by reason (hops, deadline, loop).", ["reason"]))
+LLM_CACHE_LOOKUPS = REGISTRY.register(Counter("llm_cache_lookups_total", "LLM reply cache lookups by node and result (memory, disk, miss).", ["node", "result"]))
+
+
+def timed(histogram: Histogram, **labels):
+    """Decorator recording each call's wall time in `histogram`; works on sync and async functions."""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with histogram.time(**labels):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with histogram.time(**labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,86 @@
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from langchain_core.messages import AIMessage, HumanMessage
+from models import DOCTORS
+
+WORKER_NODES = ("information_node", "booking_node")
+ID_MESSAGE_PREFIX = "user's identification number is"
+
+BOOKING_PATTERN = re.compile(r"\b(book|booking|cancel|cancell?ing|reschedul\w*|move my appointment|set (an |up an )?appointment)\b", re.I)
+AVAILABILITY_PATTERN = re.compile(r"\b(availab\w*|free slots?|open slots?|openings?|any slots?|which slots|what slots|when is dr)\b", re.I)
+DATE_PATTERN = re.compile(
+    r"\b(\d{1,2}[-/]\d{1,2}[-/]\d{2,4}|\d{4}-\d{2}-\d{2}|today|tomorrow|monday|tuesday|wednesday|thursday|friday|saturday|sunday)\b",
+    re.I,
+)
+DOCTOR_PATTERN = re.compile(
+    r"\b(" + "|".join(sorted({part for name in DOCTORS for part in (name, name.split()[-1])}, key=len, reverse=True)) + r")\b",
+    re.I,
+)
+
+
+def latest_user_query(messages: List[Any]) -> Optional[str]:
+    """Most recent user-written message, skipping the identification messages added by the supervisor."""
+    for message in reversed(messages):
+        if isinstance(message, HumanMessage) and not message.content.startswith(ID_MESSAGE_PREFIX):
+            return message.content
+    return None
+
+
+class FastRouter:
+    """
+    Rule-based pre-router for the supervisor. It returns a routing decision only when
+    its confidence clears the threshold, and None otherwise so the caller falls back
+    to the LLM. Counts hits per destination and fallbacks.
+    """
+
+    def __init__(self, confidence_threshold: float = 0.8):
+        self.confidence_threshold = confidence_threshold
+        self._lock = threading.Lock()
+        self._counts: Dict[str, int] = {"information_node": 0, "booking_node": 0, "FINISH": 0, "fallback": 0}
+
+    def classify(self, messages: List[Any]) -> Tuple[Optional[str], float, str]:
+        """Return (next node, confidence, reasoning) for the current state of the conversation."""
+        if not messages:
+            return None, 0.0, "Empty conversation."
+        last = messages[-1]
+        if isinstance(last, AIMessage) and getattr(last, "name", None) in WORKER_NODES:
+            if isinstance(last.content, str) and last.content.rstrip().endswith("?"):
+                # Usually a question for the user, but a worker without the right tools asks too; the LLM tells them apart
+                return "FINISH", 0.6, f"{last.name} asked a question."
+            return "FINISH", 0.95, f"{last.name} already replied to the user."
+
+        query = latest_user_query(messages)
+        if not query:
+            return None, 0.0, "No user query found."
+        wants_booking = bool(BOOKING_PATTERN.search(query))
+        wants_availability = bool(AVAILABILITY_PATTERN.search(query))
+        has_date = bool(DATE_PATTERN.search(query))
+        has_doctor = bool(DOCTOR_PATTERN.search(query))
+
+        if wants_booking and wants_availability:
+            return None, 0.5, "Query mixes booking and availability intents."
+        if wants_booking:
+            if has_date and has_doctor:
+                return "booking_node", 0.9, "Booking request with a date and doctor."
+            return "booking_node", 0.6, "Booking verb without a complete date and doctor."
+        if wants_availability:
+            return "information_node", 0.85, "Availability question."
+        return None, 0.0, "No clear intent."
+
+    def route(self, messages: List[Any]) -> Optional[Tuple[str, str]]:
+        """Return (next node, reasoning) if the rules are confident enough, otherwise None."""
+        next_node, confidence, reasoning = self.classify(messages)
+        hit = next_node is not None and confidence >= self.confidence_threshold
+        with self._lock:
+            self._counts[next_node if hit else "fallback"] += 1
+        if not hit:
+            return None
+        return next_node, f"Fast path ({confidence:.2f}): {reasoning}"
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._counts)
+        total = sum(counts.values())
+        hits = total - counts["fallback"]
+        return {**counts, "total": total, "hit_rate": hits / total if total else 0.0}